@@ -0,0 +1,74 @@
+"""
+Model calls and agreement of adaptive (scene-change) vs fixed-interval video sampling.
+
+Both modes check the same frames (every --interval seconds). Fixed sampling
+classifies all of them; adaptive sampling classifies only scene changes and
+frames more than --max-gap seconds after the last classified one, carrying
+the previous result forward otherwise. Agreement is the share of rows whose
+class matches the fixed-interval result.
+
+    python -m benchmarks.bench_adaptive_sampling [--video clip.mp4] [--model model.keras]
+        [--interval 0.2] [--max-gap 5] [--thresholds 0.03 0.06 0.1] [--method pixel] [--smoothing 1]
+
+Without --video a synthetic 60 s clip of 6 s static scenes with an object
+moving across each is generated (like a conveyor belt); without --model the
+stand-in model is used.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stand_in_model import load_model
+from benchmarks.synthetic_media import synthetic_video
+from data.class_info import CLASS_INFO, EXPECTED_CLASS_NAMES
+from utils.inference import KerasInferenceEngine
+from utils.scene_change import SceneChangeDetector
+from utils.video_pipeline import VideoAnalysisPipeline
+
+TARGET_SIZE = (299, 299)
+
+
+def run(engine, video_path, interval, **pipeline_options):
+    # Threshold 0 so rows carry the arg-max class instead of mostly "unknown".
+    pipeline = VideoAnalysisPipeline(engine, TARGET_SIZE, CLASS_INFO, EXPECTED_CLASS_NAMES, 0, **pipeline_options)
+    start = time.perf_counter()
+    rows = list(pipeline.iter_results(video_path, interval))
+    return rows, pipeline.stats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Video file (default: synthetic conveyor clip)")
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between checked frames")
+    parser.add_argument("--max-gap", type=float, default=5.0, help="Maximum seconds between model calls")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.03, 0.06, 0.1])
+    parser.add_argument("--method", choices=("pixel", "histogram"), default="pixel")
+    parser.add_argument("--smoothing", type=int, default=1, help="Majority-vote window for adaptive rows")
+    args = parser.parse_args()
+
+    engine = KerasInferenceEngine(load_model(args.model))
+    with tempfile.TemporaryDirectory() as work_dir:
+        video_path = args.video
+        if not video_path:
+            video_path, _ = synthetic_video(Path(work_dir) / "conveyor.mp4", seconds=60, scene_seconds=6)
+        video_path = str(video_path)
+
+        reference, stats, seconds = run(engine, video_path, args.interval)
+        expected = {row["Frame"]: row["Class Key"] for row in reference}
+        print(f"{'mode':<28}{'rows':>6}{'model calls':>13}{'agreement':>11}{'seconds':>9}")
+        print(f"{'fixed':<28}{stats['rows']:>6}{stats['inferred']:>13}{1.0:>11.3f}{seconds:>9.2f}")
+        for threshold in args.thresholds:
+            rows, stats, seconds = run(
+                engine, video_path, args.interval,
+                change_detector=SceneChangeDetector(threshold, method=args.method),
+                max_gap_secs=args.max_gap, smoothing_window=args.smoothing,
+            )
+            agreement = sum(expected.get(row["Frame"]) == row["Class Key"] for row in rows) / max(1, len(expected))
+            name = f"adaptive {args.method} {threshold:g}"
+            print(f"{name:<28}{stats['rows']:>6}{stats['inferred']:>13}{agreement:>11.3f}{seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Bulk URL classification against a local HTTP server.
+
+Starts a threaded HTTP/1.1 server on localhost that serves --images
+synthetic JPEGs, each response delayed by --latency-ms to stand in for a
+remote host, plus three URLs that must fail: a 404, a body above
+--max-bytes and an image above --max-pixels. The same URL list is then
+classified two ways:
+
+- sequential: one requests.get (new connection) and one model call per
+  URL, like the single "Image URL" input
+- bulk: utils.bulk_urls.iter_classify_urls with pooled connections,
+  per-host limits and batched inference
+
+    python -m benchmarks.bench_bulk_urls [--images 64] [--latency-ms 50] [--workers 8]
+        [--per-host 4] [--model model.keras]
+
+Without --model the stand-in model is used.
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import numpy as np
+import requests
+from PIL import Image
+
+from benchmarks.bench_preprocessing import synthetic_photo
+from benchmarks.stand_in_model import load_model
+from data.class_info import EXPECTED_CLASS_NAMES
+from utils.bulk_urls import iter_classify_urls
+from utils.image_processing import preprocess_image
+from utils.inference import KerasInferenceEngine
+from utils.model import predict_image
+from utils.preprocessing import open_image
+
+TARGET_SIZE = (299, 299)
+
+
+def jpeg_bytes(width, height, seed):
+    out = BytesIO()
+    Image.fromarray(synthetic_photo(width, height, seed)).save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def start_server(files, latency_ms):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency_ms / 1000)
+            body = files.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass  # clients drop the connection on purpose when a body exceeds --max-bytes
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def classify_sequential(urls, engine, max_pixels):
+    rows = []
+    for url in urls:
+        try:
+            response = requests.get(url, timeout=10)
+            response.raise_for_status()
+            img = open_image(BytesIO(response.content), TARGET_SIZE, max_pixels)
+            class_key, _, _ = predict_image(engine, preprocess_image(img, TARGET_SIZE), EXPECTED_CLASS_NAMES, 0)
+            rows.append(class_key)
+        except Exception:
+            rows.append(None)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Server delay per response")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent fetches")
+    parser.add_argument("--per-host", type=int, default=4, help="Concurrent fetches per host")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-bytes", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--max-pixels", type=int, default=4_000_000)
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    args = parser.parse_args()
+
+    files = {f"/img/{i}.jpg": jpeg_bytes(640 + 16 * (i % 8), 480, i) for i in range(args.images)}
+    files["/too-many-bytes.jpg"] = b"\xff" * (args.max_bytes + 1)
+    files["/too-many-pixels.jpg"] = jpeg_bytes(3000, 2000, 0)
+    server = start_server(files, args.latency_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [base_url + path for path in files] + [f"{base_url}/missing.jpg"]
+
+    engine = KerasInferenceEngine(load_model(args.model), max_batch_size=args.batch_size)
+    try:
+        start = time.perf_counter()
+        sequential = classify_sequential(urls, engine, args.max_pixels)
+        sequential_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = list(iter_classify_urls(
+            urls, engine, TARGET_SIZE, EXPECTED_CLASS_NAMES, 0, max_workers=args.workers,
+            per_host_limit=args.per_host, batch_size=args.batch_size, max_bytes=args.max_bytes,
+            max_pixels=args.max_pixels,
+        ))
+        bulk_seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    rows.sort(key=lambda row: row["index"])
+    ok = [row for row in rows if row["status"] == "ok"]
+    agree = sum(row["class_key"] == sequential[row["index"]] for row in ok)
+    print(f"{len(urls)} URLs ({args.images} images, 3 that must fail), {args.latency_ms:g} ms server latency")
+    print(f"{'mode':<12}{'seconds':>9}{'URLs/s':>9}")
+    print(f"{'sequential':<12}{sequential_seconds:>9.2f}{len(urls) / sequential_seconds:>9.1f}")
+    print(f"{'bulk':<12}{bulk_seconds:>9.2f}{len(urls) / bulk_seconds:>9.1f}   ({sequential_seconds / bulk_seconds:.1f}x)")
+    print(f"\nbulk: {len(ok)} classified, agreement with sequential {agree}/{len(ok)}")
+    for stage in ("fetch_ms", "decode_ms", "inference_ms"):
+        values = [row[stage] for row in ok]
+        print(f"  {stage:<14} p50 {np.percentile(values, 50):7.1f}  p90 {np.percentile(values, 90):7.1f}")
+    print(f"  mean batch size {np.mean([row['batch_size'] for row in ok]):.1f}")
+    for row in rows:
+        if row["status"] != "ok":
+            print(f"  failed {row['url'].replace(base_url, '')}: {row['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Time-to-first-render and time-to-first-prediction of the Streamlit app.
+
+Each run starts a fresh Python process that drives the app headlessly with
+streamlit.testing.v1.AppTest: it renders the page once (first render), then
+enters an image URL served from a local HTTP server and waits for the
+classification card (first prediction). Times are measured from process
+start, so import cost is included.
+
+    python -m benchmarks.bench_cold_start [--runs 3] [--ref <git-ref>] [--model model.keras]
+
+--ref additionally measures the app at another commit (checked out into a
+temporary git worktree) for a before/after comparison. Without --model the
+offline stand-in model is used, placed where the app expects its download.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.stand_in_model import save_stand_in_model
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import functools, http.server, json, os, sys, threading, time
+start = float(sys.argv[3])
+app_path, image_dir = sys.argv[1], sys.argv[2]
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=image_dir))
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(app_path, default_timeout=600)
+app.run()
+first_render = time.time() - start
+app.sidebar.radio[0].set_value("Image URL").run()
+app.text_input(key="url_input").set_value(f"http://127.0.0.1:{server.server_port}/sample.jpg").run()
+first_prediction = time.time() - start
+predicted = any("Confidence" in str(m.value) for m in app.markdown)
+print("RESULT " + json.dumps({
+    "first_render_s": first_render,
+    "first_prediction_s": first_prediction,
+    "predicted": predicted,
+    "errors": [str(e.value) for e in app.error] + [str(e.value) for e in app.exception],
+}))
+"""
+
+
+def prepare_workdir(work_dir, model_path):
+    cache_dir = work_dir / "model_cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    target = cache_dir / "downloaded_model.keras"
+    if model_path:
+        shutil.copy(model_path, target)
+    else:
+        save_stand_in_model(target)
+
+    image_dir = work_dir / "images"
+    image_dir.mkdir(exist_ok=True)
+    pixels = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(image_dir / "sample.jpg")
+    return image_dir
+
+
+def measure(app_path, work_dir, image_dir, runs):
+    samples = []
+    for _ in range(runs):
+        # A fresh working directory per run keeps the on-disk prediction cache cold.
+        shutil.rmtree(work_dir / "model_cache" / "predictions", ignore_errors=True)
+        env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3", PYTHONPATH=str(Path(app_path).parent))
+        start = f"{time.time():.6f}"
+        proc = subprocess.run(
+            [sys.executable, "-c", CHILD, str(app_path), str(image_dir), start],
+            cwd=work_dir, env=env, capture_output=True, text=True,
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+        if not lines:
+            raise RuntimeError(f"Cold-start run failed:\n{proc.stderr[-2000:]}")
+        samples.append(json.loads(lines[-1][len("RESULT "):]))
+    return {
+        "runs": samples,
+        "first_render_s": statistics.median(s["first_render_s"] for s in samples),
+        "first_prediction_s": statistics.median(s["first_prediction_s"] for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--ref", help="Also measure the app at this git ref (e.g. HEAD~1)")
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp) / "work"
+        image_dir = prepare_workdir(work_dir, args.model)
+        apps = {"current": REPO_ROOT / "streamlit_app.py"}
+        worktree = None
+        if args.ref:
+            worktree = Path(tmp) / "ref"
+            subprocess.run(["git", "-C", str(REPO_ROOT), "worktree", "add", "--detach", str(worktree), args.ref],
+                           check=True, capture_output=True)
+            apps = {args.ref: worktree / "streamlit_app.py", **apps}
+        try:
+            for name, app_path in apps.items():
+                results[name] = measure(app_path, work_dir, image_dir, args.runs)
+        finally:
+            if worktree:
+                subprocess.run(["git", "-C", str(REPO_ROOT), "worktree", "remove", "--force", str(worktree)],
+                               capture_output=True)
+
+    print(f"{'app':<16}{'first render s':>16}{'first prediction s':>20}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['first_render_s']:>16.2f}{result['first_prediction_s']:>20.2f}")
+        for run in result["runs"]:
+            if run["errors"] or not run["predicted"]:
+                print(f"  warning: run without a prediction or with errors: {run['errors']}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Inference latency: Keras `model.predict` vs utils.inference.KerasInferenceEngine.
+
+    python -m benchmarks.bench_inference [--model saved_models/model.keras] [--batch-sizes 1 4 16]
+
+Without --model the offline stand-in model is used.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.stand_in_model import load_model
+from utils.inference import KerasInferenceEngine
+from utils.model import predict_image
+from data.class_info import EXPECTED_CLASS_NAMES
+
+
+def latencies_ms(fn, repeats):
+    fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.array(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    start = time.perf_counter()
+    engine = KerasInferenceEngine(model, max_batch_size=max(args.batch_sizes))
+    print(f"Engine build + warmup: {(time.perf_counter() - start) * 1000:.0f} ms (buckets {engine.buckets})")
+
+    rng = np.random.default_rng(0)
+    print(f"{'path':<28}{'batch':>6}{'p50 ms':>10}{'p90 ms':>10}{'img/s':>10}")
+    for batch_size in args.batch_sizes:
+        batch = rng.random((batch_size,) + engine.input_shape, dtype=np.float32)
+        expected = model.predict(batch, verbose=0)
+        np.testing.assert_allclose(engine.predict(batch), expected, atol=1e-5)
+
+        paths = {
+            "model.predict": lambda: model.predict(batch, verbose=0),
+            "engine.predict": lambda: engine.predict(batch),
+        }
+        if batch_size == 1:
+            paths["predict_image(model)"] = lambda: predict_image(model, batch, EXPECTED_CLASS_NAMES, 50)
+            paths["predict_image(engine)"] = lambda: predict_image(engine, batch, EXPECTED_CLASS_NAMES, 50)
+        for name, fn in paths.items():
+            samples = latencies_ms(fn, args.repeats)
+            p50 = np.percentile(samples, 50)
+            print(f"{name:<28}{batch_size:>6}{p50:>10.2f}{np.percentile(samples, 90):>10.2f}{batch_size / p50 * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Throughput of multi-image classification by batch size.
+
+Classifies --images synthetic JPEGs (held in memory like Streamlit uploads)
+one at a time with predict_image, as the single "Upload Image" path does,
+and with utils.bulk_images.iter_classify_images for each --batch-sizes
+value. Decoding runs on --workers threads in the batched runs.
+
+    python -m benchmarks.bench_multi_image [--images 64] [--batch-sizes 1 4 16 32]
+        [--workers 4] [--model model.keras]
+
+Without --model the stand-in model is used.
+"""
+import argparse
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks.bench_preprocessing import synthetic_photo
+from benchmarks.stand_in_model import load_model
+from data.class_info import EXPECTED_CLASS_NAMES
+from utils.bulk_images import iter_classify_images
+from utils.image_processing import preprocess_image
+from utils.inference import KerasInferenceEngine
+from utils.model import predict_image
+from utils.preprocessing import open_image
+
+TARGET_SIZE = (299, 299)
+
+
+def make_uploads(count, size=(1280, 960)):
+    uploads = []
+    for i in range(count):
+        data = BytesIO()
+        Image.fromarray(synthetic_photo(*size, seed=i)).save(data, format="JPEG", quality=90)
+        data.name = f"photo{i}.jpg"
+        uploads.append(data)
+    return uploads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--workers", type=int, default=4, help="Decode threads")
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    args = parser.parse_args()
+
+    uploads = make_uploads(args.images)
+    engine = KerasInferenceEngine(load_model(args.model), max_batch_size=max(args.batch_sizes))
+    list(iter_classify_images(uploads[:4], engine, TARGET_SIZE, EXPECTED_CLASS_NAMES, 0))  # warm up
+
+    start = time.perf_counter()
+    single = []
+    for upload in uploads:
+        upload.seek(0)
+        img_batch = preprocess_image(open_image(upload, TARGET_SIZE), TARGET_SIZE)
+        single.append(predict_image(engine, img_batch, EXPECTED_CLASS_NAMES, 0)[0])
+    single_seconds = time.perf_counter() - start
+
+    print(f"{args.images} images, {args.workers} decode threads")
+    print(f"{'mode':<22}{'seconds':>9}{'images/s':>10}{'mean batch':>12}{'agreement':>11}")
+    print(f"{'one at a time':<22}{single_seconds:>9.2f}{args.images / single_seconds:>10.1f}{1.0:>12.1f}{1.0:>11.3f}")
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        rows = list(iter_classify_images(uploads, engine, TARGET_SIZE, EXPECTED_CLASS_NAMES, 0,
+                                         max_workers=args.workers, batch_size=batch_size))
+        seconds = time.perf_counter() - start
+        agreement = sum(row["class_key"] == single[row["index"]] for row in rows) / len(rows)
+        mean_batch = sum(row["batch_size"] for row in rows) / len(rows)
+        print(f"{f'batched (max {batch_size})':<22}{seconds:>9.2f}{args.images / seconds:>10.1f}{mean_batch:>12.1f}{agreement:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-image preprocessing benchmark and parity check.
+
+Compares the original PIL -> img_to_array -> / 255 path against
+utils.preprocessing for PIL inputs, ndarray (video frame) inputs and JPEG
+draft-mode decoding, and fails if the outputs drift beyond the tolerances.
+
+    python -m benchmarks.bench_preprocessing [--repeats 20]
+"""
+import argparse
+import sys
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.preprocessing import allocate_batch, open_image, preprocess_into
+
+TARGET_SIZE = (299, 299)
+SIZES = [(640, 480), (1920, 1080), (4000, 3000)]
+# Interpolation differs for ndarray inputs (OpenCV INTER_AREA vs PIL LANCZOS)
+# and draft decoding downsamples in the DCT domain, so those are compared with
+# a tolerance. PIL inputs must match the original path exactly.
+MEAN_ABS_TOLERANCE = 0.01
+MAX_ABS_TOLERANCE = 0.25
+
+
+def synthetic_photo(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(2, height // 40), max(2, width // 40), 3), dtype=np.uint8)
+    img = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    cv2.circle(img, (width // 2, height // 2), min(width, height) // 4, (250, 10, 30), -1)
+    cv2.putText(img, "GLASS", (width // 10, height // 5), cv2.FONT_HERSHEY_SIMPLEX, width / 400, (255, 255, 255), 3)
+    return img
+
+
+def legacy_preprocess(img_pil, target_size):
+    img_resized = img_pil.resize(target_size, Image.Resampling.LANCZOS)
+    img_array = np.asarray(img_resized, dtype=np.float32)  # what img_to_array returns
+    img_array = img_array / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def time_per_call(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def compare(name, actual, expected, exact=False):
+    diff = np.abs(actual.astype(np.float64) - expected.astype(np.float64))
+    ok = diff.max() == 0 if exact else (diff.mean() <= MEAN_ABS_TOLERANCE and diff.max() <= MAX_ABS_TOLERANCE)
+    print(f"    {name:<24} max_abs={diff.max():.4f} mean_abs={diff.mean():.5f} {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    all_ok = True
+    out = allocate_batch(1, TARGET_SIZE)
+    for width, height in SIZES:
+        rgb = synthetic_photo(width, height)
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        img_pil = Image.fromarray(rgb)
+        jpeg = BytesIO()
+        img_pil.save(jpeg, format="JPEG", quality=92)
+        jpeg_bytes = jpeg.getvalue()
+
+        expected = legacy_preprocess(img_pil, TARGET_SIZE)[0]
+        print(f"{width}x{height} ({width * height / 1e6:.1f} MP)")
+
+        print("  parity")
+        all_ok &= compare("PIL input", preprocess_into(img_pil, TARGET_SIZE, out[0]), expected, exact=True)
+        all_ok &= compare("ndarray BGR frame", preprocess_into(bgr, TARGET_SIZE, out[0], bgr=True), expected)
+        full_decode = legacy_preprocess(Image.open(BytesIO(jpeg_bytes)).convert("RGB"), TARGET_SIZE)[0]
+        draft_decode = preprocess_into(open_image(BytesIO(jpeg_bytes), TARGET_SIZE), TARGET_SIZE, out[0])
+        all_ok &= compare("JPEG draft decode", draft_decode, full_decode)
+
+        print("  ms per image")
+        timings = {
+            "legacy (PIL frame)": lambda: legacy_preprocess(Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)), TARGET_SIZE),
+            "ndarray BGR frame": lambda: preprocess_into(bgr, TARGET_SIZE, out[0], bgr=True),
+            "legacy JPEG decode": lambda: legacy_preprocess(Image.open(BytesIO(jpeg_bytes)).convert("RGB"), TARGET_SIZE),
+            "JPEG draft decode": lambda: preprocess_into(open_image(BytesIO(jpeg_bytes), TARGET_SIZE), TARGET_SIZE, out[0]),
+        }
+        for name, fn in timings.items():
+            print(f"    {name:<24} {time_per_call(fn, args.repeats):8.2f}")
+
+    if not all_ok:
+        print("Preprocessing parity check FAILED")
+        sys.exit(1)
+    print("Preprocessing parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Memory and export time of video results: list of row dicts vs VideoResultStore.
+
+Builds --rows result rows as VideoAnalysisPipeline yields them (a long video
+sampled at a short interval, with the class changing every few seconds) and
+keeps them two ways:
+
+- rows: the list of dicts the app used to keep, turned into a DataFrame
+  for display and export
+- store: utils.video_results.VideoResultStore columns, with and without
+  the probability matrix
+
+    python -m benchmarks.bench_video_results [--rows 200000] [--fps 30] [--interval 0.2]
+
+Reports retained memory (tracemalloc) and the time to build the frame
+table, the segments and CSV / Parquet exports.
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from data.class_info import CLASS_INFO, EXPECTED_CLASS_NAMES
+from utils.video_results import VideoResultStore
+
+
+def make_rows(count, fps, interval, seed=0):
+    rng = np.random.default_rng(seed)
+    frame_skip = max(1, int(fps * interval))
+    keys = list(CLASS_INFO)
+    # One class per scene of 2-20 s, as in footage of items passing by.
+    scene_rows = rng.integers(int(2 / interval), int(20 / interval), size=count)
+    scene_classes = rng.integers(0, len(keys), size=count)
+    probs = rng.dirichlet(np.ones(len(EXPECTED_CLASS_NAMES)), size=count).astype(np.float32)
+    scene, left = 0, scene_rows[0]
+    for i in range(count):
+        if left == 0:
+            scene += 1
+            left = scene_rows[scene]
+        left -= 1
+        key = keys[scene_classes[scene]]
+        frame_index = i * frame_skip
+        yield {
+            "Frame": frame_index,
+            "Timestamp (s)": round(frame_index / fps, 2),
+            "Predicted Class": CLASS_INFO[key]['display_name'],
+            "Confidence (%)": round(float(rng.uniform(40, 100)), 2),
+            "Class Key": key,
+            "Probabilities": probs[i],
+        }
+
+
+def rows_table(rows):
+    return pd.DataFrame(rows)
+
+
+def rows_segments(rows):
+    frame = rows_table(rows)
+    run = (frame["Class Key"] != frame["Class Key"].shift()).cumsum()
+    return frame.groupby(run).agg(start=("Timestamp (s)", "first"), end=("Timestamp (s)", "last"),
+                                  frames=("Frame", "size"), confidence=("Confidence (%)", "mean"))
+
+
+def retained(build):
+    """Returns build() and the MB it still holds afterwards."""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size / 2 ** 20
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between sampled frames")
+    args = parser.parse_args()
+
+    def rows_without_probs():
+        for row in make_rows(args.rows, args.fps, args.interval):
+            del row["Probabilities"]
+            yield row
+
+    hours = args.rows * args.interval / 3600
+    print(f"{args.rows} rows ({hours:.1f} h of video at one frame every {args.interval:g} s)\n")
+    print(f"{'results':<22}{'memory MB':>11}{'table ms':>10}{'segments ms':>13}{'CSV ms':>9}{'Parquet ms':>12}")
+
+    rows, rows_mb = retained(lambda: list(rows_without_probs()))
+    print(f"{'list of dicts':<22}{rows_mb:>11.1f}{timed(lambda: rows_table(rows)):>10.0f}"
+          f"{timed(lambda: rows_segments(rows)):>13.0f}{timed(lambda: rows_table(rows).to_csv(io.StringIO(), index=False)):>9.0f}"
+          f"{timed(lambda: rows_table(rows).to_parquet(io.BytesIO(), index=False)):>12.0f}")
+    rows.clear()  # the dicts would otherwise count towards the store measurements
+
+    for label, prob_class_names, source in (
+        ("store", None, rows_without_probs),
+        ("store + probabilities", EXPECTED_CLASS_NAMES, lambda: make_rows(args.rows, args.fps, args.interval)),
+    ):
+        store, store_mb = retained(
+            lambda: VideoResultStore(CLASS_INFO, capacity=args.rows, prob_class_names=prob_class_names).extend(source())
+        )
+        print(f"{label:<22}{store_mb:>11.1f}{timed(store.to_frame):>10.0f}"
+              f"{timed(store.segments):>13.0f}{timed(lambda: store.to_csv(io.StringIO())):>9.0f}"
+              f"{timed(lambda: store.to_parquet(io.BytesIO())):>12.0f}")
+    print(f"\n{len(store.segments()['frames'])} segments")
+
+
+if __name__ == "__main__":
+    main()
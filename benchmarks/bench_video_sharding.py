@@ -0,0 +1,87 @@
+"""
+Scaling of sharded (multi-process) video analysis with the number of workers.
+
+The video is analysed once in-process with VideoAnalysisPipeline as the
+reference, then with ShardedVideoAnalyzer for each --workers count. Each
+count runs twice: the cold run includes starting the workers and loading
+their models, the warm run reuses the pool the way the app does. Rows must
+match the reference frame for frame.
+
+    python -m benchmarks.bench_video_sharding [--video clip.mp4] [--model model.keras]
+        [--workers 1 2 4 8] [--seconds 120] [--interval 0.2] [--backend keras]
+
+Without --video a synthetic clip of --seconds seconds is generated; without
+--model the stand-in model is used. Speedup is bounded by the number of
+cores: on a machine with fewer cores than workers the extra processes only
+add overhead.
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stand_in_model import save_stand_in_model
+from benchmarks.synthetic_media import synthetic_video
+from data.class_info import CLASS_INFO, EXPECTED_CLASS_NAMES
+from utils.model import load_inference_engine, MODEL_DOWNLOAD_URL
+from utils.video_pipeline import VideoAnalysisPipeline
+from utils.video_sharding import ShardedVideoAnalyzer
+
+TARGET_SIZE = (299, 299)
+
+
+def compare(reference, rows):
+    """Returns (rows match, largest confidence difference in percentage points)."""
+    same = [r["Frame"] for r in reference] == [r["Frame"] for r in rows] and all(
+        a["Class Key"] == b["Class Key"] for a, b in zip(reference, rows)
+    )
+    max_diff = max((abs(a["Confidence (%)"] - b["Confidence (%)"]) for a, b in zip(reference, rows)), default=0.0)
+    return same, max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Video file (default: synthetic clip)")
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=120.0, help="Length of the synthetic clip")
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between sampled frames")
+    parser.add_argument("--backend", default="keras", help="keras, tflite-float32, tflite-float16 or tflite-int8")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_path = Path(args.model) if args.model else save_stand_in_model(Path(work_dir) / "stand_in.keras")
+        video_path = args.video
+        if not video_path:
+            video_path, _ = synthetic_video(Path(work_dir) / "clip.mp4", seconds=args.seconds)
+        video_path = str(video_path)
+        print(f"CPU cores: {os.cpu_count()}")
+
+        engine = load_inference_engine(MODEL_DOWNLOAD_URL, model_path.parent, model_path.name, backend=args.backend,
+                                       max_batch_size=args.batch_size)
+        # Threshold 0 so rows carry the arg-max class instead of mostly "unknown".
+        pipeline = VideoAnalysisPipeline(engine, TARGET_SIZE, CLASS_INFO, EXPECTED_CLASS_NAMES, 0, batch_size=args.batch_size)
+        reference, reference_seconds = pipeline.run(video_path, args.interval)
+        print(f"\n{'workers':<10}{'shards':>7}{'rows':>6}{'cold s':>9}{'warm s':>9}{'rows/s':>9}{'speedup':>9}{'match':>7}{'max Δ%':>8}")
+        print(f"{'in-proc':<10}{1:>7}{len(reference):>6}{'':>9}{reference_seconds:>9.2f}"
+              f"{len(reference) / reference_seconds:>9.1f}{1.0:>9.2f}{'yes':>7}{0.0:>8.2f}")
+
+        for num_workers in args.workers:
+            analyzer = ShardedVideoAnalyzer(num_workers, args.backend, args.batch_size, model_path)
+            try:
+                run_args = (video_path, args.interval, TARGET_SIZE, CLASS_INFO, EXPECTED_CLASS_NAMES, 0)
+                _, cold_seconds = analyzer.run(*run_args)
+                start = time.perf_counter()
+                rows, _ = analyzer.run(*run_args)
+                warm_seconds = time.perf_counter() - start
+            finally:
+                analyzer.close()
+            same, max_diff = compare(reference, rows)
+            print(f"{num_workers:<10}{analyzer.stats['shards']:>7}{len(rows):>6}{cold_seconds:>9.2f}{warm_seconds:>9.2f}"
+                  f"{len(rows) / warm_seconds:>9.1f}{reference_seconds / warm_seconds:>9.2f}{'yes' if same else 'NO':>7}{max_diff:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Accuracy parity, latency and memory of the inference backends.
+
+Every backend runs in its own spawned process so its resident memory is
+measured in isolation. Parity is reported against the Keras backend as
+top-1 agreement and maximum absolute probability difference.
+
+    python -m benchmarks.compare_backends [--model model.keras] [--images DIR]
+        [--backends keras tflite-float32 tflite-float16 tflite-int8] [--threads 4]
+
+Without --model the offline stand-in model is used; without --images the
+inputs are synthetic photos. Use real photos for meaningful agreement numbers.
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.run_benchmarks import wait_for_result
+
+TARGET_SIZE = (299, 299)
+MIN_TOP1_AGREEMENT = 0.98
+MAX_PROB_DIFF = 0.05
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_inputs(images_dir, count):
+    from utils.preprocessing import allocate_batch, open_image, preprocess_into
+
+    if images_dir:
+        paths = sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))[:count]
+        batch = allocate_batch(len(paths), TARGET_SIZE)
+        for i, path in enumerate(paths):
+            preprocess_into(open_image(path, TARGET_SIZE), TARGET_SIZE, batch[i])
+        return batch
+
+    from benchmarks.bench_preprocessing import synthetic_photo
+    batch = allocate_batch(count, TARGET_SIZE)
+    for i in range(count):
+        preprocess_into(synthetic_photo(640, 480, seed=i), TARGET_SIZE, batch[i], bgr=True)
+    return batch
+
+
+def run_backend(backend, model_path, inputs_path, threads, repeats, result_queue):
+    try:
+        import tensorflow  # noqa: F401  (import cost is not attributed to the backend)
+        from utils.inference import KerasInferenceEngine, TFLiteInferenceEngine, tflite_artifact_path
+
+        inputs = np.load(inputs_path)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        if backend == "keras":
+            import tensorflow as tf
+            engine = KerasInferenceEngine(tf.keras.models.load_model(model_path))
+            artifact_mb = Path(model_path).stat().st_size / (1024 * 1024)
+        else:
+            tflite_path = tflite_artifact_path(model_path, backend.split("-", 1)[1])
+            engine = TFLiteInferenceEngine(tflite_path, num_threads=threads, backend=backend)
+            artifact_mb = tflite_path.stat().st_size / (1024 * 1024)
+        load_seconds = time.perf_counter() - start
+        rss_loaded = current_rss_mb()
+
+        probs = engine.predict(inputs)
+        latencies = {}
+        for batch_size in (1, engine.max_batch_size):
+            batch = inputs[:batch_size]
+            if len(batch) < batch_size:
+                batch = np.resize(inputs, (batch_size,) + inputs.shape[1:])
+            samples = []
+            for _ in range(repeats):
+                t = time.perf_counter()
+                engine.predict(batch)
+                samples.append((time.perf_counter() - t) * 1000)
+            latencies[batch_size] = float(np.percentile(samples, 50))
+
+        result_queue.put({
+            "backend": backend,
+            "probs": probs,
+            "load_seconds": load_seconds,
+            "artifact_mb": artifact_mb,
+            "rss_delta_mb": rss_loaded - rss_before,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "latency_ms": latencies,
+        })
+    except Exception as e:
+        result_queue.put({"backend": backend, "error": repr(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    parser.add_argument("--images", help="Directory of evaluation images (default: synthetic)")
+    parser.add_argument("--count", type=int, default=64, help="Number of images to evaluate")
+    parser.add_argument("--backends", nargs="+", default=["keras", "tflite-float32", "tflite-float16", "tflite-int8"])
+    parser.add_argument("--threads", type=int, default=None, help="TFLite interpreter threads (default: all cores)")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_path = args.model
+        if not model_path:
+            from benchmarks.stand_in_model import save_stand_in_model
+            model_path = str(save_stand_in_model(Path(work_dir) / "stand_in.keras"))
+        inputs_path = Path(work_dir) / "inputs.npy"
+        np.save(inputs_path, load_inputs(args.images, args.count))
+
+        # Convert up front so one-time conversion cost is not counted as load time.
+        from utils.inference import convert_to_tflite
+        for backend in args.backends:
+            if backend.startswith("tflite-"):
+                convert_to_tflite(model_path, backend.split("-", 1)[1])
+
+        context = multiprocessing.get_context("spawn")
+        results = {}
+        for backend in ["keras"] + [b for b in args.backends if b != "keras"]:
+            result_queue = context.Queue()
+            process = context.Process(
+                target=run_backend,
+                args=(backend, model_path, str(inputs_path), args.threads, args.repeats, result_queue),
+            )
+            process.start()
+            results[backend] = wait_for_result(process, result_queue)
+
+    reference = results["keras"].get("probs")
+    if reference is None:
+        print(f"Keras backend failed: {results['keras'].get('error')}")
+        sys.exit(1)
+
+    ok = True
+    print(f"{'backend':<16}{'top-1 agr':>10}{'max |dp|':>10}{'b1 ms':>9}{'b16 ms':>9}{'load s':>8}{'file MB':>9}{'+RSS MB':>9}{'peak MB':>9}")
+    for backend, result in results.items():
+        if "error" in result:
+            print(f"{backend:<16} failed: {result['error']}")
+            ok = False
+            continue
+        probs = result["probs"]
+        agreement = float(np.mean(probs.argmax(axis=1) == reference.argmax(axis=1)))
+        max_diff = float(np.max(np.abs(probs - reference)))
+        if backend != "keras" and (agreement < MIN_TOP1_AGREEMENT or max_diff > MAX_PROB_DIFF):
+            ok = False
+        latency = list(result["latency_ms"].values())
+        print(f"{backend:<16}{agreement:>10.3f}{max_diff:>10.4f}{latency[0]:>9.2f}{latency[-1]:>9.2f}"
+              f"{result['load_seconds']:>8.2f}{result['artifact_mb']:>9.1f}{result['rss_delta_mb']:>9.0f}{result['peak_rss_mb']:>9.0f}")
+
+    if not ok:
+        print(f"Parity check FAILED (need top-1 agreement >= {MIN_TOP1_AGREEMENT} and max |dp| <= {MAX_PROB_DIFF})")
+        sys.exit(1)
+    print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Failure scenarios for utils.download.download_file against a local HTTP server.
+
+Each scenario starts a threaded HTTP/1.1 server on localhost that serves one
+.keras-like zip archive (--size MB of weights). Depending on the scenario it
+cuts the first response off halfway, ignores Range requests, omits
+Content-Length or serves something that is not a model. The model
+downloader's own validator (utils.model._is_keras_archive) is used, and every
+scenario checks that the destination path either holds exactly the served
+archive or does not exist:
+
+- interrupted transfer resumed with a Range request
+- truncated existing model file downloaded again
+- leftover .part resumed
+- server that ignores Range restarts from zero
+- corrupt .part detected and downloaded again from scratch
+- SHA-256 mismatch rejected
+- body that is not a zip archive rejected
+- truncated body without Content-Length rejected
+- concurrent callers share one download
+- valid existing file used without a request
+
+    python -m benchmarks.download_scenarios [--size 4]
+
+Retries wait 2 s, so a run takes a few seconds. Exits 1 if any scenario fails.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+
+from utils.download import download_file, DownloadError, DEFAULT_CHUNK_SIZE
+from utils.model import _is_keras_archive
+
+
+def keras_archive(size_mb):
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w") as archive:
+        archive.writestr("metadata.json", '{"keras_version": "3"}')
+        archive.writestr("config.json", '{"class_name": "Functional"}')
+        archive.writestr("model.weights.h5", os.urandom(int(size_mb * 1024 * 1024)))
+    return out.getvalue()
+
+
+@contextmanager
+def serve(body, ranges=True, content_length=True, cut_first=0, cut_at=None):
+    """
+    Serves body at every path and yields (url, log). The first cut_first
+    responses stop after cut_at bytes; log holds the Range header of each GET.
+    """
+    log = []
+    cut_at = len(body) // 2 if cut_at is None else cut_at
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            range_header = self.headers.get("Range")
+            log.append(range_header)
+            start = 0
+            if range_header and ranges:
+                start = int(re.match(r"bytes=(\d+)-", range_header).group(1))
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            else:
+                self.send_response(200)
+            data = body[start:]
+            if content_length:
+                self.send_header("Content-Length", str(len(data)))
+            else:
+                # Without a length the body ends when the connection closes.
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            if len(log) <= cut_first:
+                data = data[:cut_at]
+                self.close_connection = True
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass  # cut-off responses reset connections on purpose
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/model.keras", log
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def download(url, dest, **kwargs):
+    return download_file(url, dest, validator=_is_keras_archive, timeout=5, max_retries=2, **kwargs)
+
+
+def expect_payload(dest, payload):
+    assert dest.read_bytes() == payload, "destination differs from the served archive"
+    assert not Path(f"{dest}.part").exists(), ".part left behind"
+
+
+def expect_rejected(url, dest, **kwargs):
+    try:
+        download(url, dest, **kwargs)
+    except DownloadError as e:
+        assert not dest.exists(), "rejected file was moved into place"
+        assert not Path(f"{dest}.part").exists(), ".part left behind"
+        return str(e)
+    raise AssertionError(f"accepted; {dest.stat().st_size} bytes at the destination")
+
+
+def interrupted_transfer(dest, payload):
+    # Cut two and a half chunks in, so a full chunk is on disk at every --size.
+    chunk_size = min(DEFAULT_CHUNK_SIZE, len(payload) // 4)
+    with serve(payload, cut_first=1, cut_at=chunk_size * 5 // 2) as (url, log):
+        download(url, dest, chunk_size=chunk_size)
+    expect_payload(dest, payload)
+    # Resumes from the last chunk written before the cut, not necessarily the cut itself.
+    assert len(log) == 2 and log[0] is None and re.fullmatch(r"bytes=[1-9]\d*-", log[1] or ""), log
+    return f"resumed with {log[1]}"
+
+
+def truncated_existing_file(dest, payload):
+    dest.write_bytes(payload[:len(payload) // 3])
+    with serve(payload) as (url, log):
+        download(url, dest)
+    expect_payload(dest, payload)
+    return f"{len(log)} GET"
+
+
+def leftover_part(dest, payload):
+    Path(f"{dest}.part").write_bytes(payload[:len(payload) // 2])
+    with serve(payload) as (url, log):
+        download(url, dest)
+    expect_payload(dest, payload)
+    assert log == [f"bytes={len(payload) // 2}-"], log
+    return f"resumed with {log[0]}"
+
+
+def range_ignored(dest, payload):
+    with serve(payload, ranges=False, cut_first=1) as (url, log):
+        download(url, dest)
+    expect_payload(dest, payload)
+    return f"{len(log)} GETs, restarted from zero"
+
+
+def corrupt_part(dest, payload):
+    Path(f"{dest}.part").write_bytes(os.urandom(len(payload) // 2))
+    with serve(payload) as (url, log):
+        download(url, dest)
+    expect_payload(dest, payload)
+    assert log == [f"bytes={len(payload) // 2}-", None], log
+    return "resumed file failed validation, downloaded from scratch"
+
+
+def checksum_mismatch(dest, payload):
+    with serve(payload) as (url, _):
+        return expect_rejected(url, dest, expected_sha256=hashlib.sha256(b"other").hexdigest())
+
+
+def not_a_zip(dest, payload):
+    with serve(os.urandom(7000)) as (url, _):
+        return expect_rejected(url, dest)
+
+
+def truncated_without_length(dest, payload):
+    with serve(payload, content_length=False, cut_first=1) as (url, _):
+        return expect_rejected(url, dest)
+
+
+def concurrent_callers(dest, payload, callers=4):
+    errors = []
+
+    def call():
+        try:
+            download(url, dest)
+        except Exception as e:
+            errors.append(e)
+
+    with serve(payload) as (url, log):
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert not errors, errors
+    expect_payload(dest, payload)
+    assert len(log) == 1, f"{len(log)} GETs"
+    return f"{callers} callers, 1 GET"
+
+
+def valid_existing_file(dest, payload):
+    dest.write_bytes(payload)
+    with serve(payload) as (url, log):
+        download(url, dest)
+    expect_payload(dest, payload)
+    assert not log, f"{len(log)} GETs"
+    return "no request"
+
+
+SCENARIOS = (
+    interrupted_transfer, truncated_existing_file, leftover_part, range_ignored, corrupt_part,
+    checksum_mismatch, not_a_zip, truncated_without_length, concurrent_callers, valid_existing_file,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=float, default=4.0, help="MB of weights in the served archive")
+    args = parser.parse_args()
+
+    payload = keras_archive(args.size)
+    failures = 0
+    for scenario in SCENARIOS:
+        with tempfile.TemporaryDirectory() as work_dir:
+            dest = Path(work_dir) / "model.keras"
+            try:
+                detail = scenario(dest, payload)
+                print(f"PASS  {scenario.__name__:<26}{detail}")
+            except Exception as e:
+                failures += 1
+                print(f"FAIL  {scenario.__name__:<26}{type(e).__name__}: {e}")
+    print(f"\n{len(SCENARIOS) - failures}/{len(SCENARIOS)} scenarios passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Load generator for inference_server.py.
+
+Sends POST /predict requests from N concurrent clients (one keep-alive
+session each) for every concurrency level and reports p50/p99 latency,
+throughput and the mean batch size the server formed.
+
+    python -m benchmarks.load_generator [--url http://127.0.0.1:8000] [--concurrency 1 4 16 32]
+        [--requests 200] [--image photo.jpg] [--timeout-ms 10000]
+    python -m benchmarks.load_generator --spawn-server [--server-args="--max-wait-ms 10"]
+
+--spawn-server starts inference_server.py on a free port in the current
+directory (so it uses ./model_cache) and stops it afterwards. Without
+--image the payload is a synthetic 640x480 JPEG.
+"""
+import argparse
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import requests
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def wait_until_ready(base_url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            response = requests.get(f"{base_url}/readyz", timeout=2)
+            if response.status_code == 200:
+                return response.json()
+            if response.json().get("status") == "failed":
+                raise RuntimeError(f"Server failed to load the model: {response.json().get('error')}")
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{base_url} was not ready after {timeout:.0f}s")
+
+
+def spawn_server(server_args):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    command = [sys.executable, str(REPO_ROOT / "inference_server.py"), "--port", str(port)] + shlex.split(server_args)
+    env = {**os.environ, "PYTHONPATH": str(REPO_ROOT), "TF_CPP_MIN_LOG_LEVEL": "3"}
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def run_level(base_url, payload, concurrency, total_requests, timeout_ms):
+    latencies, batch_sizes, statuses = [], [], {}
+    lock = threading.Lock()
+    remaining = [total_requests]
+
+    def client():
+        session = requests.Session()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                response = session.post(
+                    f"{base_url}/predict", data=payload, headers={"Content-Type": "image/jpeg"},
+                    params={"timeout_ms": timeout_ms}, timeout=timeout_ms / 1000 + 5,
+                )
+                status = response.status_code
+                batch_size = response.json().get("batch_size") if status == 200 else None
+            except requests.exceptions.RequestException:
+                status, batch_size = "conn-error", None
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed_ms)
+                    batch_sizes.append(batch_size)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+
+    ok = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "ok": ok,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "p50_ms": float(np.percentile(latencies, 50)) if ok else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if ok else None,
+        "throughput_rps": ok / wall_seconds,
+        "mean_batch_size": float(np.mean(batch_sizes)) if ok else None,
+    }
+
+
+def _fmt(value, width):
+    return f"{value:>{width}.1f}" if value is not None else f"{'-':>{width}}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL")
+    parser.add_argument("--spawn-server", action="store_true", help="Start inference_server.py for the run")
+    parser.add_argument("--server-args", default="", help="Extra arguments for the spawned server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--image", help="Image file to send (default: synthetic JPEG)")
+    parser.add_argument("--timeout-ms", type=float, default=10000, help="Per-request deadline sent to the server")
+    parser.add_argument("--ready-timeout", type=float, default=600, help="Seconds to wait for /readyz")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.image:
+        payload = Path(args.image).read_bytes()
+    else:
+        from benchmarks.bench_preprocessing import synthetic_photo
+        payload = cv2.imencode(".jpg", synthetic_photo(640, 480))[1].tobytes()
+
+    process = None
+    base_url = args.url.rstrip("/")
+    if args.spawn_server:
+        process, base_url = spawn_server(args.server_args)
+    try:
+        ready = wait_until_ready(base_url, args.ready_timeout)
+        print(f"Server ready at {base_url} (backend {ready.get('backend')}, loaded in {ready.get('load_seconds')}s)")
+        # One untimed request so lazy imports on the request path are not measured.
+        requests.post(f"{base_url}/predict", data=payload, headers={"Content-Type": "image/jpeg"}, timeout=60)
+
+        results = []
+        print(f"{'clients':>8}{'ok':>7}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>9}{'batch':>7}  statuses")
+        for concurrency in args.concurrency:
+            result = run_level(base_url, payload, concurrency, args.requests, args.timeout_ms)
+            results.append(result)
+            print(f"{concurrency:>8}{result['ok']:>7}{_fmt(result['p50_ms'], 10)}{_fmt(result['p99_ms'], 10)}"
+                  f"{result['throughput_rps']:>9.1f}{_fmt(result['mean_batch_size'], 7)}  {result['statuses']}")
+        print(f"Server stats: {requests.get(f'{base_url}/stats', timeout=5).json()}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
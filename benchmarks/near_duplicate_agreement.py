@@ -0,0 +1,121 @@
+"""
+How often reusing a near-duplicate's result changes the predicted class.
+
+Each base image is followed (later, in shuffled order) by edited copies of
+it: JPEG re-encoding, rescaling, a brightness change, a small crop and a
+small shift, like re-photographed items or re-encoded URLs. Every image is
+classified fresh once; then, for each Hamming distance in --distances, the
+stream is replayed through a NearDuplicateIndex and every reused result is
+compared with the fresh prediction of that image.
+
+    python -m benchmarks.near_duplicate_agreement [--images DIR] [--model model.keras]
+        [--count 40] [--distances 0 2 4 6 8 10] [--method phash]
+
+Reported per distance: hit rate (share of lookups answered from the
+index), class disagreement among hits, hits whose match came from a
+different base image, and the mean absolute change of the top-1
+confidence. Without --images the bases are synthetic photos; without
+--model the stand-in model is used, which predicts almost the same class
+for everything, so use the real model and photos for meaningful class
+disagreement numbers. Cross-image hits do not depend on the model.
+"""
+import argparse
+import random
+from io import BytesIO
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_preprocessing import synthetic_photo
+from benchmarks.stand_in_model import load_model
+from utils.near_duplicates import hamming_distance, HASH_METHODS, NearDuplicateIndex
+from utils.preprocessing import allocate_batch, open_image, preprocess_into
+
+TARGET_SIZE = (299, 299)
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+def load_bases(images_dir, count):
+    if images_dir:
+        paths = sorted(p for p in Path(images_dir).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)[:count]
+        return [np.asarray(open_image(path)) for path in paths]
+    rng = np.random.default_rng(0)
+    return [synthetic_photo(int(rng.integers(480, 1280)), int(rng.integers(360, 960)), seed=i) for i in range(count)]
+
+
+def variants(rgb):
+    """Edited copies of an RGB image that a person would call the same picture."""
+    height, width = rgb.shape[:2]
+
+    def reencode(image, quality):
+        data = BytesIO()
+        Image.fromarray(image).save(data, format="JPEG", quality=quality)
+        return np.asarray(Image.open(data).convert("RGB"))
+
+    crop_y, crop_x = height // 50, width // 50
+    return {
+        "jpeg_q40": reencode(rgb, 40),
+        "rescaled": cv2.resize(cv2.resize(rgb, (width * 2 // 3, height * 2 // 3), interpolation=cv2.INTER_AREA), (width, height)),
+        "brighter": cv2.convertScaleAbs(rgb, alpha=1.0, beta=20),
+        "cropped": rgb[crop_y:height - crop_y, crop_x:width - crop_x],
+        "shifted": np.roll(rgb, width // 100, axis=1),
+    }
+
+
+def predict_all(model, images, batch_size=16):
+    batch = allocate_batch(batch_size, TARGET_SIZE)
+    probs = []
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        for i, image in enumerate(chunk):
+            preprocess_into(image, TARGET_SIZE, batch[i])
+        probs.extend(model.predict(batch[:len(chunk)], verbose=0))
+    return np.array(probs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of base photos (default: synthetic photos)")
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    parser.add_argument("--count", type=int, default=40, help="Number of base images")
+    parser.add_argument("--distances", type=int, nargs="+", default=[0, 2, 4, 6, 8, 10])
+    parser.add_argument("--method", choices=HASH_METHODS, default="phash")
+    args = parser.parse_args()
+
+    bases = load_bases(args.images, args.count)
+    edited = [(group, name, image) for group, base in enumerate(bases) for name, image in variants(base).items()]
+    random.Random(0).shuffle(edited)
+    stream = [(group, "original", image) for group, image in enumerate(bases)] + edited
+    probs = predict_all(load_model(args.model), [image for _, _, image in stream])
+    hasher = NearDuplicateIndex(method=args.method)
+    hashes = [hasher.hash(image) for _, _, image in stream]
+    print(f"{len(bases)} base images, {len(stream)} lookups, {args.method}")
+
+    print(f"\n{'distance':>8}{'hit rate':>10}{'disagree':>10}{'cross-image':>13}{'mean Δconf %':>14}")
+    for distance in args.distances:
+        index = NearDuplicateIndex(max_distance=distance, method=args.method)
+        owner = {}
+        disagreements = cross_image = 0
+        confidence_changes = []
+        for (group, _, _), image_hash, fresh in zip(stream, hashes, probs):
+            match = index.lookup(image_hash)
+            if match is None:
+                index.add(image_hash, fresh)
+                owner[image_hash] = group
+                continue
+            reused, _ = match
+            disagreements += reused.argmax() != fresh.argmax()
+            # The index never evicts here, so the match is one of the nearest indexed hashes.
+            nearest = min(hamming_distance(h, image_hash) for h in owner)
+            cross_image += all(g != group for h, g in owner.items() if hamming_distance(h, image_hash) == nearest)
+            confidence_changes.append(abs(reused.max() - fresh.max()) * 100)
+        stats = index.stats()
+        hits = max(1, stats["hits"])
+        mean_change = np.mean(confidence_changes) if confidence_changes else 0.0
+        print(f"{distance:>8}{stats['hit_rate']:>10.1%}{disagreements / hits:>10.1%}{cross_image / hits:>13.1%}{mean_change:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Reproducible offline benchmark suite for preprocessing, inference and video.
+
+Every suite runs in a fresh spawned process, so import state does not leak
+between suites and peak RSS is measured per suite. Inputs are the offline
+stand-in model (or --model), seeded synthetic photos and a generated video,
+so two runs on one machine measure the same work.
+
+    python -m benchmarks.run_benchmarks [--output results.json] [--suites preprocessing inference video]
+    python -m benchmarks.run_benchmarks --baseline baseline.json [--threshold 0.15]
+
+Metrics ending in _ms or _mb are better when lower; _per_s and _fps metrics
+are better when higher. With --baseline every metric present in both runs
+is compared, and the exit code is 1 if any metric got worse by more than
+--threshold (relative). Record baselines on the same machine with the same
+--quick setting; a result file from --output can be used as a baseline.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+
+TARGET_SIZE = (299, 299)
+SUITES = ("preprocessing", "inference", "video")
+DEFAULT_THRESHOLD = 0.15
+LOWER_IS_BETTER = ("_ms", "_mb")
+HIGHER_IS_BETTER = ("_per_s", "_fps")
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile_ms(fn, repeats, rounds=3, warmup=2):
+    """
+    p50 and p90 latency of fn in ms. Timing is split into rounds and the best
+    round is kept, so a burst of background load does not register as a
+    regression.
+    """
+    for _ in range(warmup):
+        fn()
+    best = None
+    for _ in range(rounds):
+        samples = []
+        for _ in range(max(1, repeats // rounds)):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        result = float(np.percentile(samples, 50)), float(np.percentile(samples, 90))
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def bench_preprocessing(options):
+    import cv2
+    from PIL import Image
+    from benchmarks.bench_preprocessing import synthetic_photo
+    from utils.image_processing import preprocess_image
+    from utils.preprocessing import allocate_batch, open_image, preprocess_into
+
+    sizes = [(640, 480), (1920, 1080)] if options["quick"] else [(640, 480), (1920, 1080), (4000, 3000)]
+    out = allocate_batch(1, TARGET_SIZE)
+    metrics = {}
+    for width, height in sizes:
+        rgb = synthetic_photo(width, height)
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        img_pil = Image.fromarray(rgb)
+        jpeg = BytesIO()
+        img_pil.save(jpeg, format="JPEG", quality=92)
+        jpeg_bytes = jpeg.getvalue()
+
+        cases = {
+            "pil": lambda: preprocess_image(img_pil, TARGET_SIZE),
+            "frame": lambda: preprocess_into(bgr, TARGET_SIZE, out[0], bgr=True),
+            "jpeg_decode": lambda: preprocess_image(open_image(BytesIO(jpeg_bytes), TARGET_SIZE), TARGET_SIZE),
+        }
+        for name, fn in cases.items():
+            # Calls are cheap and short ones are noisy, so take more samples than for inference.
+            p50, _ = percentile_ms(fn, options["repeats"] * 5)
+            metrics[f"{name}_{width}x{height}_ms"] = p50
+    return metrics
+
+
+def _build_engine(options, work_dir):
+    from utils.inference import KerasInferenceEngine, TFLiteInferenceEngine, convert_to_tflite
+
+    max_batch_size = max(options["batch_sizes"])
+    model_path = options["model"]
+    if not model_path:
+        from benchmarks.stand_in_model import save_stand_in_model
+        model_path = save_stand_in_model(Path(work_dir) / "stand_in.keras")
+    backend = options["backend"]
+    if backend.startswith("tflite-"):
+        tflite_path = convert_to_tflite(model_path, backend.split("-", 1)[1])
+        start = time.perf_counter()
+        engine = TFLiteInferenceEngine(tflite_path, max_batch_size=max_batch_size, backend=backend)
+    else:
+        import tensorflow as tf
+        start = time.perf_counter()
+        engine = KerasInferenceEngine(tf.keras.models.load_model(model_path), max_batch_size=max_batch_size)
+    return engine, (time.perf_counter() - start) * 1000
+
+
+def bench_inference(options):
+    from data.class_info import EXPECTED_CLASS_NAMES
+    from utils.model import predict_batch, predict_image
+
+    # TFLite engines open their bucket models lazily, so the files must outlive the timing loop.
+    with tempfile.TemporaryDirectory() as work_dir:
+        engine, load_ms = _build_engine(options, work_dir)
+        metrics = {"engine_load_ms": load_ms}
+        rng = np.random.default_rng(0)
+        for batch_size in options["batch_sizes"]:
+            batch = rng.random((batch_size, TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.float32)
+            if batch_size == 1:
+                fn = lambda: predict_image(engine, batch, EXPECTED_CLASS_NAMES, 50)
+                failed = fn()[2] is None
+            else:
+                fn = lambda: predict_batch(engine, batch, EXPECTED_CLASS_NAMES, 50)
+                failed = fn() is None
+            # Both helpers log and swallow errors, which would otherwise be timed as fast predictions.
+            if failed:
+                raise RuntimeError(f"prediction failed at batch size {batch_size}")
+            p50, p90 = percentile_ms(fn, options["repeats"])
+            metrics[f"batch{batch_size}_p50_ms"] = p50
+            metrics[f"batch{batch_size}_p90_ms"] = p90
+            metrics[f"batch{batch_size}_images_per_s"] = batch_size / p50 * 1000
+    return metrics
+
+
+def bench_video(options):
+    from benchmarks.synthetic_media import synthetic_video
+    from data.class_info import CLASS_INFO, EXPECTED_CLASS_NAMES
+    from utils import feedback
+    from utils.video_processing import process_video_frames
+
+    seconds = 6.0 if options["quick"] else 20.0
+    with tempfile.TemporaryDirectory() as work_dir:
+        engine, _ = _build_engine(options, work_dir)
+        video_path, frame_count = synthetic_video(Path(work_dir) / "clip.mp4", seconds=seconds)
+        start = time.perf_counter()
+        results, _ = process_video_frames(
+            str(video_path), options["frame_interval"], engine, TARGET_SIZE, CLASS_INFO, EXPECTED_CLASS_NAMES, 50,
+            feedback.progress(0.0),
+        )
+        elapsed = time.perf_counter() - start
+    return {
+        "wall_ms": elapsed * 1000,
+        "sampled_fps": len(results) / elapsed,
+        "decoded_fps": frame_count / elapsed,
+    }
+
+
+def run_suite(name, options, result_queue):
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    if options["threads"]:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(options["threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    try:
+        metrics = globals()[f"bench_{name}"](options)
+        metrics["peak_rss_mb"] = peak_rss_mb()
+        result_queue.put(metrics)
+    except Exception as e:
+        result_queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def wait_for_result(process, result_queue, poll_secs=1.0):
+    """
+    The dict a benchmark process puts on result_queue. A process that dies
+    without putting a result (a segfault, the OOM killer, an import error
+    before the try) or exits non-zero gives an {"error": ...} dict instead
+    of blocking the run. Also used by compare_backends.
+    """
+    result = None
+    while result is None and process.is_alive():
+        try:
+            result = result_queue.get(timeout=poll_secs)
+        except queue.Empty:
+            pass
+    if result is None:
+        try:
+            # The process may have put its result just before exiting.
+            result = result_queue.get(timeout=poll_secs)
+        except queue.Empty:
+            pass
+    process.join()
+    if result is None:
+        return {"error": f"process exited with code {process.exitcode} without a result"}
+    if process.exitcode != 0 and "error" not in result:
+        return {"error": f"process exited with code {process.exitcode}"}
+    return result
+
+
+def environment():
+    info = {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()}
+    for module in ("numpy", "tensorflow", "cv2", "PIL"):
+        try:
+            info[module] = importlib.import_module(module).__version__
+        except Exception:
+            pass
+    try:
+        info["git_commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                            text=True, cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        pass
+    return info
+
+
+def compare_to_baseline(metrics, baseline, threshold):
+    """Prints a comparison table and returns the names of regressed metrics."""
+    regressions = []
+    print(f"\n{'metric':<44}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, value in metrics.items():
+        before = baseline.get(name)
+        if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or before == 0:
+            continue
+        change = (value - before) / before
+        if name.endswith(LOWER_IS_BETTER):
+            worse = change > threshold
+        elif name.endswith(HIGHER_IS_BETTER):
+            worse = -change > threshold
+        else:
+            worse = False
+        if worse:
+            regressions.append(name)
+        print(f"{name:<44}{before:>12.2f}{value:>12.2f}{change:>+8.0%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--model", help="Path to a .keras model (default: stand-in model)")
+    parser.add_argument("--backend", default="keras", help="keras, tflite-float32, tflite-float16 or tflite-int8")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--frame-interval", type=float, default=0.2, help="Seconds between sampled video frames")
+    parser.add_argument("--repeats", type=int, default=30, help="Timed calls per metric, split into 3 rounds")
+    parser.add_argument("--threads", type=int, help="TensorFlow intra-op threads (default: TensorFlow's choice)")
+    parser.add_argument("--quick", action="store_true", help="Smaller inputs for a fast smoke run")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous results JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    options = {
+        "model": args.model, "backend": args.backend, "batch_sizes": args.batch_sizes, "threads": args.threads,
+        "frame_interval": args.frame_interval, "repeats": args.repeats, "quick": args.quick,
+    }
+    context = multiprocessing.get_context("spawn")
+    metrics = {}
+    failed = False
+    for suite in args.suites:
+        print(f"Running {suite} benchmarks...")
+        result_queue = context.Queue()
+        process = context.Process(target=run_suite, args=(suite, options, result_queue))
+        process.start()
+        result = wait_for_result(process, result_queue)
+        if "error" in result:
+            print(f"  {suite} failed: {result['error']}")
+            failed = True
+            continue
+        for name, value in result.items():
+            metrics[f"{suite}.{name}"] = value
+            print(f"  {name:<40}{value:>12.2f}")
+
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(),
+               "options": options, "metrics": metrics}
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("options", {}).get("quick") != args.quick:
+            print("Warning: baseline was recorded with a different --quick setting")
+        regressions = compare_to_baseline(metrics, baseline["metrics"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            failed = True
+        else:
+            print(f"\nNo regressions beyond {args.threshold:.0%}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Small offline substitute for the production Xception model.
+
+Same 299x299x3 float input and 5-way softmax output, a few separable
+convolution blocks so the forward pass is not trivially cheap, and
+deterministic weights. Lets benchmarks run without downloading model.keras.
+"""
+from pathlib import Path
+
+import tensorflow as tf
+
+INPUT_SHAPE = (299, 299, 3)
+NUM_CLASSES = 5
+
+
+def build_stand_in_model(input_shape=INPUT_SHAPE, num_classes=NUM_CLASSES, seed=0):
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.Input(shape=input_shape)
+    x = tf.keras.layers.Conv2D(16, 3, strides=2, activation="relu")(inputs)
+    for filters in (32, 64, 128):
+        x = tf.keras.layers.SeparableConv2D(filters, 3, padding="same", activation="relu")(x)
+        x = tf.keras.layers.MaxPooling2D(3, strides=2, padding="same")(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(num_classes, activation="softmax")(x)
+    return tf.keras.Model(inputs, outputs, name="stand_in_classifier")
+
+
+def load_model(model_path=None):
+    """Loads model_path if given, otherwise builds the stand-in model."""
+    if model_path:
+        return tf.keras.models.load_model(model_path)
+    return build_stand_in_model()
+
+
+def save_stand_in_model(path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    build_stand_in_model().save(path)
+    return path
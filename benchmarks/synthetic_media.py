@@ -0,0 +1,42 @@
+"""
+Deterministic synthetic video for offline benchmarks.
+
+synthetic_video() writes a clip made of static "scenes" (different
+synthetic_photo backgrounds), each with an object sliding slowly across it
+like an item on a conveyor belt. Same arguments give the same frames, so
+runs on different commits decode identical content.
+"""
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_preprocessing import synthetic_photo
+
+
+def synthetic_video(path, seconds=10.0, fps=30, size=(640, 480), scene_seconds=2.5, seed=0):
+    """Writes an MP4 (mp4v) video to path and returns (path, frame_count)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    width, height = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open a video writer for {path}")
+
+    rng = np.random.default_rng(seed)
+    frame_count = int(round(seconds * fps))
+    frames_per_scene = max(1, int(round(scene_seconds * fps)))
+    background = None
+    try:
+        for index in range(frame_count):
+            scene, offset = divmod(index, frames_per_scene)
+            if offset == 0:
+                background = cv2.cvtColor(synthetic_photo(width, height, seed=seed * 1000 + scene), cv2.COLOR_RGB2BGR)
+                color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            frame = background.copy()
+            x = int(width * 0.2 + width * 0.6 * offset / frames_per_scene)
+            cv2.rectangle(frame, (x, height // 3), (x + width // 8, height // 3 + height // 6), color, -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path, frame_count
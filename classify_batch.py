@@ -0,0 +1,345 @@
+"""
+Headless batch classification of images and videos.
+
+    python classify_batch.py INPUT [INPUT ...] -o results.csv [--workers 4]
+
+INPUT is a directory (searched recursively) or a manifest file: a .txt file
+with one path per line, or a .csv file with a `path` column. Results are
+written as CSV, JSONL or Parquet (chosen by the output extension or --format),
+one row per file with per-file timings. Rows are written as files finish, so
+a partly finished run can be continued with --resume; files that already
+have an `ok` row are skipped and failed files are retried.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from data.class_info import CLASS_INFO, EXPECTED_CLASS_NAMES
+
+TARGET_SIZE = (299, 299)
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv"}
+OUTPUT_FORMATS = ("csv", "jsonl", "parquet")
+FIELDNAMES = [
+    "path", "kind", "status", "class_key", "class_name", "confidence", "probabilities",
+    "frames", "class_counts", "load_ms", "preprocess_ms", "inference_ms", "total_ms",
+    "batch_size", "worker_pid", "error",
+]
+
+def _media_kind(path):
+    suffix = Path(path).suffix.lower()
+    if suffix in IMAGE_EXTENSIONS:
+        return "image"
+    if suffix in VIDEO_EXTENSIONS:
+        return "video"
+    return None
+
+def _read_manifest(manifest_path):
+    manifest_path = Path(manifest_path)
+    base_dir = manifest_path.parent
+    if manifest_path.suffix.lower() == ".csv":
+        with open(manifest_path, newline="") as f:
+            entries = [row["path"] for row in csv.DictReader(f) if row.get("path")]
+    else:
+        with open(manifest_path) as f:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [str(Path(entry) if Path(entry).is_absolute() else base_dir / entry) for entry in entries]
+
+def collect_inputs(inputs):
+    """Expands directories and manifests into a sorted, de-duplicated list of media paths."""
+    paths = []
+    for item in inputs:
+        item_path = Path(item)
+        if item_path.is_dir():
+            paths.extend(str(p) for p in sorted(item_path.rglob("*")) if p.is_file() and _media_kind(p))
+        elif _media_kind(item_path):
+            paths.append(str(item_path))
+        elif item_path.is_file():
+            paths.extend(p for p in _read_manifest(item_path) if _media_kind(p))
+        else:
+            print(f"Skipping {item}: not a directory, media file or manifest", file=sys.stderr)
+    return list(dict.fromkeys(paths))
+
+def _journal_path(output_path):
+    return Path(f"{output_path}.journal.jsonl")
+
+def _read_rows(path, fmt):
+    path = Path(path)
+    if not path.exists():
+        return []
+    if fmt == "csv":
+        with open(path, newline="") as f:
+            return list(csv.DictReader(f))
+    if fmt == "jsonl":
+        rows = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # torn last line from an interrupted run
+        return rows
+    import pandas as pd
+    return pd.read_parquet(path).to_dict("records")
+
+def completed_paths(output_path, fmt):
+    rows = _read_rows(output_path, fmt)
+    if fmt == "parquet":
+        rows += _read_rows(_journal_path(output_path), "jsonl")
+    return {row["path"] for row in rows if row.get("status") == "ok"}
+
+class ResultWriter:
+    """
+    Appends result rows as they arrive. CSV and JSONL are appended in place;
+    Parquet rows go to a JSONL journal that is merged into the Parquet file
+    by close(). close() keeps only the latest row per path in every format,
+    so failures retried by --resume replace their earlier error rows.
+    """
+
+    def __init__(self, output_path, fmt, resume):
+        self.output_path = Path(output_path)
+        self.fmt = fmt
+        target = _journal_path(output_path) if fmt == "parquet" else self.output_path
+        if not resume:
+            target.unlink(missing_ok=True)
+            if fmt == "parquet":
+                self.output_path.unlink(missing_ok=True)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not target.exists() or target.stat().st_size == 0
+        self._file = open(target, "a", newline="")
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=FIELDNAMES, extrasaction="ignore")
+            if is_new:
+                self._csv.writeheader()
+
+    def write(self, row):
+        if self._csv:
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        if self.fmt != "parquet":
+            self._drop_superseded_rows()
+            return
+        import pandas as pd
+        journal = _journal_path(self.output_path)
+        rows = _read_rows(self.output_path, "parquet") + _read_rows(journal, "jsonl")
+        frame = pd.DataFrame(rows, columns=FIELDNAMES)
+        # Keep the latest row per file, so retried failures replace their earlier error rows.
+        frame = frame.drop_duplicates(subset="path", keep="last")
+        tmp_path = self.output_path.with_suffix(".parquet.tmp")
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.output_path)
+        journal.unlink(missing_ok=True)
+
+    def _drop_superseded_rows(self):
+        rows = _read_rows(self.output_path, self.fmt)
+        latest = {}
+        for row in rows:
+            latest.pop(row["path"], None)  # re-inserted so the file order follows the latest rows
+            latest[row["path"]] = row
+        if len(latest) == len(rows):
+            return
+        tmp_path = Path(f"{self.output_path}.tmp")
+        with open(tmp_path, "w", newline="") as f:
+            if self.fmt == "csv":
+                writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(latest.values())
+            else:
+                f.writelines(json.dumps(row) + "\n" for row in latest.values())
+        os.replace(tmp_path, self.output_path)
+
+_worker_state = {}
+
+def _init_worker(backend, num_threads, batch_size):
+    from utils.model import load_worker_engine
+
+    _worker_state["engine"] = load_worker_engine(backend, num_threads, batch_size)
+
+def _base_row(path, kind):
+    row = dict.fromkeys(FIELDNAMES, None)
+    row.update(path=path, kind=kind, worker_pid=os.getpid())
+    return row
+
+def classify_image_chunk(paths, confidence_threshold):
+    """Decodes a chunk of images into one batch and classifies it with a single model call."""
+    from utils.model import predict_batch
+    from utils.preprocessing import allocate_batch, open_image, preprocess_into
+
+    start_time = time.perf_counter()
+    batch = allocate_batch(len(paths), TARGET_SIZE)
+    rows, batch_rows = [], []
+    for path in paths:
+        row = _base_row(path, "image")
+        try:
+            t0 = time.perf_counter()
+            img = open_image(path, TARGET_SIZE)
+            t1 = time.perf_counter()
+            preprocess_into(img, TARGET_SIZE, batch[len(batch_rows)])
+            row["load_ms"] = (t1 - t0) * 1000
+            row["preprocess_ms"] = (time.perf_counter() - t1) * 1000
+            batch_rows.append(row)
+        except Exception as e:
+            row.update(status="error", error=f"{type(e).__name__}: {e}")
+        rows.append(row)
+
+    if batch_rows:
+        t0 = time.perf_counter()
+        predictions = predict_batch(
+            _worker_state["engine"], batch[:len(batch_rows)], EXPECTED_CLASS_NAMES, confidence_threshold
+        )
+        inference_ms = (time.perf_counter() - t0) * 1000 / len(batch_rows)
+        for i, row in enumerate(batch_rows):
+            if predictions is None:
+                row.update(status="error", error="batch prediction failed")
+                continue
+            class_key, confidence, probs = predictions[i]
+            row.update(
+                status="ok", class_key=class_key, class_name=CLASS_INFO[class_key]["display_name"],
+                confidence=round(float(confidence), 2),
+                probabilities=json.dumps([round(float(p), 6) for p in probs]),
+                inference_ms=inference_ms, batch_size=len(batch_rows),
+            )
+
+    total_ms = (time.perf_counter() - start_time) * 1000 / len(paths)
+    for row in rows:
+        row["total_ms"] = total_ms
+    return rows
+
+def classify_video(path, frame_interval_secs, confidence_threshold, batch_size):
+    """Classifies sampled frames of one video; the row holds the most frequent class above the threshold."""
+    from utils.video_pipeline import VideoAnalysisPipeline
+    from utils.video_results import estimate_row_count, VideoResultStore, DEFAULT_CAPACITY
+
+    row = _base_row(path, "video")
+    start_time = time.perf_counter()
+    try:
+        pipeline = VideoAnalysisPipeline(
+            _worker_state["engine"], TARGET_SIZE, CLASS_INFO, EXPECTED_CLASS_NAMES, confidence_threshold,
+            batch_size=batch_size,
+        )
+        frame_results = VideoResultStore(CLASS_INFO, estimate_row_count(path, frame_interval_secs) or DEFAULT_CAPACITY)
+        frame_results.extend(pipeline.iter_results(path, frame_interval_secs))
+        most_frequent = frame_results.most_frequent()
+        class_key = most_frequent[0] if most_frequent else "unknown"
+        confidences = frame_results.confidences[frame_results.class_indices == frame_results.class_keys.index(class_key)]
+        row.update(
+            status="ok", class_key=class_key, class_name=CLASS_INFO[class_key]["display_name"],
+            confidence=round(float(confidences.mean()), 2) if len(confidences) else 0.0,
+            frames=len(frame_results), class_counts=json.dumps(frame_results.class_counts()), batch_size=batch_size,
+        )
+    except Exception as e:
+        row.update(status="error", error=f"{type(e).__name__}: {e}")
+    row["total_ms"] = (time.perf_counter() - start_time) * 1000
+    return row
+
+def _prepare_model(backend):
+    """Downloads (and converts) the model once in the parent so workers don't race for it."""
+    from utils.model import ensure_model_file, MODEL_DOWNLOAD_URL, CACHE_DIR, LOCAL_MODEL_FILENAME
+
+    model_path = ensure_model_file(MODEL_DOWNLOAD_URL, CACHE_DIR, LOCAL_MODEL_FILENAME)
+    if model_path is None:
+        return False
+    if backend.startswith("tflite-"):
+        from utils.inference import convert_to_tflite
+        convert_to_tflite(model_path, backend.split("-", 1)[1])
+    return True
+
+def parse_args(argv=None):
+    from utils.model import INFERENCE_BACKEND
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Directories, media files or manifest files")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="Output format (default: from the output extension)")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Worker processes, each with its own model (0 = run in this process)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Images per model call")
+    parser.add_argument("--confidence-threshold", type=float, default=50, help="Minimum confidence in percent")
+    parser.add_argument("--frame-interval", type=float, default=2.0, help="Seconds between sampled video frames")
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, help="keras, tflite-float32, tflite-float16 or tflite-int8")
+    parser.add_argument("--resume", action="store_true", help="Skip files that already have an ok row in the output")
+    args = parser.parse_args(argv)
+    if args.format is None:
+        suffix = Path(args.output).suffix.lower().lstrip(".")
+        if suffix not in OUTPUT_FORMATS:
+            parser.error(f"Cannot infer the format from '{args.output}'; pass --format")
+        args.format = suffix
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = collect_inputs(args.inputs)
+    if args.resume:
+        done = completed_paths(args.output, args.format)
+        print(f"Resuming: {len(done)} files already classified")
+        paths = [p for p in paths if p not in done]
+    images = [p for p in paths if _media_kind(p) == "image"]
+    videos = [p for p in paths if _media_kind(p) == "video"]
+    print(f"Classifying {len(images)} images and {len(videos)} videos")
+    if not paths:
+        return 0
+    if not _prepare_model(args.backend):
+        return 1
+
+    workers = max(0, args.workers)
+    num_threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    init_args = (args.backend, num_threads, args.batch_size)
+    tasks = [(classify_image_chunk, (images[i:i + args.batch_size], args.confidence_threshold))
+             for i in range(0, len(images), args.batch_size)]
+    tasks += [(classify_video, (path, args.frame_interval, args.confidence_threshold, args.batch_size))
+              for path in videos]
+
+    writer = ResultWriter(args.output, args.format, resume=args.resume)
+    start_time = time.time()
+    finished = failed = 0
+
+    def record(result):
+        nonlocal finished, failed
+        for row in result if isinstance(result, list) else [result]:
+            writer.write(row)
+            finished += 1
+            failed += row["status"] != "ok"
+        rate = finished / max(time.time() - start_time, 1e-9)
+        print(f"[{finished}/{len(paths)}] {rate:.1f} files/s, {failed} failed", end="\r", flush=True)
+
+    try:
+        if workers == 0:
+            _init_worker(*init_args)
+            for fn, fn_args in tasks:
+                record(fn(*fn_args))
+        else:
+            context = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=init_args) as pool:
+                futures = {pool.submit(fn, *fn_args): fn_args for fn, fn_args in tasks}
+                for future in as_completed(futures):
+                    try:
+                        record(future.result())
+                    except Exception as e:
+                        fn_args = futures[future]
+                        task_paths = fn_args[0] if isinstance(fn_args[0], list) else [fn_args[0]]
+                        for path in task_paths:
+                            row = _base_row(path, _media_kind(path))
+                            row.update(status="error", error=f"{type(e).__name__}: {e}")
+                            record(row)
+    finally:
+        writer.close()
+
+    elapsed = time.time() - start_time
+    print(f"\nDone: {finished} files in {elapsed:.1f}s ({finished / max(elapsed, 1e-9):.1f} files/s), "
+          f"{failed} failed. Results in {args.output}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Local HTTP inference service with dynamic micro-batching.
+
+    python inference_server.py [--port 8000] [--max-batch-size 16] [--max-wait-ms 5]
+
+Endpoints:
+    POST /predict   Body: raw image bytes, or JSON {"url": ...} or {"image_base64": ...}.
+                    Optional query parameters: threshold (percent, default
+                    --confidence-threshold) and timeout_ms; the deadline can
+                    also be sent as an X-Request-Timeout-Ms header.
+    GET  /healthz   Liveness: 200 while the process is serving.
+    GET  /readyz    Readiness: 200 once the model is loaded, 503 while it is
+                    loading or after loading failed.
+    GET  /stats     Batching counters as JSON.
+    GET  /metrics   Per-stage timings, counters and gauges in the Prometheus
+                    text format (?format=json for JSON). Disable with --no-metrics.
+
+Each request is decoded and preprocessed on its own handler thread and then
+queued for utils.batching.MicroBatcher, which runs up to --max-batch-size
+images per model call and waits at most --max-wait-ms for a batch to fill.
+A request whose deadline passes gets a 504; if it is still queued by then it
+never reaches the model. A full queue answers 503 with Retry-After.
+"""
+import argparse
+import base64
+import binascii
+import json
+import os
+import sys
+import time
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from data.class_info import CLASS_INFO, EXPECTED_CLASS_NAMES
+from utils import metrics
+from utils.model import ModelLoader, load_inference_engine, MODEL_DOWNLOAD_URL, CACHE_DIR, LOCAL_MODEL_FILENAME
+
+TARGET_SIZE = (299, 299)
+DEFAULT_TIMEOUT_MS = float(os.environ.get("REQUEST_TIMEOUT_MS", 10000))
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", 20 * 1024 * 1024))
+
+def load_batcher(backend, max_batch_size, max_wait_ms, max_queue_size):
+    """Loads and warms up the inference engine, then starts a MicroBatcher in front of it."""
+    from utils.batching import MicroBatcher
+
+    engine = load_inference_engine(
+        MODEL_DOWNLOAD_URL, CACHE_DIR, LOCAL_MODEL_FILENAME, backend=backend, max_batch_size=max_batch_size
+    )
+    if engine is None:
+        return None
+    return MicroBatcher(engine, TARGET_SIZE, max_batch_size=max_batch_size,
+                        max_wait_ms=max_wait_ms, max_queue_size=max_queue_size)
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients can reuse connections
+    # Headers and body are separate writes; with Nagle on, the body waits for the client's delayed ACK.
+    disable_nagle_algorithm = True
+    server_version = "GarbageClassifier/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path
+        loader = self.server.loader
+        if path == "/healthz":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/readyz":
+            payload = {"status": loader.state, "backend": self.server.backend}
+            if loader.load_seconds is not None:
+                payload["load_seconds"] = round(loader.load_seconds, 3)
+            if loader.error:
+                payload["error"] = loader.error
+            self._send_json(200 if loader.ready else 503, payload)
+        elif path == "/stats":
+            self._send_json(200, loader.engine.stats() if loader.ready else {"status": loader.state})
+        elif path == "/metrics":
+            if parse_qs(url.query).get("format") == ["json"]:
+                self._send_json(200, metrics.snapshot())
+            else:
+                self._send(200, metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": f"unknown path {path}"})
+
+    def do_POST(self):
+        start_time = time.monotonic()
+        url = urlsplit(self.path)
+        if url.path != "/predict":
+            self._discard_body()
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+            return
+        with metrics.in_flight(), metrics.timer("request"):
+            try:
+                self._send_json(200, self._predict(start_time, parse_qs(url.query)))
+                status = 200
+            except RequestError as e:
+                status = e.status
+                headers = {"Retry-After": "1"} if e.status == 503 else None
+                self._send_json(e.status, {"error": str(e)}, headers)
+            except Exception as e:
+                status = 500
+                print(f"Error handling /predict: {e}", file=sys.stderr)
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        metrics.increment(f"http_responses_{status}")
+
+    def _content_length(self):
+        try:
+            return int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True  # the body cannot be skipped without its length
+            raise RequestError(400, "Content-Length must be an integer") from None
+
+    def _discard_body(self):
+        try:
+            length = self._content_length()
+        except RequestError:
+            return
+        if length > 0:
+            self.rfile.read(length)
+
+    def _read_image_bytes(self):
+        from utils.image_processing import fetch_image_bytes
+
+        length = self._content_length()
+        if length <= 0:
+            raise RequestError(400, "empty request body")
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True  # the unread body would corrupt the next request
+            raise RequestError(413, f"request body larger than {MAX_REQUEST_BYTES} bytes")
+        body = self.rfile.read(length)
+        if not (self.headers.get("Content-Type") or "").startswith("application/json"):
+            return body
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise RequestError(400, "invalid JSON body") from None
+        if not isinstance(payload, dict):
+            raise RequestError(400, "JSON body must be an object")
+        if payload.get("image_base64"):
+            try:
+                return base64.b64decode(payload["image_base64"], validate=True)
+            except (binascii.Error, ValueError, TypeError):
+                raise RequestError(400, "image_base64 is not valid base64") from None
+        if payload.get("url"):
+            image_bytes = fetch_image_bytes(payload["url"])
+            if image_bytes is None:
+                raise RequestError(400, f"could not fetch image from {payload['url']}")
+            return image_bytes
+        raise RequestError(400, "JSON body needs a 'url' or 'image_base64' field")
+
+    def _predict(self, start_time, query):
+        from utils.image_processing import preprocess_image, MAX_IMAGE_PIXELS
+        from utils.model import resolve_prediction
+        from utils.preprocessing import open_image, ImageTooLarge
+        from utils.batching import DeadlineExceeded, QueueFull
+
+        image_bytes = self._read_image_bytes()
+        try:
+            timeout_ms = float(query.get("timeout_ms", [self.headers.get("X-Request-Timeout-Ms") or self.server.default_timeout_ms])[0])
+            threshold = float(query.get("threshold", [self.server.confidence_threshold])[0])
+        except ValueError:
+            raise RequestError(400, "timeout_ms and threshold must be numbers") from None
+        deadline = start_time + timeout_ms / 1000
+
+        loader = self.server.loader
+        if not loader.ready:
+            raise RequestError(503, f"model is {loader.state}")
+
+        try:
+            with metrics.timer("image_decode"):
+                img = open_image(BytesIO(image_bytes), TARGET_SIZE, MAX_IMAGE_PIXELS)
+        except ImageTooLarge as e:
+            raise RequestError(400, str(e)) from None
+        except Exception:
+            raise RequestError(400, "could not decode image") from None
+        img_batch = preprocess_image(img, TARGET_SIZE)
+        if img_batch is None:
+            raise RequestError(400, "could not preprocess image")
+        preprocess_done = time.monotonic()
+
+        remaining = deadline - preprocess_done
+        if remaining <= 0:
+            raise RequestError(504, "deadline exceeded before inference")
+        try:
+            probs, info = loader.engine.predict(img_batch, timeout=remaining)
+        except QueueFull as e:
+            raise RequestError(503, f"server overloaded: {e}") from None
+        except DeadlineExceeded as e:
+            raise RequestError(504, f"deadline exceeded: {e}") from None
+
+        class_key, confidence = resolve_prediction(probs, EXPECTED_CLASS_NAMES, threshold)
+        return {
+            "class_key": class_key,
+            "class_name": CLASS_INFO[class_key]["display_name"],
+            "confidence": round(float(confidence), 2),
+            "probabilities": {name: round(float(p), 6) for name, p in zip(EXPECTED_CLASS_NAMES, probs)},
+            "batch_size": info["batch_size"],
+            "preprocess_ms": round((preprocess_done - start_time) * 1000, 2),
+            "queue_ms": round(info["queue_ms"], 2),
+            "inference_ms": round(info["inference_ms"], 2),
+            "total_ms": round((time.monotonic() - start_time) * 1000, 2),
+        }
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, loader, backend, confidence_threshold=50, default_timeout_ms=DEFAULT_TIMEOUT_MS, access_log=False):
+        super().__init__(address, InferenceRequestHandler)
+        self.loader = loader
+        self.backend = backend
+        self.confidence_threshold = confidence_threshold
+        self.default_timeout_ms = default_timeout_ms
+        self.access_log = access_log
+
+def parse_args(argv=None):
+    from utils.model import INFERENCE_BACKEND
+    from utils.batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, DEFAULT_MAX_QUEUE_SIZE
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, help="keras, tflite-float32, tflite-float16 or tflite-int8")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="Images per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="How long a batch may wait for more requests before it runs")
+    parser.add_argument("--max-queue-size", type=int, default=DEFAULT_MAX_QUEUE_SIZE,
+                        help="Queued requests before new ones are rejected with 503")
+    parser.add_argument("--timeout-ms", type=float, default=DEFAULT_TIMEOUT_MS, help="Default per-request deadline")
+    parser.add_argument("--confidence-threshold", type=float, default=50, help="Default minimum confidence in percent")
+    parser.add_argument("--access-log", action="store_true", help="Log every request to stderr")
+    parser.add_argument("--no-metrics", action="store_true", help="Do not collect per-stage metrics for /metrics")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics.enable(not args.no_metrics)
+    loader = ModelLoader(load_batcher, args.backend, args.max_batch_size, args.max_wait_ms, args.max_queue_size).start()
+    server = InferenceServer(
+        (args.host, args.port), loader, args.backend,
+        confidence_threshold=args.confidence_threshold, default_timeout_ms=args.timeout_ms, access_log=args.access_log,
+    )
+    print(f"Serving on http://{args.host}:{server.server_port} (model loading in the background; see /readyz)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if loader.ready:
+            loader.engine.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
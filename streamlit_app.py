@@ -1,28 +1,53 @@
 import streamlit as st
+import atexit
 import os
-import tempfile
+import time
 from pathlib import Path
-import numpy as np
-import requests
-import tensorflow as tf
 
-from utils.model import predict_image
-from utils.image_processing import preprocess_image, load_image_from_url, load_uploaded_image
-from utils.video_processing import process_video_frames
+# Only lightweight modules are imported at load time so the page renders
+# immediately. TensorFlow, OpenCV, NumPy, requests and pandas are imported
+# inside the functions that first need them, and the model loads on a
+# background thread (see get_model_loader).
+from utils import metrics
+from utils.model import ModelLoader, load_inference_engine, MODEL_DOWNLOAD_URL, CACHE_DIR, LOCAL_MODEL_FILENAME
 from data.class_info import CLASS_INFO, EXPECTED_CLASS_NAMES
 from ui.components import (
-    setup_page, display_sidebar, display_model_info, 
-    display_prediction, display_probability_details, display_video_results
+    setup_page, display_sidebar, display_video_sampling_options, display_model_info, display_model_status, display_performance_panel,
+    display_prediction, display_probability_details, display_video_results, display_bulk_url_results,
+    display_multi_image_summary
 )
 
 APP_DIR = Path(__file__).parent
 MODEL_PATH = APP_DIR / "saved_models" / "model.keras"
 TARGET_SIZE = (299, 299)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 512))
+# Set PREDICTION_CACHE_DIR to an empty string to keep the cache in memory only.
+PREDICTION_CACHE_DIR = os.environ.get("PREDICTION_CACHE_DIR", str(CACHE_DIR / "predictions")) or None
+# Files kept in PREDICTION_CACHE_DIR; the least recently used are deleted beyond that.
+PREDICTION_CACHE_DISK_SIZE = int(os.environ.get("PREDICTION_CACHE_DISK_SIZE", 10000))
+# Set NEAR_DUPLICATE_MAX_DISTANCE (e.g. 2) to let images whose perceptual hashes differ in at
+# most that many of 64 bits reuse an earlier result without running the model. Off by default:
+# different items photographed on the same plain background can be that close.
+NEAR_DUPLICATE_MAX_DISTANCE = os.environ.get("NEAR_DUPLICATE_MAX_DISTANCE", "")
+NEAR_DUPLICATE_HASH = os.environ.get("NEAR_DUPLICATE_HASH", "phash")
+NEAR_DUPLICATE_INDEX_SIZE = int(os.environ.get("NEAR_DUPLICATE_INDEX_SIZE", 4096))
+NEAR_DUPLICATE_INDEX_PATH = os.environ.get("NEAR_DUPLICATE_INDEX_PATH", str(CACHE_DIR / "near_duplicates.npz")) or None
+# Set BACKGROUND_MODEL_LOADING=0 to block the first page render until the model is ready.
+BACKGROUND_MODEL_LOADING = os.environ.get("BACKGROUND_MODEL_LOADING", "1") != "0"
+# Worker processes for video analysis, each with its own model; 0 analyses videos in the app process.
+VIDEO_SHARD_WORKERS = int(os.environ.get("VIDEO_SHARD_WORKERS", 0))
+# Uploads larger than this are rejected before analysis; they are copied to disk in 1 MB chunks.
+MAX_VIDEO_UPLOAD_MB = int(os.environ.get("MAX_VIDEO_UPLOAD_MB", 1024))
+# Seconds between refreshes of the partial video results while a video is analysed.
+VIDEO_RESULTS_REFRESH_SECS = float(os.environ.get("VIDEO_RESULTS_REFRESH_SECS", 1.0))
+# URLs classified per "Bulk Image URLs" request; further lines are ignored.
+MAX_BULK_URLS = int(os.environ.get("MAX_BULK_URLS", 200))
 
 def main():
     setup_page()
     
     input_method, confidence_threshold, frame_interval_secs = display_sidebar(frame_interval_option=True)
+    sampling_options = display_video_sampling_options() if input_method == "Upload Video" else None
     
     st.title("♻️ Smart Garbage Classifier")
     st.markdown("Upload an image, provide a URL, or upload a video to classify common garbage items.")
@@ -30,64 +55,273 @@ def main():
     
     # model = load_keras_model(MODEL_PATH)
 
-    from utils.model import download_and_load_keras_model, predict_image, MODEL_DOWNLOAD_URL, CACHE_DIR, LOCAL_MODEL_FILENAME
-
-    model = download_and_load_keras_model(MODEL_DOWNLOAD_URL, CACHE_DIR, LOCAL_MODEL_FILENAME)
+    model_loader = get_model_loader()
+    if not BACKGROUND_MODEL_LOADING:
+        model_loader.wait()
 
     display_model_info(MODEL_PATH, TARGET_SIZE, EXPECTED_CLASS_NAMES, CLASS_INFO)
+    with st.sidebar:
+        if model_loader.state == "loading" and hasattr(st, "fragment"):
+            model_status_fragment(model_loader)
+        else:
+            display_model_status(model_loader.state, model_loader.load_seconds, model_loader.error)
     
-    if not model:
+    if model_loader.state == "failed":
         st.error("Model loading failed. Cannot proceed. Please check model path and logs.")
         return
     
     if input_method in ["Upload Image", "Image URL"]:
-        handle_image_input(input_method, model, confidence_threshold)
+        handle_image_input(input_method, model_loader, confidence_threshold)
+    elif input_method == "Upload Multiple Images":
+        handle_multi_image_input(model_loader, confidence_threshold)
+    elif input_method == "Bulk Image URLs":
+        handle_bulk_url_input(model_loader, confidence_threshold)
     elif input_method == "Upload Video":
-        handle_video_input(model, confidence_threshold, frame_interval_secs)
+        handle_video_input(model_loader, confidence_threshold, frame_interval_secs, sampling_options)
     
     st.markdown("---")
     st.markdown("Built with Streamlit, TensorFlow/Keras, and OpenCV.")
 
-def handle_image_input(input_method, model, confidence_threshold):
-    img_pil = None
+    # Rendered last so the panel includes the timings of this run. Set METRICS_ENABLED=1 to show it.
+    if metrics.enabled():
+        display_performance_panel(metrics.snapshot(), metrics.to_prometheus())
+
+@st.cache_resource
+def get_model_loader():
+    """
+    One loader per server process; it starts loading and warming up the model in the background.
+    Only single images are warmed up, so the first prediction does not wait for every batch size.
+    """
+    return ModelLoader(
+        load_inference_engine, MODEL_DOWNLOAD_URL, CACHE_DIR, LOCAL_MODEL_FILENAME, warmup_batch_sizes=(1,)
+    ).start()
+
+if hasattr(st, "fragment"):
+    @st.fragment(run_every=1.0)
+    def model_status_fragment(model_loader):
+        # Polls while loading, then reruns the whole page once the model is ready.
+        if model_loader.state != "loading":
+            st.rerun()
+        display_model_status(model_loader.state)
+
+def wait_for_model(model_loader):
+    if not model_loader.ready:
+        with st.spinner("⏳ The model is still loading; your request will run as soon as it is ready..."):
+            model_loader.wait()
+    if model_loader.engine is None:
+        st.error("Model loading failed. Cannot proceed. Please check model path and logs.")
+    return model_loader.engine
+
+@st.cache_resource
+def get_prediction_cache():
+    from utils.prediction_cache import PredictionCache
+    return PredictionCache(max_entries=PREDICTION_CACHE_SIZE, cache_dir=PREDICTION_CACHE_DIR,
+                           max_disk_entries=PREDICTION_CACHE_DISK_SIZE)
+
+@st.cache_resource
+def get_model_fingerprint(_model):
+    from utils.model import model_fingerprint
+    return model_fingerprint(_model)
+
+@st.cache_resource
+def get_near_duplicate_index(_model):
+    """One index per server process, or None unless NEAR_DUPLICATE_MAX_DISTANCE is set."""
+    if not NEAR_DUPLICATE_MAX_DISTANCE.strip():
+        return None
+    from utils.near_duplicates import NearDuplicateIndex
+    index = NearDuplicateIndex(
+        max_distance=int(NEAR_DUPLICATE_MAX_DISTANCE), max_entries=NEAR_DUPLICATE_INDEX_SIZE,
+        method=NEAR_DUPLICATE_HASH, model_fingerprint=get_model_fingerprint(_model), path=NEAR_DUPLICATE_INDEX_PATH,
+    )
+    if NEAR_DUPLICATE_INDEX_PATH:
+        index.load()
+        atexit.register(index.save)
+    return index
+
+def classify_image_bytes(image_bytes, model):
+    """
+    Returns the probability vector for an encoded image, reusing cached
+    results across reruns and sessions. Decoding, preprocessing and inference
+    only run on a cache miss, and inference is skipped as well when the
+    near-duplicate index (if enabled) holds a near-identical image. Results
+    reused that way are not stored in the cache under this image's bytes.
+    """
+    from utils.image_processing import load_image_from_bytes, preprocess_image
+    from utils.model import predict_image
+    from utils.prediction_cache import make_cache_key
+
+    cache = get_prediction_cache()
+    key = make_cache_key(image_bytes, get_model_fingerprint(model))
+
+    prediction_probs = cache.get(key)
+    if prediction_probs is not None:
+        return prediction_probs
+    img_pil = load_image_from_bytes(image_bytes, TARGET_SIZE)
+    if img_pil is None:
+        return None
+
+    def predict():
+        img_batch = preprocess_image(img_pil, TARGET_SIZE)
+        if img_batch is None:
+            st.error("Image preprocessing failed.")
+            return None
+        _, _, probs = predict_image(
+            model, img_batch, EXPECTED_CLASS_NAMES, confidence_threshold=0
+        )
+        if probs is None:
+            st.error("Prediction failed.")
+        return probs
+
+    index = get_near_duplicate_index(model)
+    if index is None:
+        prediction_probs, reused = predict(), False
+    else:
+        prediction_probs, reused = index.classify(img_pil, predict)
+    if prediction_probs is not None and not reused:
+        cache.put(key, prediction_probs)
+    return prediction_probs
+
+def handle_image_input(input_method, model_loader, confidence_threshold):
+    image_bytes = None
     
     if input_method == "Upload Image":
         uploaded_file = st.file_uploader("Choose an image file", type=["jpg", "jpeg", "png"], key="file_uploader")
         if uploaded_file:
-            img_pil = load_uploaded_image(uploaded_file)
+            image_bytes = uploaded_file.getvalue()
     else:  # Image URL
         image_url = st.text_input("Enter Image URL:", key="url_input")
         if image_url:
-            with st.spinner('Fetching image from URL...'):
-                img_pil = load_image_from_url(image_url)
+            # Kept per URL so reruns (e.g. moving the threshold slider) don't download it again.
+            fetched = st.session_state.get("url_image")
+            if fetched is not None and fetched["url"] == image_url:
+                image_bytes = fetched["bytes"]
+            else:
+                from utils.image_processing import fetch_image_bytes
+                with st.spinner('Fetching image from URL...'):
+                    image_bytes = fetch_image_bytes(image_url)
+                if image_bytes:
+                    st.session_state["url_image"] = {"url": image_url, "bytes": image_bytes}
     
-    if img_pil:
+    if image_bytes:
         col1, col2 = st.columns([0.6, 0.4])
         with col1:
             st.subheader("🖼️ Input Image")
-            st.image(img_pil, caption='Input Image', use_column_width=True)
+            try:
+                with metrics.timer("render"):
+                    st.image(image_bytes, caption='Input Image', use_column_width=True)
+            except Exception as e:
+                # Undecodable data; classify_image_bytes reports the error below.
+                print(f"Could not display input image: {e}")
+        model = wait_for_model(model_loader)
+        if model is None:
+            return
         with col2:
-            with st.spinner('🧠 Classifying Image...'):
-                img_batch = preprocess_image(img_pil, TARGET_SIZE)
-                if img_batch is not None:
-                    _, _, prediction_probs = predict_image(
-                        model, img_batch, EXPECTED_CLASS_NAMES, confidence_threshold
+            with st.spinner('🧠 Classifying Image...'), metrics.in_flight():
+                prediction_probs = classify_image_bytes(image_bytes, model)
+            if prediction_probs is not None:
+                with metrics.timer("render"):
+                    # The threshold is applied to the (possibly cached) raw probabilities here.
+                    display_prediction(
+                        prediction_probs, CLASS_INFO, EXPECTED_CLASS_NAMES, confidence_threshold
                     )
-                    if prediction_probs is not None:
-                        display_prediction(
-                            prediction_probs, CLASS_INFO, EXPECTED_CLASS_NAMES, confidence_threshold
-                        )
-                        display_probability_details(prediction_probs, EXPECTED_CLASS_NAMES, CLASS_INFO)
-                    else:
-                        st.error("Prediction failed.")
-                else:
-                    st.error("Image preprocessing failed.")
+                    display_probability_details(prediction_probs, EXPECTED_CLASS_NAMES, CLASS_INFO)
     elif input_method == "Upload Image" and st.session_state.get("file_uploader") is None:
         st.info("☝️ Upload an image file.")
     elif input_method == "Image URL" and not st.session_state.get("url_input"):
         st.info("☝️ Enter an image URL.")
 
-def handle_video_input(model, confidence_threshold, frame_interval_secs):
+def handle_multi_image_input(model_loader, confidence_threshold):
+    uploaded_files = st.file_uploader(
+        "Choose image files", type=["jpg", "jpeg", "png"], accept_multiple_files=True, key="multi_file_uploader"
+    )
+    if not uploaded_files:
+        st.info("☝️ Upload one or more image files.")
+        return
+
+    # Results are kept per set of uploads, so changing the threshold or opening
+    # an image's details reruns the page without classifying everything again.
+    # UploadedFile.file_id only exists in newer Streamlit versions; name and size work in all of them.
+    upload_key = tuple((f.name, f.size) for f in uploaded_files)
+    results = st.session_state.get("multi_image_results")
+    if results is None or results["key"] != upload_key:
+        model = wait_for_model(model_loader)
+        if model is None:
+            return
+        from utils.bulk_images import iter_classify_images
+        progress_bar = st.progress(0.0, text="Classifying images...")
+        rows = []
+        start_time = time.time()
+        last_update = 0.0
+        with metrics.in_flight():
+            # Threshold 0 keeps the raw probabilities; the current threshold is applied below.
+            for row in iter_classify_images(uploaded_files, model, TARGET_SIZE, EXPECTED_CLASS_NAMES, 0):
+                rows.append(row)
+                if time.time() - last_update >= 0.25 or len(rows) == len(uploaded_files):
+                    progress_bar.progress(len(rows) / len(uploaded_files), text=f"Classified {len(rows)}/{len(uploaded_files)} images")
+                    last_update = time.time()
+        elapsed = time.time() - start_time
+        progress_bar.empty()
+        print(f"Multi-image classification finished: {len(rows)} images in {elapsed:.2f} seconds.")
+        results = st.session_state["multi_image_results"] = {"key": upload_key, "rows": rows, "seconds": elapsed}
+
+    from utils.model import resolve_prediction
+    rows = []
+    for row in results["rows"]:
+        if row["status"] == "ok":
+            class_key, confidence = resolve_prediction(row["probs"], EXPECTED_CLASS_NAMES, confidence_threshold)
+            row = dict(row, class_key=class_key, confidence=round(float(confidence), 2))
+        rows.append(row)
+    with metrics.timer("render"):
+        display_multi_image_summary(rows, CLASS_INFO, results["seconds"])
+
+    classified = sorted((row for row in rows if row["status"] == "ok"), key=lambda row: row["index"])
+    selected = st.selectbox(
+        "Show details for:", [None] + [row["index"] for row in classified], key="multi_image_detail_select",
+        format_func=lambda index: "—" if index is None else uploaded_files[index].name
+    )
+    if selected is not None:
+        row = next(row for row in classified if row["index"] == selected)
+        col1, col2 = st.columns([0.6, 0.4])
+        with col2, metrics.timer("render"):
+            display_prediction(row["probs"], CLASS_INFO, EXPECTED_CLASS_NAMES, confidence_threshold)
+            display_probability_details(row["probs"], EXPECTED_CLASS_NAMES, CLASS_INFO)
+        with col1:
+            st.image(uploaded_files[selected].getvalue(), caption=row["name"], use_column_width=True)
+
+def handle_bulk_url_input(model_loader, confidence_threshold):
+    urls_text = st.text_area("Image URLs (one per line):", key="bulk_url_input", height=200)
+    if not urls_text.strip():
+        st.info("☝️ Paste one image URL per line.")
+        return
+    if not st.button("Classify URLs", key="bulk_url_button"):
+        return
+
+    from utils.bulk_urls import iter_classify_urls, parse_url_list
+    urls = parse_url_list(urls_text)
+    if len(urls) > MAX_BULK_URLS:
+        st.warning(f"Only the first {MAX_BULK_URLS} of {len(urls)} URLs are classified.")
+        urls = urls[:MAX_BULK_URLS]
+    model = wait_for_model(model_loader)
+    if model is None:
+        return
+
+    progress_bar = st.progress(0.0, text="Fetching images...")
+    rows = []
+    start_time = time.time()
+    last_update = 0.0
+    with metrics.in_flight():
+        for row in iter_classify_urls(urls, model, TARGET_SIZE, EXPECTED_CLASS_NAMES, confidence_threshold):
+            rows.append(row)
+            if time.time() - last_update >= 0.25 or len(rows) == len(urls):
+                progress_bar.progress(len(rows) / len(urls), text=f"Classified {len(rows)}/{len(urls)} URLs")
+                last_update = time.time()
+    elapsed = time.time() - start_time
+    progress_bar.empty()
+    print(f"Bulk URL classification finished: {len(rows)} URLs in {elapsed:.2f} seconds.")
+    with metrics.timer("render"):
+        display_bulk_url_results(rows, CLASS_INFO, elapsed)
+
+def handle_video_input(model_loader, confidence_threshold, frame_interval_secs, sampling_options=None):
     uploaded_video_file = st.file_uploader(
         "Choose a video file",
         type=["mp4", "avi", "mov", "mkv"],
@@ -95,39 +329,93 @@ def handle_video_input(model, confidence_threshold, frame_interval_secs):
     )
     
     if uploaded_video_file is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.' + uploaded_video_file.name.split('.')[-1]) as tfile:
-            tfile.write(uploaded_video_file.read())
-            temp_video_path = tfile.name
-        
         st.subheader("🎬 Input Video")
-        st.video(temp_video_path)
+        st.video(uploaded_video_file)
+        # Results are kept until the upload or its settings change, so download
+        # buttons and other reruns do not lose them.
+        results_key = (uploaded_video_file.name, uploaded_video_file.size, frame_interval_secs, confidence_threshold,
+                       tuple(sorted((sampling_options or {}).items())))
+        stored_results = st.session_state.get("video_results")
         
         if st.button("Analyze Video Frames", key="analyze_button"):
             st.subheader("📈 Analysis Results")
+            model = wait_for_model(model_loader)
+            if model is None:
+                return
+            from contextlib import closing
+            from utils.video_processing import analyze_video, log_video_summary, progress_bar_callback, spooled_upload, UploadTooLarge
+            from utils.video_pipeline import VideoOpenError
+            from utils.video_results import estimate_row_count, export_files, VideoResultStore, DEFAULT_CAPACITY
+            from utils.scene_change import SceneChangeDetector, DEFAULT_MAX_GAP_SECS
+            sampling_options = sampling_options or {}
+            change_detector = None
+            if sampling_options.get("adaptive"):
+                change_detector = SceneChangeDetector(sampling_options["scene_threshold"])
             progress_bar = st.progress(0.0, text="Initializing Video Analysis...")
+            status_placeholder = st.empty()
+            results_placeholder = st.empty()
+
+            def render_results(video_results, downloads=None):
+                with metrics.timer("render"), results_placeholder.container():
+                    display_video_results(video_results, downloads)
+
             try:
-                video_results, processing_time = process_video_frames(
-                    temp_video_path,
-                    frame_interval_secs,
-                    model,
-                    TARGET_SIZE,
-                    CLASS_INFO,
-                    EXPECTED_CLASS_NAMES,
-                    confidence_threshold,
-                    progress_bar
-                )
-                
-                if video_results is not None:
-                    st.success(f"Video analysis complete! Processed {len(video_results)} frames in {processing_time:.2f} seconds.")
-                    display_video_results(video_results)
+                suffix = '.' + uploaded_video_file.name.split('.')[-1]
+                with metrics.in_flight(), spooled_upload(uploaded_video_file, suffix, MAX_VIDEO_UPLOAD_MB * 1024 * 1024) as temp_video_path:
+                    start_time = time.time()
+                    analyzer, rows = analyze_video(
+                        temp_video_path,
+                        frame_interval_secs,
+                        model,
+                        TARGET_SIZE,
+                        CLASS_INFO,
+                        EXPECTED_CLASS_NAMES,
+                        confidence_threshold,
+                        progress_bar_callback(progress_bar),
+                        change_detector=change_detector,
+                        max_gap_secs=sampling_options.get("max_gap_secs") or DEFAULT_MAX_GAP_SECS,
+                        smoothing_window=sampling_options.get("smoothing_window", 1),
+                        num_workers=VIDEO_SHARD_WORKERS,
+                        include_probs=True
+                    )
+                    # Rows arrive while the video is still being decoded; the segments and metric
+                    # are redrawn at most every VIDEO_RESULTS_REFRESH_SECS.
+                    video_results = VideoResultStore(
+                        CLASS_INFO, estimate_row_count(temp_video_path, frame_interval_secs) or DEFAULT_CAPACITY,
+                        prob_class_names=EXPECTED_CLASS_NAMES
+                    )
+                    last_render = start_time
+                    with closing(rows):
+                        for row in rows:
+                            video_results.append_row(row)
+                            if time.time() - last_render >= VIDEO_RESULTS_REFRESH_SECS:
+                                render_results(video_results)
+                                last_render = time.time()
+                    processing_time = time.time() - start_time
+
+                log_video_summary(analyzer, len(video_results), processing_time, adaptive=change_detector is not None)
+                progress_bar.empty()
+                # Export files are built once here, not on every rerun that shows the results.
+                downloads = export_files(video_results)
+                status_placeholder.success(f"Video analysis complete! Processed {len(video_results)} frames in {processing_time:.2f} seconds.")
+                st.session_state["video_results"] = {
+                    "key": results_key, "store": video_results, "downloads": downloads, "seconds": processing_time
+                }
+                render_results(video_results, downloads)
             
+            except UploadTooLarge as e:
+                st.error(str(e))
+            except VideoOpenError:
+                st.error("Error: Could not open video file.")
             except Exception as e:
                 st.error(f"An error occurred during video analysis: {e}")
                 print(f"Video analysis error: {e}")
-            finally:
-                if os.path.exists(temp_video_path):
-                    os.remove(temp_video_path)
-                    print(f"Temporary video file deleted: {temp_video_path}")
+        elif stored_results is not None and stored_results["key"] == results_key:
+            st.subheader("📈 Analysis Results")
+            video_results = stored_results["store"]
+            st.success(f"Video analysis complete! Processed {len(video_results)} frames in {stored_results['seconds']:.2f} seconds.")
+            with metrics.timer("render"):
+                display_video_results(video_results, stored_results["downloads"])
         else:
             st.info("Click 'Analyze Video Frames' to start processing.")
     else:
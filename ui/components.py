@@ -1,5 +1,8 @@
+import json
 import streamlit as st
-import pandas as pd
+
+# Frames listed under "View Frame-by-Frame Details"; the downloads hold all of them.
+MAX_FRAME_TABLE_ROWS = 5000
 
 def setup_page():
     st.set_page_config(
@@ -15,7 +18,7 @@ def display_sidebar(frame_interval_option=False):
 
         input_method = st.radio(
             "Select Input Method:",
-            ("Upload Image", "Image URL", "Upload Video"),
+            ("Upload Image", "Upload Multiple Images", "Image URL", "Bulk Image URLs", "Upload Video"),
             key="input_method_radio"
         )
 
@@ -33,6 +36,28 @@ def display_sidebar(frame_interval_option=False):
 
         return input_method, confidence_threshold, frame_interval_secs
 
+def display_video_sampling_options():
+    with st.sidebar:
+        adaptive = st.checkbox(
+            "Adaptive frame sampling", value=False, key="adaptive_sampling_checkbox",
+            help="Check frames at the interval above but only run the model when the scene changes; "
+                 "unchanged frames repeat the previous result."
+        )
+        options = {"adaptive": adaptive, "scene_threshold": None, "max_gap_secs": None}
+        if adaptive:
+            options["scene_threshold"] = st.slider(
+                "Scene change sensitivity", 0.01, 0.30, 0.06, 0.01, key="scene_threshold_slider",
+                help="Minimum change (fraction of the pixel range) that counts as a new scene. Lower is more sensitive."
+            )
+            options["max_gap_secs"] = st.slider(
+                "Max Seconds Between Model Runs:", 1.0, 30.0, 5.0, 1.0, key="max_gap_slider"
+            )
+        options["smoothing_window"] = st.select_slider(
+            "Temporal smoothing (frames)", options=[1, 3, 5, 7, 9], value=1, key="smoothing_slider",
+            help="Majority vote of the predicted class over this many consecutive sampled frames."
+        )
+        return options
+
 def display_model_info(model_path, target_size, expected_class_names, class_info):
     with st.sidebar:
         with st.expander("ℹ️ Model Information"):
@@ -43,6 +68,35 @@ def display_model_info(model_path, target_size, expected_class_names, class_info
             for name in expected_class_names:
                 st.write(f"- {class_info[name]['display_name']}")
 
+def display_model_status(state, load_seconds=None, error=None):
+    # Renders into the current container so it can also run inside an st.fragment.
+    if state == "ready":
+        st.success("✅ Model ready" + (f" (loaded in {load_seconds:.1f}s)" if load_seconds else ""))
+    elif state == "failed":
+        st.error(f"❌ Model failed to load: {error}")
+    else:
+        st.info("⏳ Model is loading in the background...")
+
+def display_performance_panel(snapshot, prometheus_text):
+    import pandas as pd
+    with st.sidebar:
+        with st.expander("⏱️ Performance"):
+            stages = snapshot["stages"]
+            if stages:
+                stage_df = pd.DataFrame([
+                    {"Stage": stage, "Calls": s["count"], "Mean (ms)": s["mean_ms"],
+                     "p95 (ms)": s["p95_ms"], "Max (ms)": s["max_ms"]}
+                    for stage, s in stages.items()
+                ])
+                st.dataframe(stage_df.round(1), use_container_width=True, hide_index=True)
+            else:
+                st.write("No timings recorded yet.")
+            for name, value in {**snapshot["counters"], **snapshot["gauges"]}.items():
+                st.write(f"**{name.replace('_', ' ').capitalize()}:** {value}")
+            col1, col2 = st.columns(2)
+            col1.download_button("JSON", json.dumps(snapshot, indent=2), "metrics.json", "application/json")
+            col2.download_button("Prometheus", prometheus_text, "metrics.txt", "text/plain")
+
 def display_prediction(prediction_probs, class_info_dict, expected_class_names, confidence_threshold, prefix=""):
     predicted_index = prediction_probs.argmax()
     confidence = prediction_probs.max() * 100
@@ -76,6 +130,7 @@ def display_prediction(prediction_probs, class_info_dict, expected_class_names,
     return predicted_class_key, confidence
 
 def display_probability_details(prediction_probs, expected_class_names, class_info):
+    import pandas as pd
     with st.expander("🔬 View Detailed Probabilities"):
         prob_data = {
             'Class': [class_info[name]['display_name'] for name in expected_class_names],
@@ -86,27 +141,83 @@ def display_probability_details(prediction_probs, expected_class_names, class_in
         prob_df['Probability'] = prob_df['Probability'].apply(lambda x: f"{x*100:.2f}%")
         st.dataframe(prob_df, use_container_width=True, hide_index=True)
 
-def display_video_results(video_results):
-    if video_results:
-        df_results = pd.DataFrame(video_results)
-        valid_predictions = df_results[df_results['Class Key'] != 'unknown']
-
-        if not valid_predictions.empty:
-            prediction_counts = valid_predictions['Predicted Class'].value_counts()
-            most_frequent_class = prediction_counts.index[0]
-            count = prediction_counts.iloc[0]
-
-            st.metric(
-                label="Most Frequent Prediction (above threshold)",
-                value=most_frequent_class,
-                delta=f"{count} frames",
-                delta_color="off"
-            )
-        else:
-            st.info("No classifications were made above the confidence threshold.")
+def display_video_results(video_results, downloads=None):
+    """
+    Shows a VideoResultStore as class segments. downloads (see
+    utils.video_results.export_files) are given for a finished analysis; without
+    them (partial results) the download buttons and frame table are left out.
+    """
+    if len(video_results) == 0:
+        st.info("No frames were processed or no results generated.")
+        return
 
-        with st.expander("🔬 View Frame-by-Frame Details"):
-            st.dataframe(df_results[['Timestamp (s)', 'Predicted Class', 'Confidence (%)']], 
-                         use_container_width=True, hide_index=True)
+    most_frequent = video_results.most_frequent()
+    if most_frequent is not None:
+        class_key, count = most_frequent
+        st.metric(
+            label="Most Frequent Prediction (above threshold)",
+            value=video_results.class_info_dict[class_key]['display_name'],
+            delta=f"{count} frames",
+            delta_color="off"
+        )
     else:
-        st.info("No frames were processed or no results generated.")
\ No newline at end of file
+        st.info("No classifications were made above the confidence threshold.")
+
+    segments = video_results.to_frame(segments=True)
+    st.subheader(f"🧩 Class Segments ({len(segments)})")
+    st.dataframe(segments[['Start (s)', 'End (s)', 'Predicted Class', 'Frames', 'Mean Confidence (%)']],
+                 use_container_width=True, hide_index=True)
+    if downloads is None:
+        return
+
+    for column, (label, file_name, data, mime) in zip(st.columns(len(downloads)), downloads):
+        column.download_button(label, data, file_name, mime)
+
+    with st.expander("🔬 View Frame-by-Frame Details"):
+        # Every row is sent to the browser on each rerun, so long videos are only shown in part.
+        if len(video_results) > MAX_FRAME_TABLE_ROWS:
+            st.caption(f"Showing the first {MAX_FRAME_TABLE_ROWS:,} of {len(video_results):,} frames; download the frames file for all of them.")
+        st.dataframe(video_results.to_frame(limit=MAX_FRAME_TABLE_ROWS)[['Timestamp (s)', 'Predicted Class', 'Confidence (%)']],
+                     use_container_width=True, hide_index=True)
+
+def display_bulk_url_results(rows, class_info_dict, elapsed_secs):
+    import pandas as pd
+    if not rows:
+        st.info("No URLs were processed.")
+        return
+    df = pd.DataFrame(rows).sort_values("index")
+    ok = df[df["status"] == "ok"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Classified", len(ok))
+    col2.metric("Failed", len(df) - len(ok))
+    col3.metric("URLs per second", f"{len(df) / max(elapsed_secs, 1e-9):.1f}")
+
+    df["Predicted Class"] = [class_info_dict[key]['display_name'] if isinstance(key, str) else None for key in df["class_key"]]
+    table = df[["url", "Predicted Class", "confidence", "fetch_ms", "decode_ms", "inference_ms", "batch_size", "error"]]
+    table = table.rename(columns={
+        "url": "URL", "confidence": "Confidence (%)", "fetch_ms": "Fetch (ms)", "decode_ms": "Decode (ms)",
+        "inference_ms": "Inference (ms)", "batch_size": "Batch", "error": "Error",
+    })
+    st.dataframe(table.round(1), use_container_width=True, hide_index=True)
+
+def display_multi_image_summary(rows, class_info_dict, elapsed_secs):
+    import pandas as pd
+    df = pd.DataFrame(rows).sort_values("index")
+    ok = df[df["status"] == "ok"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Images classified", len(ok))
+    col2.metric("Failed", len(df) - len(ok))
+    col3.metric("Images per second", f"{len(df) / max(elapsed_secs, 1e-9):.1f}")
+
+    df["Predicted Class"] = [class_info_dict[key]['display_name'] if isinstance(key, str) else None for key in df["class_key"]]
+    counts = df.loc[df["status"] == "ok", "Predicted Class"].value_counts().rename_axis("Class").reset_index(name="Images")
+    st.subheader("🗂️ Images per Class")
+    st.dataframe(counts, use_container_width=True, hide_index=True)
+
+    with st.expander("🔬 View Per-Image Results"):
+        table = df[["name", "Predicted Class", "confidence", "decode_ms", "inference_ms", "batch_size", "error"]]
+        table = table.rename(columns={
+            "name": "File", "confidence": "Confidence (%)", "decode_ms": "Decode (ms)",
+            "inference_ms": "Inference (ms)", "batch_size": "Batch", "error": "Error",
+        })
+        st.dataframe(table.round(1), use_container_width=True, hide_index=True)
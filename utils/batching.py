@@ -0,0 +1,222 @@
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeoutError, wait
+from utils import metrics
+from utils.preprocessing import allocate_batch, preprocess_into
+
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_QUEUE_SIZE = 256
+
+class DeadlineExceeded(Exception):
+    pass
+
+class QueueFull(Exception):
+    pass
+
+class _Request:
+    __slots__ = ("image", "deadline", "future", "enqueued_at")
+
+    def __init__(self, image, deadline):
+        self.image = image
+        self.deadline = deadline
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+class MicroBatcher:
+    """
+    Collects single-image requests from many threads into batches for one
+    model.predict call each.
+
+    A batch is dispatched as soon as it holds max_batch_size images, or
+    max_wait_ms after its first image arrived, or when the earliest deadline
+    in it would otherwise pass, whichever comes first. Requests that are
+    already past their deadline (or were cancelled by a caller that gave up)
+    are dropped before inference, so a backlog never spends model time on
+    answers nobody is waiting for.
+
+    submit() returns a Future resolving to (probs, info), where info holds
+    batch_size, queue_ms and inference_ms. images are preprocessed float32
+    arrays of shape (H, W, 3) or (1, H, W, 3), e.g. from preprocess_image.
+    """
+
+    def __init__(self, model, target_size, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, max_queue_size=DEFAULT_MAX_QUEUE_SIZE):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(max_queue_size)
+        self._batch = allocate_batch(max_batch_size, target_size)
+        self._stats_lock = threading.Lock()
+        self._stats = dict(requests=0, batches=0, batched_images=0, expired=0, cancelled=0, rejected=0, errors=0)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def submit(self, image, deadline=None):
+        """Queues one image. deadline is a time.monotonic() timestamp or None. Raises QueueFull when saturated."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        request = _Request(image, deadline)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self._count("rejected")
+            raise QueueFull(f"more than {self._queue.maxsize} requests queued") from None
+        self._count("requests")
+        return request.future
+
+    def predict(self, image, timeout=None):
+        """Blocking submit(); raises DeadlineExceeded if no result arrives within timeout seconds."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        future = self.submit(image, deadline)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Not the builtin TimeoutError before Python 3.11.
+            future.cancel()
+            raise DeadlineExceeded(f"no result within {timeout * 1000:.0f} ms") from None
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        flush_at = first.enqueued_at + self.max_wait
+        if first.deadline is not None:
+            flush_at = min(flush_at, first.deadline)
+        while len(batch) < self.max_batch_size:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if request is None:
+                self._queue.put(None)  # let _run see the shutdown after this batch
+                break
+            batch.append(request)
+            if request.deadline is not None:
+                flush_at = min(flush_at, request.deadline)
+        return batch
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            if requests is None:
+                return
+            metrics.set_gauge("batch_queue_depth", self._queue.qsize())
+            now = time.monotonic()
+            live = []
+            for request in requests:
+                if not request.future.set_running_or_notify_cancel():
+                    self._count("cancelled")
+                elif request.deadline is not None and now >= request.deadline:
+                    self._count("expired")
+                    request.future.set_exception(DeadlineExceeded("deadline passed while queued"))
+                else:
+                    live.append(request)
+            if not live:
+                continue
+
+            try:
+                for i, request in enumerate(live):
+                    self._batch[i] = request.image.reshape(self._batch.shape[1:])
+                start_time = time.monotonic()
+                predictions = self.model.predict(self._batch[:len(live)], batch_size=len(live), verbose=0)
+                inference_ms = (time.monotonic() - start_time) * 1000
+                metrics.observe("inference", inference_ms / 1000)
+                metrics.increment("images_classified", len(live))
+            except Exception as e:
+                print(f"Error during batch prediction: {e}")
+                self._count("errors", len(live))
+                for request in live:
+                    request.future.set_exception(e)
+                continue
+
+            self._count("batches")
+            self._count("batched_images", len(live))
+            for i, request in enumerate(live):
+                request.future.set_result((predictions[i].copy(), {
+                    "batch_size": len(live),
+                    "queue_ms": (start_time - request.enqueued_at) * 1000,
+                    "inference_ms": inference_ms,
+                }))
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_batch_size"] = stats["batched_images"] / stats["batches"] if stats["batches"] else 0.0
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def close(self):
+        """Stops the batching thread after the requests already queued have been served."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+def classify_as_completed(futures, model, target_size, expected_class_names, confidence_threshold,
+                          batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=50.0):
+    """
+    Classifies images produced by concurrent decode tasks in batches and
+    yields one row per task, in completion order.
+
+    Each future resolves to (row, image), where image is a uint8 (H, W, 3)
+    array from resize_to_uint8, or None for a failed task (its row is yielded
+    unchanged). A batch runs when it holds batch_size images, or when no
+    other task finishes within max_wait_ms. Classified rows get class_key,
+    confidence, probs, inference_ms (of the whole batch) and batch_size.
+    Futures still pending when the caller stops iterating are cancelled.
+    """
+    from utils.model import predict_batch
+
+    batch_size = max(1, batch_size)
+    batch_buffer = allocate_batch(batch_size, target_size)
+    batch_rows = []
+
+    def classify():
+        start_time = time.perf_counter()
+        predictions = predict_batch(model, batch_buffer[:len(batch_rows)], expected_class_names, confidence_threshold)
+        inference_ms = (time.perf_counter() - start_time) * 1000
+        rows = list(batch_rows)
+        batch_rows.clear()
+        for i, row in enumerate(rows):
+            row.update(inference_ms=inference_ms, batch_size=len(rows))
+            if predictions is None:
+                row.update(status="error", error="batch prediction failed")
+            else:
+                class_key, confidence, probs = predictions[i]
+                row.update(class_key=class_key, confidence=round(float(confidence), 2), probs=probs.copy())
+        return rows
+
+    pending = set(futures)
+    try:
+        while pending or batch_rows:
+            timeout = max_wait_ms / 1000 if batch_rows else None
+            finished, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in finished:
+                row, image = future.result()
+                if image is None:
+                    yield row
+                    continue
+                preprocess_into(image, target_size, batch_buffer[len(batch_rows)])
+                batch_rows.append(row)
+                if len(batch_rows) == batch_size:
+                    yield from classify()
+            # Nothing arrived in time, or nothing is left to wait for.
+            if batch_rows and (not finished or not pending):
+                yield from classify()
+    finally:
+        for future in pending:
+            future.cancel()
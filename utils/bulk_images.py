@@ -0,0 +1,47 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import UnidentifiedImageError
+from utils import metrics
+from utils.batching import classify_as_completed
+from utils.image_processing import MAX_IMAGE_PIXELS
+from utils.preprocessing import open_image, resize_to_uint8
+
+# PIL decoding and OpenCV resizing release the GIL, so threads decode in parallel.
+DEFAULT_DECODE_WORKERS = int(os.environ.get("IMAGE_DECODE_WORKERS", min(4, os.cpu_count() or 1)))
+DEFAULT_BATCH_SIZE = 16
+ROW_FIELDS = ("index", "name", "status", "class_key", "confidence", "bytes",
+              "decode_ms", "inference_ms", "batch_size", "error")
+
+def _decode(index, fileobj, target_size, max_pixels):
+    row = dict.fromkeys(ROW_FIELDS)
+    name = str(fileobj) if isinstance(fileobj, (str, os.PathLike)) else getattr(fileobj, "name", str(index))
+    row.update(index=index, name=name, status="ok", bytes=getattr(fileobj, "size", None))
+    try:
+        start_time = time.perf_counter()
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+        image = resize_to_uint8(open_image(fileobj, target_size, max_pixels), target_size)
+        row["decode_ms"] = (time.perf_counter() - start_time) * 1000
+        metrics.observe("image_decode", row["decode_ms"] / 1000)
+        return row, image
+    except UnidentifiedImageError:
+        row.update(status="error", error="not a recognised image file")
+    except Exception as e:
+        row.update(status="error", error=f"{type(e).__name__}: {e}")
+    return row, None
+
+def iter_classify_images(files, model, target_size, expected_class_names, confidence_threshold,
+                         max_workers=DEFAULT_DECODE_WORKERS, batch_size=DEFAULT_BATCH_SIZE, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Classifies many images and yields one row per image in completion order.
+
+    files are paths or file-like objects (e.g. Streamlit UploadedFile).
+    They are decoded and resized on max_workers threads and classified in
+    batches of up to batch_size while later files are still decoding; see
+    utils.batching.classify_as_completed. row["index"] is the position in
+    files; undecodable or oversized images get status "error".
+    """
+    with ThreadPoolExecutor(max(1, max_workers), thread_name_prefix="image-decode") as pool:
+        futures = [pool.submit(_decode, index, fileobj, target_size, max_pixels) for index, fileobj in enumerate(files)]
+        yield from classify_as_completed(futures, model, target_size, expected_class_names, confidence_threshold, batch_size)
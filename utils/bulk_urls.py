@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+from utils import metrics
+from utils.batching import classify_as_completed
+from utils.image_processing import download_image_bytes, get_session, MAX_IMAGE_BYTES, MAX_IMAGE_PIXELS
+from utils.preprocessing import open_image, resize_to_uint8
+
+DEFAULT_FETCH_WORKERS = int(os.environ.get("BULK_FETCH_WORKERS", 8))
+# Concurrent requests per host, so a long list from one site does not hammer it.
+DEFAULT_PER_HOST_LIMIT = int(os.environ.get("BULK_FETCH_PER_HOST", 4))
+DEFAULT_BATCH_SIZE = 16
+# Longest a partly filled batch waits for more images before it is classified.
+DEFAULT_MAX_WAIT_MS = 50.0
+ROW_FIELDS = ("index", "url", "status", "class_key", "confidence", "bytes",
+              "fetch_ms", "decode_ms", "inference_ms", "batch_size", "error")
+
+def parse_url_list(text):
+    """URLs from text, one per line; blank lines and lines starting with # are skipped, duplicates dropped."""
+    urls = []
+    seen = set()
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and line not in seen:
+            seen.add(line)
+            urls.append(line)
+    return urls
+
+class _HostLimiter:
+    def __init__(self, per_host_limit):
+        self.per_host_limit = max(1, per_host_limit)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return semaphore
+
+def _fetch_and_decode(index, url, limiter, session, target_size, max_bytes, max_pixels):
+    """Returns (row, uint8 image array or None). Runs on a fetch thread, so decoding overlaps other downloads."""
+    row = dict.fromkeys(ROW_FIELDS)
+    row.update(index=index, url=url, status="ok")
+    try:
+        with limiter(url):
+            start_time = time.perf_counter()
+            image_bytes = download_image_bytes(url, max_bytes, session)
+            row["fetch_ms"] = (time.perf_counter() - start_time) * 1000
+        metrics.observe("image_fetch", row["fetch_ms"] / 1000)
+        row["bytes"] = len(image_bytes)
+
+        start_time = time.perf_counter()
+        image = resize_to_uint8(open_image(BytesIO(image_bytes), target_size, max_pixels), target_size)
+        row["decode_ms"] = (time.perf_counter() - start_time) * 1000
+        metrics.observe("image_decode", row["decode_ms"] / 1000)
+        return row, image
+    except Exception as e:
+        row.update(status="error", error=f"{type(e).__name__}: {e}")
+        return row, None
+
+def iter_classify_urls(urls, model, target_size, expected_class_names, confidence_threshold,
+                       max_workers=DEFAULT_FETCH_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                       batch_size=DEFAULT_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                       max_bytes=MAX_IMAGE_BYTES, max_pixels=MAX_IMAGE_PIXELS, session=None):
+    """
+    Fetches and classifies many image URLs and yields one row per URL.
+
+    Downloads run concurrently on max_workers threads over one pooled
+    session, at most per_host_limit at a time per host. Each image is
+    decoded and resized on its fetch thread as soon as its body arrives, then
+    collected into batches for one model call each. A batch runs when it is
+    full, or when no other image arrives within max_wait_ms.
+
+    Rows are yielded in completion order; row["index"] is the position in
+    urls. Failed fetches, oversized bodies or images and undecodable data get
+    status "error" and an error message instead of a class. fetch_ms and
+    decode_ms are per URL; inference_ms is the time of the batch the image
+    was classified in, shared by its batch_size images (see
+    utils.batching.classify_as_completed).
+    """
+    limiter = _HostLimiter(per_host_limit)
+    session = session or get_session()
+    with ThreadPoolExecutor(max(1, max_workers), thread_name_prefix="url-fetch") as pool:
+        futures = [
+            pool.submit(_fetch_and_decode, index, url, limiter, session, target_size, max_bytes, max_pixels)
+            for index, url in enumerate(urls)
+        ]
+        # Downloads already running when the caller stops early finish on their own.
+        yield from classify_as_completed(
+            futures, model, target_size, expected_class_names, confidence_threshold, batch_size, max_wait_ms
+        )
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import re
+import time
+from contextlib import nullcontext
+from pathlib import Path
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_CHUNK_SIZE = 64 * 1024  # an interrupted transfer loses at most one chunk
+DEFAULT_PROGRESS_INTERVAL = 0.5  # seconds between progress callbacks
+DEFAULT_MAX_RETRIES = 5
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+class DownloadError(Exception):
+    pass
+
+class FileLock:
+    """
+    Exclusive advisory lock on `<path>.lock`, shared between processes on one
+    host, so concurrent workers do not download the same file twice.
+    """
+
+    def __init__(self, path):
+        self.lock_path = Path(f"{path}.lock")
+        self._fd = None
+
+    def __enter__(self):
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.5)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+def sha256_of_file(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def verify_file(path, expected_size=None, expected_sha256=None, validator=None):
+    """Returns None if path passes every configured check, otherwise a reason string."""
+    path = Path(path)
+    if not path.is_file():
+        return "file is missing"
+    size = path.stat().st_size
+    if expected_size is not None and size != expected_size:
+        return f"size {size} != expected {expected_size}"
+    if expected_sha256 and sha256_of_file(path).lower() != expected_sha256.lower():
+        return "SHA-256 mismatch"
+    if validator is not None and not validator(path):
+        return "content validation failed"
+    return None
+
+def _total_size(response, offset):
+    if response.status_code == 206:
+        match = _CONTENT_RANGE.match(response.headers.get('content-range', ''))
+        if match and match.group(3) != '*':
+            return int(match.group(3))
+    length = response.headers.get('content-length')
+    if length is None:
+        return None
+    return int(length) + (offset if response.status_code == 206 else 0)
+
+def _fetch_to_part(url, part_path, total_size, chunk_size, timeout, max_retries,
+                   progress_callback, progress_interval, session):
+    """Appends the remainder of url to part_path, retrying with Range requests. Returns the total size if known."""
+    attempt = 0
+    while True:
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        if total_size is not None and offset >= total_size:
+            return total_size
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+                if response.status_code == 416 and offset:
+                    # The partial file is already as long as the remote file (or longer, i.e. stale).
+                    return total_size or offset
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    print("Server ignored the Range request; restarting the download from the beginning.")
+                    offset = 0
+                total_size = _total_size(response, offset) or total_size
+
+                start_time = time.time()
+                last_report = 0.0
+                downloaded = offset
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        now = time.time()
+                        if progress_callback and now - last_report >= progress_interval:
+                            last_report = now
+                            elapsed = now - start_time
+                            speed = (downloaded - offset) / elapsed if elapsed > 0 else 0.0
+                            progress_callback(downloaded, total_size, speed)
+                    f.flush()
+                    os.fsync(f.fileno())
+            if total_size is None or downloaded >= total_size:
+                return total_size
+            raise requests.exceptions.ChunkedEncodingError(
+                f"connection closed after {downloaded} of {total_size} bytes"
+            )
+        except requests.exceptions.RequestException as e:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            attempt += 1
+            if (status is not None and 400 <= status < 500) or attempt > max_retries:
+                raise DownloadError(f"Error downloading {url}: {e}") from e
+            delay = min(2 ** attempt, 30)
+            print(f"Download interrupted ({e}); resuming in {delay}s (attempt {attempt}/{max_retries}).")
+            time.sleep(delay)
+
+def download_file(url, dest_path, expected_size=None, expected_sha256=None, validator=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE, timeout=30, max_retries=DEFAULT_MAX_RETRIES,
+                  progress_callback=None, progress_interval=DEFAULT_PROGRESS_INTERVAL, session=None):
+    """
+    Downloads url to dest_path, resuming and verifying, and returns dest_path.
+
+    Data is streamed into `<dest>.part`. Interrupted transfers are resumed with
+    an HTTP Range request, both across retries and across restarts, and a server
+    that ignores Range restarts from zero. The finished file is checked against
+    expected_size, expected_sha256 and validator(path), then moved into place
+    with os.replace. dest_path therefore only ever holds a complete, verified
+    file. An existing dest_path that fails verification is downloaded again.
+    A `<dest>.lock` file lock serialises concurrent callers.
+
+    progress_callback(downloaded_bytes, total_bytes_or_None, bytes_per_second)
+    is called at most every progress_interval seconds, plus once at the end.
+    Raises DownloadError when the download or verification fails.
+    """
+    dest_path = Path(dest_path)
+    part_path = Path(f"{dest_path}.part")
+    # A session created here is closed on return; a caller's session is left open.
+    owned_session = requests.Session() if session is None else nullcontext(session)
+
+    with owned_session as session, FileLock(dest_path):
+        if dest_path.exists():
+            reason = verify_file(dest_path, expected_size, expected_sha256, validator)
+            if reason is None:
+                return dest_path
+            print(f"Existing file {dest_path} is invalid ({reason}); downloading again.")
+            dest_path.unlink()
+
+        resumed = part_path.exists()
+        total_size = _fetch_to_part(url, part_path, expected_size, chunk_size, timeout, max_retries,
+                                    progress_callback, progress_interval, session)
+        reason = verify_file(part_path, expected_size or total_size, expected_sha256, validator)
+        if reason is not None and resumed:
+            # A leftover .part from an older remote file can't be trusted; start over once.
+            print(f"Resumed download failed verification ({reason}); downloading from scratch.")
+            part_path.unlink(missing_ok=True)
+            total_size = _fetch_to_part(url, part_path, expected_size, chunk_size, timeout, max_retries,
+                                        progress_callback, progress_interval, session)
+            reason = verify_file(part_path, expected_size or total_size, expected_sha256, validator)
+        if reason is not None:
+            part_path.unlink(missing_ok=True)
+            raise DownloadError(f"Downloaded file failed verification: {reason}")
+        os.replace(part_path, dest_path)
+        if progress_callback:
+            progress_callback(dest_path.stat().st_size, total_size, 0.0)
+        return dest_path
@@ -0,0 +1,77 @@
+import sys
+import time
+from contextlib import contextmanager
+
+def _streamlit():
+    """Returns the streamlit module when running inside a Streamlit script run, else None."""
+    if "streamlit" not in sys.modules:
+        return None
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        try:
+            from streamlit.scriptrunner import get_script_run_ctx  # streamlit < 1.12
+        except ImportError:
+            return None
+    try:
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except TypeError:
+        ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    return sys.modules["streamlit"]
+
+def error(message):
+    st = _streamlit()
+    if st:
+        st.error(message)
+    else:
+        print(f"ERROR: {message}", file=sys.stderr)
+
+def info(message):
+    st = _streamlit()
+    if st:
+        st.info(message)
+    else:
+        print(message)
+
+def success(message):
+    st = _streamlit()
+    if st:
+        st.success(message)
+    else:
+        print(message)
+
+class _ConsoleProgress:
+    """Stand-in for st.progress outside Streamlit; prints at most every `interval` seconds."""
+
+    def __init__(self, text, interval=2.0):
+        self.interval = interval
+        self._last = 0.0
+        if text:
+            print(text)
+
+    def progress(self, value, text=None):
+        now = time.time()
+        if text and (now - self._last >= self.interval or value >= 1.0):
+            self._last = now
+            print(text)
+
+    def empty(self):
+        pass
+
+def progress(value=0.0, text=None):
+    st = _streamlit()
+    if st:
+        return st.progress(value, text=text)
+    return _ConsoleProgress(text)
+
+@contextmanager
+def spinner(text):
+    st = _streamlit()
+    if st:
+        with st.spinner(text):
+            yield
+    else:
+        print(text)
+        yield
@@ -1,38 +1,90 @@
-import numpy as np
-import tensorflow as tf
-import streamlit as st
-from PIL import Image
+import os
+import threading
 import requests
 from io import BytesIO
+from requests.adapters import HTTPAdapter
+from utils import feedback, metrics
+from utils.preprocessing import allocate_batch, preprocess_into, open_image, ImageTooLarge
 
-def preprocess_image(img_pil, target_size):
+# Fetched bodies and decoded images above these limits are rejected; bodies
+# are checked while streaming, pixels before decoding.
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", 50_000_000))
+FETCH_TIMEOUT_SECS = 10
+FETCH_CHUNK_SIZE = 64 * 1024
+# Keep-alive connections kept open per host by the shared session.
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 16))
+
+_session = None
+_session_lock = threading.Lock()
+
+def preprocess_image(img, target_size):
     try:
-        img_resized = img_pil.resize(target_size, Image.Resampling.LANCZOS)
-        img_array = tf.keras.preprocessing.image.img_to_array(img_resized)
-        img_array = img_array / 255.0
-        img_batch = np.expand_dims(img_array, axis=0)
+        with metrics.timer("preprocess"):
+            img_batch = allocate_batch(1, target_size)
+            preprocess_into(img, target_size, img_batch[0])
         return img_batch
     except Exception as e:
         print(f"Error preprocessing image: {e}")
         return None
 
-def load_image_from_url(url):
-    try:
-        response = requests.get(url, stream=True, timeout=10)
+def get_session():
+    """Process-wide requests.Session, so fetches reuse pooled keep-alive connections instead of reconnecting."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def download_image_bytes(url, max_bytes=MAX_IMAGE_BYTES, session=None, timeout=FETCH_TIMEOUT_SECS):
+    """
+    Streams the body of url into memory. Raises ImageTooLarge as soon as it
+    is known to exceed max_bytes (from Content-Length or while reading), and
+    requests exceptions for HTTP and connection errors.
+    """
+    session = session or get_session()
+    with session.get(url, stream=True, timeout=timeout) as response:
         response.raise_for_status()
-        img_pil = Image.open(BytesIO(response.content)).convert('RGB')
-        return img_pil
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching image from URL: {e}")
+        length = response.headers.get("content-length")
+        if max_bytes is not None and length and length.isdigit() and int(length) > max_bytes:
+            raise ImageTooLarge(f"response is {int(length)} bytes, more than {max_bytes}")
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=FETCH_CHUNK_SIZE):
+            body += chunk
+            if max_bytes is not None and len(body) > max_bytes:
+                raise ImageTooLarge(f"response is larger than {max_bytes} bytes")
+        return bytes(body)
+
+def fetch_image_bytes(url, max_bytes=MAX_IMAGE_BYTES):
+    try:
+        with metrics.timer("image_fetch"):
+            return download_image_bytes(url, max_bytes)
+    except (requests.exceptions.RequestException, ImageTooLarge) as e:
+        feedback.error(f"Error fetching image from URL: {e}")
         return None
+
+def load_image_from_bytes(image_bytes, target_size=None, max_pixels=MAX_IMAGE_PIXELS):
+    try:
+        with metrics.timer("image_decode"):
+            return open_image(BytesIO(image_bytes), target_size, max_pixels)
     except Exception as e:
-        st.error(f"Error opening image from URL: {e}")
+        feedback.error(f"Error opening image: {e}")
+        return None
+
+def load_image_from_url(url, target_size=None):
+    image_bytes = fetch_image_bytes(url)
+    if image_bytes is None:
         return None
+    return load_image_from_bytes(image_bytes, target_size)
 
-def load_uploaded_image(uploaded_file):
+def load_uploaded_image(uploaded_file, target_size=None):
     try:
-        img_pil = Image.open(uploaded_file).convert('RGB')
+        with metrics.timer("image_decode"):
+            img_pil = open_image(uploaded_file, target_size)
         return img_pil
     except Exception as e:
-        st.error(f"Error opening uploaded file: {e}")
+        feedback.error(f"Error opening uploaded file: {e}")
         return None
\ No newline at end of file
@@ -0,0 +1,238 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+import numpy as np
+
+# TensorFlow is imported inside the functions that need it, so importing this
+# module (and utils.model) stays cheap until a model is actually loaded.
+
+DEFAULT_MAX_BATCH_SIZE = 16
+TFLITE_QUANTIZATIONS = ("float32", "float16", "int8")
+
+def _tflite_interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+def _batch_buckets(max_batch_size):
+    buckets = [1]
+    while buckets[-1] < max_batch_size:
+        buckets.append(min(buckets[-1] * 2, max_batch_size))
+    return buckets
+
+class _BucketedEngine:
+    """Pads requests to fixed batch buckets and splits oversized batches; subclasses implement _run()."""
+
+    max_batch_size = DEFAULT_MAX_BATCH_SIZE
+    buckets = (1,)
+    input_shape = ()
+
+    def _run(self, padded_batch):
+        raise NotImplementedError
+
+    def _bucket_for(self, batch_size):
+        for size in self.buckets:
+            if size >= batch_size:
+                return size
+        return self.max_batch_size
+
+    def _predict_chunk(self, chunk):
+        count = len(chunk)
+        bucket = self._bucket_for(count)
+        if count < bucket:
+            padded = np.zeros((bucket,) + self.input_shape, dtype=np.float32)
+            padded[:count] = chunk
+            chunk = padded
+        return self._run(chunk)[:count]
+
+    def predict(self, img_batch, **kwargs):
+        """Returns an (N, num_classes) probability array. Extra keyword arguments of `model.predict` are ignored."""
+        img_batch = np.asarray(img_batch, dtype=np.float32)
+        if img_batch.ndim == len(self.input_shape):
+            img_batch = img_batch[np.newaxis]
+        if len(img_batch) <= self.max_batch_size:
+            return self._predict_chunk(img_batch)
+        return np.concatenate([
+            self._predict_chunk(img_batch[start:start + self.max_batch_size])
+            for start in range(0, len(img_batch), self.max_batch_size)
+        ])
+
+class KerasInferenceEngine(_BucketedEngine):
+    """
+    Calls a Keras model through pre-traced graph functions.
+
+    `model.predict` builds a data adapter, a callback list and a progress bar
+    on every call, which costs more than the forward pass for one image. This
+    engine traces one fixed-shape concrete function per batch bucket (1, 2, 4,
+    ... max_batch_size), pads each request to the nearest bucket, and
+    calls the graph directly. Its `predict` method is a drop-in replacement for
+    `model.predict`, so `predict_image` and `predict_batch` accept either.
+
+    warmup_batch_sizes limits the buckets traced and run at construction
+    (default: all of them); the others are traced on first use.
+    """
+
+    backend = "keras"
+
+    def __init__(self, model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, warmup=True, warmup_batch_sizes=None):
+        import tensorflow as tf
+        self.model = model
+        self.input_shape = tuple(model.input_shape[1:])
+        self.max_batch_size = max(1, max_batch_size)
+        self.buckets = _batch_buckets(self.max_batch_size)
+        self._fingerprint = None
+
+        self._forward = tf.function(lambda x: model(x, training=False), autograph=False)
+        self._functions = {}
+        self._trace_lock = threading.Lock()
+        self.warmup_seconds = self.warmup(warmup_batch_sizes) if warmup else None
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            from utils.model import model_fingerprint
+            self._fingerprint = f"{self.backend}:{model_fingerprint(self.model)}"
+        return self._fingerprint
+
+    def _function_for(self, batch_size):
+        function = self._functions.get(batch_size)
+        if function is None:
+            import tensorflow as tf
+            with self._trace_lock:
+                function = self._functions.get(batch_size)
+                if function is None:
+                    spec = tf.TensorSpec((batch_size,) + self.input_shape, tf.float32)
+                    function = self._functions[batch_size] = self._forward.get_concrete_function(spec)
+        return function
+
+    def warmup(self, batch_sizes=None):
+        """
+        Traces and runs the buckets of batch_sizes (default: every bucket) once,
+        so graph optimisation and kernel selection happen before the first request.
+        """
+        import tensorflow as tf
+        start_time = time.time()
+        for size in sorted({self._bucket_for(n) for n in (batch_sizes or self.buckets)}):
+            self._function_for(size)(tf.zeros((size,) + self.input_shape, tf.float32))
+        return time.time() - start_time
+
+    def _run(self, padded_batch):
+        import tensorflow as tf
+        return self._function_for(len(padded_batch))(tf.convert_to_tensor(padded_batch, dtype=tf.float32)).numpy()
+
+def tflite_artifact_path(keras_path, quantization):
+    keras_path = Path(keras_path)
+    return keras_path.with_name(f"{keras_path.stem}.{quantization}.tflite")
+
+def convert_to_tflite(keras_path, quantization="float16", tflite_path=None):
+    """
+    Converts a .keras file to TFLite once and returns the cached artifact path.
+
+    quantization is "float32" (no quantization), "float16" (float16 weights)
+    or "int8" (dynamic-range int8 weights, float activations). The artifact is
+    rebuilt when the .keras file is newer than it.
+    """
+    if quantization not in TFLITE_QUANTIZATIONS:
+        raise ValueError(f"Unknown TFLite quantization '{quantization}', expected one of {TFLITE_QUANTIZATIONS}")
+    keras_path = Path(keras_path)
+    tflite_path = Path(tflite_path) if tflite_path else tflite_artifact_path(keras_path, quantization)
+    if tflite_path.exists() and tflite_path.stat().st_mtime >= keras_path.stat().st_mtime:
+        return tflite_path
+
+    import tensorflow as tf
+    print(f"Converting {keras_path} to TFLite ({quantization})...")
+    start_time = time.time()
+    model = tf.keras.models.load_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    tflite_model = converter.convert()
+    del model
+
+    fd, tmp_path = tempfile.mkstemp(dir=tflite_path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(tflite_model)
+        os.replace(tmp_path, tflite_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"Saved {tflite_path} ({len(tflite_model) / (1024 * 1024):.1f} MB) in {time.time() - start_time:.1f}s")
+    return tflite_path
+
+class TFLiteInferenceEngine(_BucketedEngine):
+    """
+    Runs a .tflite model through the TFLite interpreter (XNNPACK on CPU).
+
+    One interpreter is allocated per batch bucket, lazily, and requests are
+    padded to the nearest bucket like KerasInferenceEngine. All
+    interpreters memory-map the same file, so weights are shared. Interpreters
+    are not thread-safe; each one is guarded by its own lock.
+    """
+
+    def __init__(self, tflite_path, num_threads=None, max_batch_size=DEFAULT_MAX_BATCH_SIZE, warmup=True, backend="tflite",
+                 warmup_batch_sizes=None):
+        self.tflite_path = Path(tflite_path)
+        self.backend = backend
+        self.num_threads = num_threads or os.cpu_count()
+        self.max_batch_size = max(1, max_batch_size)
+        self.buckets = _batch_buckets(self.max_batch_size)
+        self._interpreters = {}
+        self._lock = threading.Lock()
+        self._fingerprint = None
+
+        interpreter = self._interpreter_for(1)[0]
+        input_details = interpreter.get_input_details()[0]
+        self.input_shape = tuple(int(d) for d in input_details["shape"][1:])
+        self.warmup_seconds = self.warmup(warmup_batch_sizes) if warmup else None
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            with open(self.tflite_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self._fingerprint = f"{self.backend}:{digest.hexdigest()}"
+        return self._fingerprint
+
+    def _interpreter_for(self, batch_size):
+        with self._lock:
+            entry = self._interpreters.get(batch_size)
+            if entry is None:
+                interpreter = _tflite_interpreter_class()(model_path=str(self.tflite_path), num_threads=self.num_threads)
+                input_index = interpreter.get_input_details()[0]["index"]
+                if batch_size != 1:
+                    input_shape = list(interpreter.get_input_details()[0]["shape"])
+                    input_shape[0] = batch_size
+                    interpreter.resize_tensor_input(input_index, input_shape, strict=False)
+                interpreter.allocate_tensors()
+                entry = (interpreter, input_index, interpreter.get_output_details()[0]["index"], threading.Lock())
+                self._interpreters[batch_size] = entry
+            return entry
+
+    def warmup(self, batch_sizes=None):
+        """Allocates and runs the interpreters of batch_sizes (default: 1 and max_batch_size) once."""
+        start_time = time.time()
+        for size in {self._bucket_for(n) for n in (batch_sizes or (1, self.max_batch_size))}:
+            self._predict_chunk(np.zeros((size,) + self.input_shape, dtype=np.float32))
+        return time.time() - start_time
+
+    def _run(self, padded_batch):
+        interpreter, input_index, output_index, lock = self._interpreter_for(len(padded_batch))
+        with lock:
+            interpreter.set_tensor(input_index, np.ascontiguousarray(padded_batch, dtype=np.float32))
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index).copy()
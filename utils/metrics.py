@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+
+# Set METRICS_ENABLED=1 to collect per-stage timings, counters and gauges.
+# When disabled, timer() and in_flight() return a shared no-op context manager
+# and increment() returns immediately, so instrumented code only pays for a
+# global lookup and a branch.
+_enabled = os.environ.get("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+PROMETHEUS_PREFIX = "garbage_classifier"
+# Histogram bucket upper bounds in seconds (Prometheus `le` labels).
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_gauges = {}
+_started_at = time.time()
+_NOOP = nullcontext()
+
+class _Histogram:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """Estimates the q-quantile by linear interpolation within its bucket, like histogram_quantile()."""
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS, self.buckets):
+            if count and cumulative + count >= rank:
+                return min(lower + (bound - lower) * (rank - cumulative) / count, self.max)
+            cumulative += count
+            lower = bound
+        return self.max
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.start)
+
+class _InFlight:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        add_to_gauge(self.name, 1)
+        return self
+
+    def __exit__(self, *exc_info):
+        # Not gated on _enabled, so disabling mid-request cannot leave the gauge raised.
+        with _lock:
+            _gauges[self.name] = _gauges.get(self.name, 0) - 1
+
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+def reset():
+    global _started_at
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _gauges.clear()
+        _started_at = time.time()
+
+def observe(stage, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _stages.get(stage)
+        if histogram is None:
+            histogram = _stages[stage] = _Histogram()
+        histogram.observe(seconds)
+
+def timer(stage):
+    """Context manager that records how long its block takes under stage."""
+    if not _enabled:
+        return _NOOP
+    return _Timer(stage)
+
+def timed(stage):
+    """Decorator version of timer()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def increment(name, amount=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def add_to_gauge(name, amount):
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[name] = _gauges.get(name, 0) + amount
+
+def set_gauge(name, value):
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[name] = value
+
+def in_flight(name="requests_in_flight"):
+    """Context manager that counts concurrently running blocks in the gauge `name`."""
+    if not _enabled:
+        return _NOOP
+    return _InFlight(name)
+
+def snapshot():
+    """All metrics as a JSON-serialisable dict; stage times are in milliseconds."""
+    with _lock:
+        stages = {
+            stage: {
+                "count": h.count,
+                "total_ms": h.total * 1000,
+                "mean_ms": h.total / h.count * 1000 if h.count else 0.0,
+                "p50_ms": h.quantile(0.5) * 1000,
+                "p95_ms": h.quantile(0.95) * 1000,
+                "max_ms": h.max * 1000,
+            }
+            for stage, h in sorted(_stages.items())
+        }
+        return {
+            "enabled": _enabled,
+            "uptime_seconds": time.time() - _started_at,
+            "stages": stages,
+            "counters": dict(sorted(_counters.items())),
+            "gauges": dict(sorted(_gauges.items())),
+        }
+
+def to_json():
+    return json.dumps(snapshot(), indent=2)
+
+def to_prometheus():
+    """Metrics in the Prometheus text exposition format."""
+    name = f"{PROMETHEUS_PREFIX}_stage_duration_seconds"
+    lines = [f"# HELP {name} Time spent per processing stage.", f"# TYPE {name} histogram"]
+    with _lock:
+        for stage, h in sorted(_stages.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {h.total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        for counter, value in sorted(_counters.items()):
+            lines += [f"# TYPE {PROMETHEUS_PREFIX}_{counter}_total counter", f"{PROMETHEUS_PREFIX}_{counter}_total {value}"]
+        for gauge, value in sorted(_gauges.items()):
+            lines += [f"# TYPE {PROMETHEUS_PREFIX}_{gauge} gauge", f"{PROMETHEUS_PREFIX}_{gauge} {value}"]
+    return "\n".join(lines) + "\n"
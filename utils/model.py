@@ -1,108 +1,303 @@
-import tensorflow as tf
-import numpy as np
-import streamlit as st
 from pathlib import Path
-import requests
 import time
+import hashlib
+import os
+import zipfile
+import threading
+from utils import feedback, metrics
+# NumPy, requests and TensorFlow are imported lazily by the functions below so
+# that importing this module (for its constants and ModelLoader) is cheap.
 MODEL_DOWNLOAD_URL = "https://huggingface.co/iuQuynhThu/Garbage/resolve/main/model.keras"
 # Tên file để lưu model cục bộ trong môi trường Streamlit Cloud
 LOCAL_MODEL_FILENAME = "downloaded_model.keras"
 CACHE_DIR = Path("./model_cache") # Thư mục để lưu file tải về
+# Optional integrity checks for the downloaded model file.
+MODEL_SHA256 = os.environ.get("MODEL_SHA256") or None
+MODEL_SIZE = int(os.environ["MODEL_SIZE"]) if os.environ.get("MODEL_SIZE") else None
+# "keras", "tflite-float32", "tflite-float16" or "tflite-int8"
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "keras")
+TFLITE_NUM_THREADS = int(os.environ.get("TFLITE_NUM_THREADS", os.cpu_count() or 1))
 
-@st.cache_resource(ttl=3600) # Cache model trong 1 giờ, hoặc bỏ ttl để cache vô hạn
-def download_and_load_keras_model(model_url: str, save_dir: Path, model_filename: str) -> tf.keras.Model | None:
+def _is_keras_archive(path):
     """
-    Downloads the model if not present locally, then loads and returns it.
-    Caches the loaded model object.
+    Whether path is a complete, intact .keras zip archive. Checks the content,
+    not the name, because download_file validates `<dest>.part` before the rename.
     """
+    # A truncated download has no central directory; a corrupted one fails the
+    # member CRCs (about 40 ms for a 90 MB model).
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return "config.json" in archive.namelist() and archive.testzip() is None
+    except Exception:
+        return False
+
+def _model_file_validator(model_filename):
+    return _is_keras_archive if Path(model_filename).suffix == ".keras" else None
+
+def download_progress_callback(progress_bar):
+    def update(downloaded_size, total_size_in_bytes, speed_bytes_s):
+        if total_size_in_bytes:
+            progress = min(1.0, downloaded_size / total_size_in_bytes)
+            progress_bar.progress(progress, text=f"Downloading... {int(progress*100)}% ({downloaded_size/(1024*1024):.1f}/{total_size_in_bytes/(1024*1024):.1f} MB @ {speed_bytes_s/(1024*1024):.2f} MB/s)")
+        else:
+            # Show progress in MB if total size is unknown
+            progress_bar.progress(0.0, text=f"Downloading... {downloaded_size/(1024*1024):.1f} MB")
+    return update
+
+def ensure_model_file(model_url: str, save_dir: Path, model_filename: str,
+                      expected_sha256: str | None = MODEL_SHA256, expected_size: int | None = MODEL_SIZE) -> Path | None:
+    """
+    Makes sure a complete, verified copy of the model is on disk and returns its path.
+    Partial downloads are resumed; see utils.download.download_file.
+    """
+    from utils.download import download_file, verify_file, DownloadError
+
     save_dir.mkdir(parents=True, exist_ok=True)
     local_model_path = save_dir / model_filename
+    validator = _model_file_validator(model_filename)
 
-    # 1. Download model if it doesn't exist locally
-    if not local_model_path.exists():
-        st.info(f"Model file not found locally. Downloading from {model_url}...")
-        try:
-            # Use requests with streaming for large files
-            with requests.get(model_url, stream=True) as r:
-                r.raise_for_status()  # Check if the request was successful
-                total_size_in_bytes = int(r.headers.get('content-length', 0))
-                block_size = 1024 * 8 # 8 Kibibytes
-                downloaded_size = 0
-
-                progress_bar = st.progress(0.0, text="Starting model download...")
-                start_time = time.time()
-
-                with open(local_model_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=block_size):
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        if total_size_in_bytes > 0:
-                            progress = min(1.0, downloaded_size / total_size_in_bytes)
-                            elapsed_time = time.time() - start_time
-                            speed_mb_s = (downloaded_size / (1024*1024)) / elapsed_time if elapsed_time > 0 else 0
-                            progress_bar.progress(progress, text=f"Downloading... {int(progress*100)}% ({downloaded_size/(1024*1024):.1f}/{total_size_in_bytes/(1024*1024):.1f} MB @ {speed_mb_s:.2f} MB/s)")
-                        else:
-                            # Show progress in MB if total size is unknown
-                            progress_bar.progress(0.0, text=f"Downloading... {downloaded_size/(1024*1024):.1f} MB")
-
-                progress_bar.progress(1.0, text="Model download complete!")
-                st.success(f"Model saved locally to {local_model_path}")
-
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error downloading model: {e}")
-            # Clean up partial download if it exists
-            if local_model_path.exists():
-                local_model_path.unlink()
-            return None
-        except Exception as e:
-            st.error(f"An unexpected error occurred during download: {e}")
-            if local_model_path.exists():
-                local_model_path.unlink()
-            return None
+    if verify_file(local_model_path, expected_size, expected_sha256, validator) is None:
+        return local_model_path
+
+    feedback.info(f"Model file not found locally or incomplete. Downloading from {model_url}...")
+    progress_bar = feedback.progress(0.0, text="Starting model download...")
+    try:
+        # Re-checks the file under a lock, so a worker that waited on another one's download returns immediately.
+        download_file(
+            model_url, local_model_path,
+            expected_size=expected_size, expected_sha256=expected_sha256, validator=validator,
+            progress_callback=download_progress_callback(progress_bar),
+        )
+    except DownloadError as e:
+        feedback.error(f"Error downloading model: {e}")
+        return None
+    except Exception as e:
+        feedback.error(f"An unexpected error occurred during download: {e}")
+        return None
+
+    progress_bar.progress(1.0, text="Model download complete!")
+    feedback.success(f"Model saved locally to {local_model_path}")
+    return local_model_path
+
+def download_and_load_keras_model(model_url: str, save_dir: Path, model_filename: str):
+    """
+    Downloads the model if not present locally, then loads and returns it.
+    Not cached here; the Streamlit app wraps load_inference_engine in st.cache_resource.
+    """
+    local_model_path = ensure_model_file(model_url, save_dir, model_filename)
+    if local_model_path is None:
+        return None
 
     # 2. Load the model from the local file
     try:
-        st.info(f"Loading model from {local_model_path}...")
+        import tensorflow as tf
+        feedback.info(f"Loading model from {local_model_path}...")
         model = tf.keras.models.load_model(local_model_path)
-        st.success("Model loaded successfully!")
+        feedback.success("Model loaded successfully!")
         return model
     except Exception as e:
-        st.error(f"Error loading model from file: {e}")
+        feedback.error(f"Error loading model from file: {e}")
+        return None
+
+
+def load_inference_engine(model_url: str, save_dir: Path, model_filename: str, backend: str = INFERENCE_BACKEND,
+                          max_batch_size: int | None = None, num_threads: int = TFLITE_NUM_THREADS,
+                          warmup_batch_sizes: tuple | None = None):
+    """
+    Loads the model behind the configured backend and warms it up, so the
+    first user request does not pay for graph tracing or tensor allocation.
+
+    backend is "keras" (KerasInferenceEngine) or "tflite-float32",
+    "tflite-float16" / "tflite-int8" (TFLiteInferenceEngine on a cached
+    conversion of the downloaded .keras file). warmup_batch_sizes limits
+    warmup to those batch sizes; other buckets are prepared on first use.
+    """
+    from utils.inference import (
+        KerasInferenceEngine, TFLiteInferenceEngine, convert_to_tflite, DEFAULT_MAX_BATCH_SIZE, TFLITE_QUANTIZATIONS
+    )
+    max_batch_size = max_batch_size or DEFAULT_MAX_BATCH_SIZE
+
+    if backend.startswith("tflite-"):
+        quantization = backend.split("-", 1)[1]
+        local_model_path = ensure_model_file(model_url, save_dir, model_filename)
+        if local_model_path is None:
+            return None
+        try:
+            with feedback.spinner(f"Preparing TFLite model ({quantization})..."):
+                tflite_path = convert_to_tflite(local_model_path, quantization)
+                engine = TFLiteInferenceEngine(
+                    tflite_path, num_threads=num_threads, max_batch_size=max_batch_size, backend=backend,
+                    warmup_batch_sizes=warmup_batch_sizes
+                )
+            print(f"TFLite engine ready: {tflite_path} (threads {engine.num_threads}, warmup {engine.warmup_seconds:.2f}s)")
+            return engine
+        except Exception as e:
+            feedback.error(f"Error loading TFLite backend '{backend}': {e}")
+            return None
+
+    if backend != "keras":
+        feedback.error(f"Unknown inference backend '{backend}'. Use 'keras' or one of: {', '.join('tflite-' + q for q in TFLITE_QUANTIZATIONS)}.")
         return None
 
+    model = download_and_load_keras_model(model_url, save_dir, model_filename)
+    if model is None:
+        return None
+    try:
+        with feedback.spinner("Warming up model..."):
+            engine = KerasInferenceEngine(model, max_batch_size=max_batch_size, warmup_batch_sizes=warmup_batch_sizes)
+        print(f"Inference engine ready (warmup {engine.warmup_seconds:.2f}s, batch buckets {engine.buckets})")
+        return engine
+    except Exception as e:
+        print(f"Could not build inference engine, falling back to model.predict: {e}")
+        return model
+
+def load_worker_engine(backend: str, num_threads: int, max_batch_size: int | None = None, model_path: Path | None = None):
+    """
+    Loads the inference engine inside a worker process. TensorFlow is limited
+    to num_threads so several workers don't oversubscribe the CPU. model_path
+    overrides the cached download location. Raises RuntimeError if the engine
+    cannot be loaded.
+    """
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    save_dir, model_filename = (Path(model_path).parent, Path(model_path).name) if model_path else (CACHE_DIR, LOCAL_MODEL_FILENAME)
+    engine = load_inference_engine(
+        MODEL_DOWNLOAD_URL, save_dir, model_filename,
+        backend=backend, max_batch_size=max_batch_size, num_threads=num_threads,
+    )
+    if engine is None:
+        raise RuntimeError(f"Could not load the '{backend}' inference backend")
+    return engine
+
+class ModelLoader:
+    """
+    Runs a model-loading function on a background thread so callers can
+    render (or serve health checks) while the model downloads and warms up.
+    state is "idle", "loading", "ready" or "failed".
+    """
+
+    def __init__(self, load_fn, *args, **kwargs):
+        self._load_fn = load_fn
+        self._args = args
+        self._kwargs = kwargs
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self.state = "idle"
+        self.engine = None
+        self.error = None
+        self.load_seconds = None
+
+    def start(self):
+        with self._lock:
+            if self.state != "idle":
+                return self
+            self.state = "loading"
+        threading.Thread(target=self._run, name="model-loader", daemon=True).start()
+        return self
+
+    def _run(self):
+        start_time = time.time()
+        try:
+            self.engine = self._load_fn(*self._args, **self._kwargs)
+            if self.engine is None:
+                self.error = "model loading returned nothing; see the logs"
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Background model loading failed: {self.error}")
+        self.load_seconds = time.time() - start_time
+        self.state = "ready" if self.engine is not None else "failed"
+        self._done.set()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        """Starts loading if needed, blocks until finished, and returns the engine (None on failure or timeout)."""
+        self.start()
+        self._done.wait(timeout)
+        return self.engine
 
 # @st.cache_resource
 # def load_keras_model(model_path):
 #     if not Path(model_path).is_file():
-#         st.error(f"Model file not found at: {model_path}")
+#         feedback.error(f"Model file not found at: {model_path}")
 #         return None
 #     try:
 #         model = tf.keras.models.load_model(model_path)
 #         print(f"Model loaded successfully from {model_path}")
 #         return model
 #     except Exception as e:
-#         st.error(f"Error loading model: {e}")
+#         feedback.error(f"Error loading model: {e}")
 #         return None
 
+def resolve_prediction(prediction_probs, expected_class_names, confidence_threshold):
+    predicted_index = prediction_probs.argmax()
+    confidence = prediction_probs.max() * 100
+
+    if confidence >= confidence_threshold:
+        if predicted_index < len(expected_class_names):
+            predicted_class_key = expected_class_names[predicted_index]
+        else:
+            predicted_class_key = 'unknown'
+    else:
+        predicted_class_key = 'unknown'
+
+    return predicted_class_key, confidence
+
 def predict_image(model, img_batch, expected_class_names, confidence_threshold):
     if img_batch is not None:
         try:
-            predictions = model.predict(img_batch)
+            with metrics.timer("inference"):
+                predictions = model.predict(img_batch)
+            metrics.increment("images_classified", len(img_batch))
             prediction_probs = predictions[0]
-            
-            predicted_index = np.argmax(prediction_probs)
-            confidence = np.max(prediction_probs) * 100
-            
-            if confidence >= confidence_threshold:
-                if predicted_index < len(expected_class_names):
-                    predicted_class_key = expected_class_names[predicted_index]
-                else:
-                    predicted_class_key = 'unknown'
-            else:
-                predicted_class_key = 'unknown'
-                
+            predicted_class_key, confidence = resolve_prediction(
+                prediction_probs, expected_class_names, confidence_threshold
+            )
             return predicted_class_key, confidence, prediction_probs
         except Exception as e:
             print(f"Error during prediction: {e}")
             return 'unknown', 0, None
-    return 'unknown', 0, None
\ No newline at end of file
+    return 'unknown', 0, None
+
+def predict_batch(model, img_batch, expected_class_names, confidence_threshold):
+    """
+    Runs a whole (N, H, W, 3) batch through the model in a single call.
+    Returns one (class_key, confidence, probs) tuple per row, or None on failure.
+    """
+    if img_batch is None or len(img_batch) == 0:
+        return []
+    try:
+        with metrics.timer("inference"):
+            predictions = model.predict(img_batch, batch_size=len(img_batch), verbose=0)
+    except Exception as e:
+        print(f"Error during batch prediction: {e}")
+        return None
+    metrics.increment("images_classified", len(img_batch))
+
+    results = []
+    for prediction_probs in predictions:
+        predicted_class_key, confidence = resolve_prediction(
+            prediction_probs, expected_class_names, confidence_threshold
+        )
+        results.append((predicted_class_key, confidence, prediction_probs))
+    return results
+
+def model_fingerprint(model):
+    """
+    Stable identifier for a model's architecture and weights, used to key
+    cached predictions. Backends that already know their identity can expose
+    a `fingerprint` attribute instead.
+    """
+    fingerprint = getattr(model, 'fingerprint', None)
+    if fingerprint:
+        return fingerprint
+    import numpy as np
+    digest = hashlib.sha256()
+    digest.update(model.to_json().encode('utf-8'))
+    for weight in model.weights:
+        digest.update(np.ascontiguousarray(weight.numpy()).tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,219 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import cv2
+import numpy as np
+from utils import metrics
+
+HASH_METHODS = ("dhash", "phash")
+HASH_BITS = 64
+DEFAULT_MAX_DISTANCE = 4
+DEFAULT_MAX_ENTRIES = 4096
+
+def _gray(image):
+    array = np.asarray(image)
+    if array.ndim == 3:
+        array = cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+    return array
+
+def _pack_bits(bits):
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+def dhash(image):
+    """64-bit difference hash: whether each pixel of a 9x8 grayscale thumbnail is brighter than its right neighbour."""
+    small = cv2.resize(_gray(image), (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+def phash(image):
+    """64-bit perceptual hash: signs of the 8x8 lowest DCT frequencies of a 32x32 thumbnail against their median."""
+    small = cv2.resize(_gray(image), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    # The DC term only encodes overall brightness and would dominate the median.
+    return _pack_bits(low > np.median(low.ravel()[1:]))
+
+def perceptual_hash(image, method="dhash"):
+    """Hash of a PIL image or RGB/grayscale uint8 array; near-identical images differ in few bits."""
+    if method == "dhash":
+        return dhash(image)
+    if method == "phash":
+        return phash(image)
+    raise ValueError(f"Unknown hash method '{method}'. Use one of: {', '.join(HASH_METHODS)}.")
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+class NearDuplicateIndex:
+    """
+    Thread-safe LRU index from perceptual hashes to raw probability vectors.
+
+    lookup() returns the stored probabilities of the closest indexed image
+    within max_distance differing bits, so a re-photographed item, a
+    re-encoded copy or the next camera frame reuses an earlier result
+    instead of running the model. Like PredictionCache only probabilities
+    are stored and the caller applies the confidence threshold.
+
+    Lookups use multi-index hashing: the 64 bits are split into
+    max_distance + 1 chunks with one table each, and any hash within
+    max_distance agrees exactly with a query on at least one chunk, so only
+    those table buckets are compared instead of every entry.
+
+    With path set, load() restores a saved index and the index is saved
+    again after every save_every insertions (and on save()). Saved indexes
+    are tied to model_fingerprint and hash method and ignored if either
+    changed.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, max_entries=DEFAULT_MAX_ENTRIES, method="dhash",
+                 model_fingerprint="", path=None, save_every=64):
+        if method not in HASH_METHODS:
+            raise ValueError(f"Unknown hash method '{method}'. Use one of: {', '.join(HASH_METHODS)}.")
+        self.max_distance = max(0, max_distance)
+        self.max_entries = max(1, max_entries)
+        self.method = method
+        self.model_fingerprint = model_fingerprint
+        self.path = Path(path) if path else None
+        self.save_every = save_every
+        num_chunks = min(self.max_distance + 1, HASH_BITS)
+        bounds = [HASH_BITS * i // num_chunks for i in range(num_chunks + 1)]
+        self._chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._tables = [{} for _ in self._chunks]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self._hit_distance_total = 0
+
+    def hash(self, image):
+        return perceptual_hash(image, self.method)
+
+    def _chunk_keys(self, image_hash):
+        return [(image_hash >> shift) & mask for shift, mask in self._chunks]
+
+    def lookup(self, image_hash):
+        """Returns (probs, distance) of the nearest entry within max_distance, or None."""
+        with self._lock:
+            best = None
+            seen = set()
+            for table, key in zip(self._tables, self._chunk_keys(image_hash)):
+                for candidate in table.get(key, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = hamming_distance(candidate, image_hash)
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (candidate, distance)
+            if best is None:
+                self.misses += 1
+                metrics.increment("near_duplicate_misses")
+                return None
+            self._entries.move_to_end(best[0])
+            self.hits += 1
+            self._hit_distance_total += best[1]
+            metrics.increment("near_duplicate_hits")
+            return self._entries[best[0]], best[1]
+
+    def add(self, image_hash, probs):
+        probs = np.array(probs, dtype=np.float32)
+        probs.setflags(write=False)
+        with self._lock:
+            self._remember(image_hash, probs)
+            self._unsaved += 1
+            metrics.set_gauge("near_duplicate_index_entries", len(self._entries))
+            save = self.path is not None and self.save_every and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def _remember(self, image_hash, probs):
+        if image_hash not in self._entries:
+            for table, key in zip(self._tables, self._chunk_keys(image_hash)):
+                table.setdefault(key, set()).add(image_hash)
+        self._entries[image_hash] = probs
+        self._entries.move_to_end(image_hash)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            for table, key in zip(self._tables, self._chunk_keys(evicted)):
+                bucket = table[key]
+                bucket.discard(evicted)
+                if not bucket:
+                    del table[key]
+
+    def classify(self, image, predict_fn):
+        """
+        Returns (probs, reused) for an image: stored probabilities of a near
+        duplicate, or predict_fn() (which is then indexed if not None).
+        """
+        image_hash = self.hash(image)
+        match = self.lookup(image_hash)
+        if match is not None:
+            return match[0], True
+        probs = predict_fn()
+        if probs is not None:
+            self.add(image_hash, probs)
+        return probs, False
+
+    def save(self, path=None):
+        if not (path or self.path):
+            raise ValueError("No path to save the near-duplicate index to")
+        path = Path(path or self.path)
+        with self._lock:
+            hashes = np.array(list(self._entries), dtype=np.uint64)
+            probs = np.stack(list(self._entries.values())) if self._entries else np.empty((0, 0), dtype=np.float32)
+            self._unsaved = 0
+        tmp_path = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename so a crash never leaves a truncated index behind.
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, hashes=hashes, probs=probs, method=self.method, model_fingerprint=self.model_fingerprint)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error writing near-duplicate index {path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, path=None):
+        """Adds the entries of a saved index (oldest first) and returns how many were loaded."""
+        path = Path(path or self.path)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["method"]) != self.method or str(data["model_fingerprint"]) != self.model_fingerprint:
+                    print(f"Ignoring near-duplicate index {path}: built for another model or hash method")
+                    return 0
+                hashes, probs = data["hashes"], data["probs"]
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print(f"Ignoring unreadable near-duplicate index {path}: {e}")
+            return 0
+        with self._lock:
+            for image_hash, row in zip(hashes.tolist(), probs):
+                row.setflags(write=False)
+                self._remember(image_hash, row)
+            metrics.set_gauge("near_duplicate_index_entries", len(self._entries))
+        return len(hashes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for table in self._tables:
+                table.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "mean_hit_distance": self._hit_distance_total / self.hits if self.hits else 0.0,
+            }
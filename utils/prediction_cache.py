@@ -0,0 +1,180 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from utils import metrics
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_DISK_ENTRIES = 10000
+# Pruning the disk store removes this share of max_disk_entries at once, so it rescans rarely.
+DISK_PRUNE_FRACTION = 0.1
+
+def make_cache_key(image_bytes, model_fingerprint):
+    """Content address of an encoded image for a specific model."""
+    digest = hashlib.sha256()
+    digest.update(model_fingerprint.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache of raw probability vectors keyed by make_cache_key().
+
+    Only the probabilities are stored; the confidence threshold is applied by
+    the caller, so moving the threshold slider never invalidates an entry.
+    With cache_dir set, entries are also written to disk as .npy files and
+    survive restarts; memory misses fall back to the disk store. The disk
+    store keeps at most max_disk_entries files: when it grows past that,
+    the least recently used files (by modification time, which disk hits
+    refresh) are deleted.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, cache_dir=None, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._disk_entries = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_entries = sum(1 for _ in self._disk_files())
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.npy"
+
+    def _disk_files(self):
+        return self.cache_dir.glob("*/*.npy")
+
+    def get(self, key):
+        with self._lock:
+            probs = self._entries.get(key)
+            if probs is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.increment("prediction_cache_hits")
+                return probs
+
+        probs = self._load_from_disk(key)
+        with self._lock:
+            if probs is None:
+                self.misses += 1
+                metrics.increment("prediction_cache_misses")
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, probs)
+        metrics.increment("prediction_cache_hits")
+        metrics.increment("prediction_cache_disk_hits")
+        return probs
+
+    def put(self, key, probs):
+        probs = np.array(probs, dtype=np.float32)
+        probs.setflags(write=False)
+        with self._lock:
+            self._remember(key, probs)
+        self._save_to_disk(key, probs)
+
+    def get_or_compute(self, key, compute_fn):
+        """Returns cached probabilities, or calls compute_fn() and stores a non-None result."""
+        probs = self.get(key)
+        if probs is None:
+            probs = compute_fn()
+            if probs is not None:
+                self.put(key, probs)
+        return probs
+
+    def _remember(self, key, probs):
+        self._entries[key] = probs
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            probs = np.load(path, allow_pickle=False)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ignoring unreadable prediction cache entry {path}: {e}")
+            return None
+        try:
+            os.utime(path)  # marks the entry as recently used for _prune_disk
+        except OSError:
+            pass
+        probs.setflags(write=False)
+        return probs
+
+    def _save_to_disk(self, key, probs):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename so concurrent readers never see a partial file.
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, probs, allow_pickle=False)
+            is_new = not path.exists()
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error writing prediction cache entry {path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        if is_new:
+            with self._disk_lock:
+                self._disk_entries += 1
+                if self._disk_entries > self.max_disk_entries:
+                    self._prune_disk()
+
+    def _prune_disk(self):
+        """Deletes the least recently used disk entries down to (1 - DISK_PRUNE_FRACTION) * max_disk_entries."""
+        entries = []
+        for path in self._disk_files():
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        keep = int(self.max_disk_entries * (1 - DISK_PRUNE_FRACTION))
+        removed = 0
+        for _, path in entries[:max(0, len(entries) - keep)]:
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error removing prediction cache entry {path}: {e}")
+        self._disk_entries = len(entries) - removed
+        metrics.increment("prediction_cache_disk_evictions", removed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_entries": self._disk_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+# Scale into [0, 1] exactly like the original img_to_array(...) / 255.0 path.
+_SCALE = np.float32(255.0)
+
+class ImageTooLarge(ValueError):
+    pass
+
+def allocate_batch(batch_size, target_size):
+    """Returns an uninitialised float32 (N, H, W, 3) buffer for target_size=(width, height)."""
+    return np.empty((batch_size, target_size[1], target_size[0], 3), dtype=np.float32)
+
+def open_image(fp, target_size=None, max_pixels=None):
+    """
+    Opens an image file or file-like object as RGB.
+
+    For JPEGs, target_size=(width, height) enables draft mode: libjpeg decodes
+    at the smallest 1/2, 1/4 or 1/8 scale that is still at least target_size,
+    so a 12 MP photo is decoded at roughly 500x375 instead of full resolution.
+    Images with more than max_pixels pixels raise ImageTooLarge before any
+    pixel data is decoded.
+    """
+    img = Image.open(fp)
+    if max_pixels is not None and img.width * img.height > max_pixels:
+        raise ImageTooLarge(f"image is {img.width}x{img.height}, more than {max_pixels} pixels")
+    if target_size is not None and img.format == 'JPEG':
+        img.draft('RGB', target_size)
+    return img.convert('RGB')
+
+def _resize_array(img_array, target_size):
+    height, width = img_array.shape[:2]
+    if width >= target_size[0] and height >= target_size[1]:
+        interpolation = cv2.INTER_AREA
+    else:
+        interpolation = cv2.INTER_LANCZOS4
+    return cv2.resize(img_array, target_size, interpolation=interpolation)
+
+def resize_to_uint8(image, target_size, bgr=False):
+    """
+    Resizes a PIL image or an HxWx3 uint8 ndarray to an RGB uint8 array.
+
+    PIL images keep the LANCZOS filter used by the original path. Arrays (video
+    frames) are resized with OpenCV, and BGR frames are converted to RGB after
+    the resize, so the color conversion only touches target_size pixels.
+    """
+    if isinstance(image, Image.Image):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.size != tuple(target_size):
+            image = image.resize(target_size, Image.Resampling.LANCZOS)
+        return np.asarray(image)
+
+    img_array = np.asarray(image)
+    if img_array.ndim == 2:
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_GRAY2RGB)
+    elif img_array.shape[2] == 4:
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_BGRA2BGR if bgr else cv2.COLOR_RGBA2RGB)
+    if img_array.dtype != np.uint8:
+        raise ValueError(f"Expected a uint8 image array, got {img_array.dtype}")
+    if img_array.shape[1] != target_size[0] or img_array.shape[0] != target_size[1]:
+        img_array = _resize_array(img_array, target_size)
+    if bgr:
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
+    return img_array
+
+def preprocess_into(image, target_size, out, bgr=False):
+    """
+    Resizes and scales one image into out, a float32 (H, W, 3) view such as
+    batch[i] of a buffer from allocate_batch. No intermediate float arrays are
+    allocated.
+    """
+    np.divide(resize_to_uint8(image, target_size, bgr=bgr), _SCALE, out=out, casting='unsafe')
+    return out
+
+def preprocess_batch(images, target_size, out=None, bgr=False):
+    """Preprocesses a sequence of images into out (allocated if None) and returns it."""
+    if out is None:
+        out = allocate_batch(len(images), target_size)
+    for i, image in enumerate(images):
+        preprocess_into(image, target_size, out[i], bgr=bgr)
+    return out
@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+from collections import Counter, deque
+
+# Mean absolute difference of the grayscale thumbnails, as a fraction of the
+# full 0-255 range (pixel method), or Bhattacharyya distance between their
+# histograms (histogram method), above which a frame counts as a new scene.
+DEFAULT_SCENE_THRESHOLD = 0.06
+DEFAULT_MAX_GAP_SECS = 5.0
+SCENE_CHANGE_METHODS = ("pixel", "histogram")
+THUMBNAIL_SIZE = (64, 36)
+
+class SceneChangeDetector:
+    """
+    Decides whether a video frame differs enough from the last frame the
+    model saw to be worth classifying again.
+
+    Frames are reduced to a 64x36 grayscale thumbnail (about 0.1 ms for a 1080p
+    frame) and compared with the thumbnail of the last accepted frame, not the
+    previous frame, so slow drift still adds up to a change. "pixel" compares
+    thumbnails directly and reacts to objects moving or appearing; "histogram"
+    compares intensity histograms and mostly ignores motion within a scene.
+    """
+
+    def __init__(self, threshold=DEFAULT_SCENE_THRESHOLD, method="pixel", thumbnail_size=THUMBNAIL_SIZE):
+        if method not in SCENE_CHANGE_METHODS:
+            raise ValueError(f"Unknown scene change method '{method}'. Use one of: {', '.join(SCENE_CHANGE_METHODS)}.")
+        self.threshold = threshold
+        self.method = method
+        self.thumbnail_size = thumbnail_size
+        self.reset()
+
+    def reset(self):
+        self._reference = None
+
+    def _signature(self, frame):
+        height, width = frame.shape[:2]
+        # Strided view first, so INTER_AREA averages a few thousand pixels instead of millions.
+        step = max(1, min(width // self.thumbnail_size[0], height // self.thumbnail_size[1]) // 2)
+        small = cv2.resize(frame[::step, ::step], self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.method == "histogram":
+            hist = cv2.calcHist([small], [0], None, [32], [0, 256])
+            return cv2.normalize(hist, hist)
+        return small
+
+    def score(self, signature):
+        if self._reference is None:
+            return 1.0
+        if self.method == "histogram":
+            return float(cv2.compareHist(self._reference, signature, cv2.HISTCMP_BHATTACHARYYA))
+        return float(np.mean(cv2.absdiff(self._reference, signature))) / 255.0
+
+    def check(self, frame, force=False):
+        """Returns True (and makes frame the new reference) if frame is a scene change or force is set."""
+        signature = self._signature(frame)
+        if force or self.score(signature) >= self.threshold:
+            self._reference = signature
+            return True
+        return False
+
+def smooth_rows(rows, window, class_info_dict):
+    """
+    Majority vote of "Class Key" over a centred window of `window` rows.
+
+    Works on any iterable of result rows and yields them lazily, holding back
+    window // 2 rows, so it can be chained onto a streaming pipeline. Ties
+    keep the row's own class; confidence is left unchanged.
+    """
+    if window <= 1:
+        yield from rows
+        return
+    half = window // 2
+    buffer = deque(maxlen=window)
+
+    def smoothed(position):
+        row = buffer[position]
+        votes = Counter(r["Class Key"] for r in buffer)
+        top_key, top_count = votes.most_common(1)[0]
+        if top_key != row["Class Key"] and top_count > votes[row["Class Key"]]:
+            row = dict(row, **{"Class Key": top_key, "Predicted Class": class_info_dict[top_key]['display_name']})
+        return row
+
+    count = 0
+    next_index = 0  # index (in the whole stream) of the next row to yield
+    for row in rows:
+        buffer.append(row)
+        count += 1
+        if count - next_index > half:
+            yield smoothed(next_index - (count - len(buffer)))
+            next_index += 1
+    while next_index < count:
+        yield smoothed(next_index - (count - len(buffer)))
+        next_index += 1
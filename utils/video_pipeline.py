@@ -0,0 +1,303 @@
+import cv2
+import queue
+import threading
+import time
+from utils import metrics
+from utils.model import predict_batch
+from utils.preprocessing import allocate_batch, preprocess_into, resize_to_uint8
+from utils.scene_change import DEFAULT_MAX_GAP_SECS, smooth_rows
+
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_PREPROCESS_WORKERS = 2
+# Frames waiting for preprocessing / inference, per stage. Keeps memory bounded
+# (decoded 1080p frames are ~6 MB each) and makes the decoder block when the
+# model falls behind.
+DEFAULT_QUEUE_SIZE = 32
+
+_END = object()
+# Stands in for a frame the change detector judged unchanged; its row repeats the last result.
+_CARRY = object()
+# Carried-forward rows waiting behind a partly filled batch before it is run anyway.
+MAX_PENDING_ROWS_FACTOR = 4
+
+class PipelineError(RuntimeError):
+    pass
+
+class VideoOpenError(IOError):
+    pass
+
+class VideoAnalysisPipeline:
+    """
+    Decodes, preprocesses and classifies video frames on separate threads.
+
+    One thread decodes (grab() for skipped frames, read() for sampled ones),
+    a small pool converts and preprocesses frames, and the thread iterating
+    over the results runs batched inference. Stages are connected with bounded
+    queues, so a slow stage applies backpressure to the ones before it.
+    Results are yielded in frame order. Has no Streamlit dependency; pass a
+    progress_callback(frame_count, total_frames, processed_count) to observe
+    progress.
+
+    With a change_detector (utils.scene_change.SceneChangeDetector) sampling
+    is adaptive: every frame_interval_secs a frame is checked, but it only
+    reaches the model when the scene changed or max_gap_secs passed since the
+    last classified frame; other checked frames repeat the previous result.
+    smoothing_window > 1 applies a majority vote over that many rows.
+    With include_probs, rows also carry the model's probability vector under
+    "Probabilities" (carried-forward rows repeat it).
+    After a run, stats holds the number of rows, model-classified frames and
+    carried-forward rows. start_frame / end_frame restrict a run to a frame
+    range (see utils.video_sharding); frames are still sampled at multiples
+    of the frame skip, so ranges partition the rows of a full run.
+    """
+
+    def __init__(self, model, target_size, class_info_dict, expected_class_names, confidence_threshold,
+                 batch_size=DEFAULT_BATCH_SIZE, num_preprocess_workers=DEFAULT_PREPROCESS_WORKERS,
+                 queue_size=DEFAULT_QUEUE_SIZE, change_detector=None, max_gap_secs=DEFAULT_MAX_GAP_SECS,
+                 smoothing_window=1, include_probs=False):
+        self.model = model
+        self.target_size = target_size
+        self.class_info_dict = class_info_dict
+        self.expected_class_names = expected_class_names
+        self.confidence_threshold = confidence_threshold
+        self.batch_size = max(1, batch_size)
+        self.num_preprocess_workers = max(1, num_preprocess_workers)
+        self.queue_size = max(1, queue_size)
+        self.change_detector = change_detector
+        self.max_gap_secs = max_gap_secs
+        self.smoothing_window = smoothing_window
+        self.include_probs = include_probs
+        self.stats = {"rows": 0, "inferred": 0, "carried": 0}
+
+    def run(self, video_path, frame_interval_secs, progress_callback=None):
+        start_time = time.time()
+        results = list(self.iter_results(video_path, frame_interval_secs, progress_callback))
+        return results, time.time() - start_time
+
+    def iter_results(self, video_path, frame_interval_secs, progress_callback=None, start_frame=0, end_frame=None):
+        rows = self._iter_rows(video_path, frame_interval_secs, progress_callback, start_frame, end_frame)
+        try:
+            yield from smooth_rows(rows, self.smoothing_window, self.class_info_dict)
+        finally:
+            rows.close()
+
+    def _iter_rows(self, video_path, frame_interval_secs, progress_callback, start_frame=0, end_frame=None):
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            cap.release()
+            raise VideoOpenError(f"Could not open video file: {video_path}")
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if end_frame is not None:
+            total_frames = min(total_frames, end_frame) if total_frames > 0 else end_frame
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start_frame:
+                # The backend cannot seek to an exact frame; grab up to it instead.
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                for _ in range(start_frame):
+                    if not cap.grab():
+                        break
+        frame_skip = int(fps * frame_interval_secs)
+        if frame_skip < 1: frame_skip = 1
+        change_detector = self.change_detector
+        if change_detector is not None:
+            change_detector.reset()
+            max_gap_frames = max(frame_skip, int(fps * self.max_gap_secs))
+        self.stats = {"rows": 0, "inferred": 0, "carried": 0}
+
+        print(f"Video Info: FPS={fps:.2f}, Total Frames={total_frames}, Frame Skip={frame_skip} (Interval: {frame_interval_secs}s), Batch Size={self.batch_size}")
+
+        stop_event = threading.Event()
+        errors = []
+        frame_queue = queue.Queue(maxsize=self.queue_size)
+        preprocessed_queue = queue.Queue(maxsize=self.queue_size)
+
+        def put(q, item):
+            # Blocking put that gives up once the pipeline is shutting down.
+            while not stop_event.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def decode():
+            frame_count = start_frame
+            seq = 0
+            last_inferred = None
+            try:
+                # Decode time of a sampled frame includes grabbing the skipped frames before it,
+                # but not the time spent blocked on a full queue.
+                decode_start = time.perf_counter()
+                while not stop_event.is_set():
+                    if end_frame is not None and frame_count >= end_frame:
+                        break
+                    if frame_count % frame_skip != 0:
+                        if not cap.grab():
+                            break
+                        frame_count += 1
+                        continue
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    metrics.observe("video_decode", time.perf_counter() - decode_start)
+                    if change_detector is not None:
+                        force = last_inferred is None or frame_count - last_inferred >= max_gap_frames
+                        if change_detector.check(frame, force):
+                            last_inferred = frame_count
+                        else:
+                            frame = _CARRY
+                    if not put(frame_queue, (seq, frame_count, frame)):
+                        return
+                    seq += 1
+                    frame_count += 1
+                    decode_start = time.perf_counter()
+            except Exception as e:
+                errors.append(e)
+                stop_event.set()
+            finally:
+                cap.release()
+                for _ in range(self.num_preprocess_workers):
+                    put(frame_queue, _END)
+
+        def preprocess():
+            try:
+                while not stop_event.is_set():
+                    try:
+                        item = frame_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if item is _END:
+                        break
+                    seq, frame_index, frame = item
+                    if frame is _CARRY:
+                        if not put(preprocessed_queue, item):
+                            return
+                        continue
+                    img_array = None
+                    try:
+                        # Workers hand over small uint8 frames; scaling to float32
+                        # happens directly in the consumer's batch buffer.
+                        with metrics.timer("video_preprocess"):
+                            img_array = resize_to_uint8(frame, self.target_size, bgr=True)
+                    except Exception as e:
+                        print(f"Error processing frame {frame_index}: {e}")
+                    # Failed frames are still forwarded so the reorder step never waits for them.
+                    if not put(preprocessed_queue, (seq, frame_index, img_array)):
+                        return
+            except Exception as e:
+                errors.append(e)
+                stop_event.set()
+            finally:
+                put(preprocessed_queue, _END)
+
+        threads = [threading.Thread(target=decode, name="video-decode", daemon=True)]
+        threads += [
+            threading.Thread(target=preprocess, name=f"video-preprocess-{i}", daemon=True)
+            for i in range(self.num_preprocess_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        batch_buffer = allocate_batch(self.batch_size, self.target_size)
+        batch_frame_indices = []
+        # Rows waiting for the current batch, in frame order: (frame_index, classified_here).
+        batch_rows = []
+        last_result = None
+        pending = {}
+        next_seq = 0
+        finished_workers = 0
+        processed_frame_count = 0
+        last_frame_index = 0
+
+        def make_row(frame_index, predicted_class_key, confidence, prediction_probs):
+            row = {
+                "Frame": frame_index,
+                "Timestamp (s)": round(frame_index / fps, 2),
+                "Predicted Class": self.class_info_dict[predicted_class_key]['display_name'],
+                "Confidence (%)": round(confidence, 2),
+                "Class Key": predicted_class_key
+            }
+            if self.include_probs:
+                row["Probabilities"] = prediction_probs
+            return row
+
+        def run_batch():
+            nonlocal last_result
+            predictions = None
+            if batch_frame_indices:
+                predictions = predict_batch(
+                    self.model, batch_buffer[:len(batch_frame_indices)], self.expected_class_names, self.confidence_threshold
+                )
+                if predictions is None:
+                    print(f"Error processing frames {batch_frame_indices[0]}-{batch_frame_indices[-1]}: batch prediction failed")
+                else:
+                    self.stats["inferred"] += len(predictions)
+            rows = []
+            predictions = iter(predictions or ())
+            for frame_index, classified_here in batch_rows:
+                if classified_here:
+                    prediction = next(predictions, None)
+                    # A failed batch drops its rows and the carried-forward rows that depend on them.
+                    last_result = prediction
+                elif last_result is not None:
+                    self.stats["carried"] += 1
+                if last_result is not None:
+                    rows.append(make_row(frame_index, *last_result))
+            batch_frame_indices.clear()
+            batch_rows.clear()
+            self.stats["rows"] += len(rows)
+            return rows
+
+        try:
+            while finished_workers < self.num_preprocess_workers:
+                if errors:
+                    break
+                try:
+                    item = preprocessed_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _END:
+                    finished_workers += 1
+                    continue
+                pending[item[0]] = item
+
+                # Workers finish out of order; only consume the contiguous prefix.
+                while next_seq in pending:
+                    _, frame_index, img_array = pending.pop(next_seq)
+                    next_seq += 1
+                    last_frame_index = frame_index
+                    if img_array is None:
+                        continue
+                    if img_array is _CARRY:
+                        batch_rows.append((frame_index, False))
+                    else:
+                        preprocess_into(img_array, self.target_size, batch_buffer[len(batch_frame_indices)])
+                        batch_frame_indices.append(frame_index)
+                        batch_rows.append((frame_index, True))
+                    # Carried rows only wait for a batch that holds the frame they repeat.
+                    if (len(batch_frame_indices) == self.batch_size or not batch_frame_indices
+                            or len(batch_rows) >= MAX_PENDING_ROWS_FACTOR * self.batch_size):
+                        rows = run_batch()
+                        processed_frame_count += len(rows)
+                        if progress_callback:
+                            progress_callback(last_frame_index + 1, total_frames, processed_frame_count)
+                        yield from rows
+
+            if errors:
+                raise PipelineError(f"Video pipeline failed: {errors[0]}") from errors[0]
+
+            if batch_rows:
+                rows = run_batch()
+                processed_frame_count += len(rows)
+                yield from rows
+            if progress_callback:
+                progress_callback(total_frames if total_frames > 0 else last_frame_index + 1, total_frames, processed_frame_count)
+        finally:
+            # Also reached when the caller stops iterating early or inference raises.
+            stop_event.set()
+            for thread in threads:
+                thread.join()
@@ -1,68 +1,123 @@
-import cv2
+import os
+import tempfile
 import time
-import numpy as np
-import pandas as pd
-from PIL import Image
-import streamlit as st
-from utils.model import predict_image
-from utils.image_processing import preprocess_image
+from contextlib import contextmanager
+from utils import feedback
+from utils.scene_change import DEFAULT_MAX_GAP_SECS
+from utils.video_pipeline import VideoAnalysisPipeline, VideoOpenError, DEFAULT_BATCH_SIZE, DEFAULT_PREPROCESS_WORKERS
+from utils.video_results import estimate_row_count, VideoResultStore, DEFAULT_CAPACITY
 
-def process_video_frames(video_path, frame_interval_secs, model, target_size, class_info_dict, expected_class_names, confidence_threshold, progress_bar):
-    results = []
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        st.error("Error: Could not open video file.")
-        return None
-
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    frame_skip = int(fps * frame_interval_secs)
-    if frame_skip < 1: frame_skip = 1
+# Bytes copied per read when spooling an upload to disk.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Minimum seconds between progress bar redraws; each one is a message to the browser.
+PROGRESS_MIN_INTERVAL_SECS = 0.25
 
-    print(f"Video Info: FPS={fps:.2f}, Total Frames={total_frames}, Frame Skip={frame_skip} (Interval: {frame_interval_secs}s)")
+class UploadTooLarge(ValueError):
+    pass
 
-    frame_count = 0
-    processed_frame_count = 0
-    start_time = time.time()
+@contextmanager
+def spooled_upload(fileobj, suffix="", max_bytes=None, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Copies a file-like upload to a temporary file chunk by chunk and yields
+    its path. Only one chunk is held in memory at a time, and the file is
+    removed when the block exits, also on errors and Streamlit reruns.
+    Raises UploadTooLarge if the upload is larger than max_bytes.
+    """
+    size = getattr(fileobj, "size", None)
+    if max_bytes is not None and size is not None and size > max_bytes:
+        raise UploadTooLarge(f"Upload is {size / 1e6:.0f} MB; the limit is {max_bytes / 1e6:.0f} MB.")
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="video-upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            fileobj.seek(0)
+            copied = 0
+            while chunk := fileobj.read(chunk_size):
+                copied += len(chunk)
+                if max_bytes is not None and copied > max_bytes:
+                    raise UploadTooLarge(f"Upload is larger than the {max_bytes / 1e6:.0f} MB limit.")
+                out.write(chunk)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+            print(f"Temporary video file deleted: {path}")
+        except FileNotFoundError:
+            pass
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+def progress_bar_callback(progress_bar, min_interval_secs=PROGRESS_MIN_INTERVAL_SECS):
+    last_update = 0.0
 
-        if frame_count % frame_skip == 0:
-            try:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img_pil = Image.fromarray(frame_rgb)
+    def update(frame_count, total_frames, processed_frame_count):
+        nonlocal last_update
+        now = time.monotonic()
+        if now - last_update < min_interval_secs and not (total_frames > 0 and frame_count >= total_frames):
+            return
+        last_update = now
+        if total_frames > 0:
+            progress_bar.progress(min(1.0, frame_count / total_frames), text=f"Processing Video: Frame {frame_count}/{total_frames}")
+        else:
+            progress_bar.progress(processed_frame_count % 100 / 100.0, text=f"Processing Video: Frame {frame_count}")
+    return update
 
-                img_batch = preprocess_image(img_pil, target_size)
-                if img_batch is not None:
-                    predicted_class_key, confidence, _ = predict_image(
-                        model, img_batch, expected_class_names, confidence_threshold
-                    )
+def analyze_video(video_path, frame_interval_secs, model, target_size, class_info_dict, expected_class_names, confidence_threshold, progress_callback=None, batch_size=DEFAULT_BATCH_SIZE, num_preprocess_workers=DEFAULT_PREPROCESS_WORKERS,
+                  change_detector=None, max_gap_secs=DEFAULT_MAX_GAP_SECS, smoothing_window=1, num_workers=0, include_probs=False):
+    """
+    Starts classifying sampled frames of a video and returns (analyzer, rows).
+    rows is a generator of result rows in frame order, produced while the
+    video is decoded; analyzer.stats is complete once it is exhausted. Raises
+    VideoOpenError (an IOError) on the first next() if the video cannot be
+    opened.
 
-                    timestamp = frame_count / fps
-                    results.append({
-                        "Frame": frame_count,
-                        "Timestamp (s)": round(timestamp, 2),
-                        "Predicted Class": class_info_dict[predicted_class_key]['display_name'],
-                        "Confidence (%)": round(confidence, 2),
-                        "Class Key": predicted_class_key
-                    })
-                    processed_frame_count += 1
+    With num_workers > 0 the video is split into frame ranges classified by
+    that many worker processes (see utils.video_sharding); the workers load
+    their own copy of the model with the same backend as model.
+    include_probs adds each row's probability vector (see VideoAnalysisPipeline).
+    """
+    if num_workers > 0:
+        from utils.model import INFERENCE_BACKEND
+        from utils.video_sharding import get_sharded_analyzer
+        analyzer = get_sharded_analyzer(num_workers, getattr(model, "backend", INFERENCE_BACKEND), batch_size)
+        rows = analyzer.iter_results(
+            video_path, frame_interval_secs, target_size, class_info_dict, expected_class_names, confidence_threshold,
+            progress_callback, change_detector=change_detector, max_gap_secs=max_gap_secs,
+            smoothing_window=smoothing_window, include_probs=include_probs
+        )
+    else:
+        analyzer = VideoAnalysisPipeline(
+            model, target_size, class_info_dict, expected_class_names, confidence_threshold,
+            batch_size=batch_size, num_preprocess_workers=num_preprocess_workers,
+            change_detector=change_detector, max_gap_secs=max_gap_secs, smoothing_window=smoothing_window,
+            include_probs=include_probs
+        )
+        rows = analyzer.iter_results(video_path, frame_interval_secs, progress_callback)
+    return analyzer, rows
 
-            except Exception as e:
-                print(f"Error processing frame {frame_count}: {e}")
+def log_video_summary(analyzer, result_count, processing_time, adaptive=False):
+    print(f"Video processing finished. Processed {result_count} frames in {processing_time:.2f} seconds.")
+    if adaptive:
+        print(f"Adaptive sampling: model ran on {analyzer.stats['inferred']} frames, {analyzer.stats['carried']} results carried forward.")
 
-        frame_count += 1
-        if total_frames > 0:
-            progress_bar.progress(frame_count / total_frames, text=f"Processing Video: Frame {frame_count}/{total_frames}")
-        else:
-             progress_bar.progress(processed_frame_count % 100 / 100.0, text=f"Processing Video: Frame {frame_count}")
+def process_video_frames(video_path, frame_interval_secs, model, target_size, class_info_dict, expected_class_names, confidence_threshold, progress_bar, batch_size=DEFAULT_BATCH_SIZE, num_preprocess_workers=DEFAULT_PREPROCESS_WORKERS,
+                         change_detector=None, max_gap_secs=DEFAULT_MAX_GAP_SECS, smoothing_window=1, num_workers=0):
+    """
+    Classifies sampled frames of a video and returns (results, processing_time),
+    where results is a VideoResultStore; see analyze_video.
+    """
+    start_time = time.time()
+    results = VideoResultStore(class_info_dict, capacity=estimate_row_count(video_path, frame_interval_secs) or DEFAULT_CAPACITY)
+    try:
+        analyzer, rows = analyze_video(
+            video_path, frame_interval_secs, model, target_size, class_info_dict, expected_class_names, confidence_threshold,
+            progress_bar_callback(progress_bar), batch_size=batch_size, num_preprocess_workers=num_preprocess_workers,
+            change_detector=change_detector, max_gap_secs=max_gap_secs, smoothing_window=smoothing_window,
+            num_workers=num_workers
+        )
+        results.extend(rows)
+    except VideoOpenError:
+        feedback.error("Error: Could not open video file.")
+        return None
+    processing_time = time.time() - start_time
 
-    cap.release()
-    end_time = time.time()
-    processing_time = end_time - start_time
-    print(f"Video processing finished. Processed {processed_frame_count} frames in {processing_time:.2f} seconds.")
+    log_video_summary(analyzer, len(results), processing_time, adaptive=change_detector is not None)
     progress_bar.empty()
-    return results, processing_time
\ No newline at end of file
+    return results, processing_time
@@ -0,0 +1,199 @@
+import numpy as np
+
+DEFAULT_CAPACITY = 1024
+FRAME_COLUMNS = ("Frame", "Timestamp (s)", "Predicted Class", "Confidence (%)", "Class Key")
+SEGMENT_COLUMNS = ("Start (s)", "End (s)", "Start Frame", "End Frame", "Predicted Class", "Frames",
+                   "Mean Confidence (%)", "Class Key")
+
+def parquet_available():
+    """Whether pandas has a Parquet engine (pyarrow or fastparquet) to write with."""
+    from importlib.util import find_spec
+    return any(find_spec(name) is not None for name in ("pyarrow", "fastparquet"))
+
+def export_files(store):
+    """
+    Download files of a finished analysis as (label, file_name, data, mime)
+    tuples: segments and frames as CSV, and frames as Parquet if an engine is
+    installed. Build them once per analysis; they cost a pass over every row.
+    """
+    files = [
+        ("Segments (CSV)", "video_segments.csv", store.to_csv(segments=True), "text/csv"),
+        ("Frames (CSV)", "video_frames.csv", store.to_csv(), "text/csv"),
+    ]
+    if parquet_available():
+        files.append(("Frames (Parquet)", "video_frames.parquet", store.to_parquet(), "application/octet-stream"))
+    return files
+
+def estimate_row_count(video_path, frame_interval_secs):
+    """Rows a full run of a video yields at most, from its header; 0 if the frame count is unknown."""
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+    if total_frames <= 0:
+        return 0
+    frame_skip = max(1, int(fps * frame_interval_secs))
+    return -(-total_frames // frame_skip)
+
+class VideoResultStore:
+    """
+    Per-frame video results in NumPy columns instead of a list of dicts.
+
+    Each row takes the frame index, timestamp, class index (into the keys
+    of class_info_dict) and confidence, 22 bytes in total, plus the
+    probability vector when prob_class_names is given. Columns are
+    preallocated for capacity rows and doubled when full, so pass the
+    expected row count (see estimate_row_count) to avoid copies.
+
+    segments() run-length encodes the rows into runs of the same class, and
+    to_frame / to_csv / to_parquet build DataFrames straight from the
+    columns.
+    """
+
+    def __init__(self, class_info_dict, capacity=DEFAULT_CAPACITY, prob_class_names=None):
+        self.class_info_dict = class_info_dict
+        self.class_keys = list(class_info_dict)
+        self._class_indices = {key: i for i, key in enumerate(self.class_keys)}
+        self.prob_class_names = list(prob_class_names) if prob_class_names is not None else None
+        self._size = 0
+        capacity = max(1, capacity)
+        self._columns = {
+            "frames": np.empty(capacity, dtype=np.int64),
+            "timestamps": np.empty(capacity, dtype=np.float64),
+            "class_indices": np.empty(capacity, dtype=np.int16),
+            "confidences": np.empty(capacity, dtype=np.float32),
+        }
+        if self.prob_class_names is not None:
+            self._columns["probs"] = np.empty((capacity, len(self.prob_class_names)), dtype=np.float32)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._columns["frames"])
+
+    @property
+    def frames(self):
+        return self._columns["frames"][:self._size]
+
+    @property
+    def timestamps(self):
+        return self._columns["timestamps"][:self._size]
+
+    @property
+    def class_indices(self):
+        return self._columns["class_indices"][:self._size]
+
+    @property
+    def confidences(self):
+        return self._columns["confidences"][:self._size]
+
+    @property
+    def probs(self):
+        """(rows, classes) probability matrix, or None if the store was created without prob_class_names."""
+        probs = self._columns.get("probs")
+        return probs[:self._size] if probs is not None else None
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        for name, column in self._columns.items():
+            grown = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def append(self, frame_index, timestamp, class_key, confidence, probs=None):
+        if self._size == self.capacity:
+            self._grow()
+        i = self._size
+        self._columns["frames"][i] = frame_index
+        self._columns["timestamps"][i] = timestamp
+        self._columns["class_indices"][i] = self._class_indices[class_key]
+        self._columns["confidences"][i] = confidence
+        if "probs" in self._columns:
+            if probs is None:
+                self._columns["probs"][i] = np.nan
+            else:
+                self._columns["probs"][i] = probs
+        self._size += 1
+
+    def append_row(self, row):
+        """Appends a result row of VideoAnalysisPipeline; the row itself is not kept."""
+        self.append(row["Frame"], row["Timestamp (s)"], row["Class Key"], row["Confidence (%)"], row.get("Probabilities"))
+
+    def extend(self, rows):
+        for row in rows:
+            self.append_row(row)
+        return self
+
+    def class_counts(self):
+        """Rows per class key, for classes that occur."""
+        counts = np.bincount(self.class_indices, minlength=len(self.class_keys))
+        return {self.class_keys[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+    def most_frequent(self, exclude=("unknown",)):
+        """(class_key, rows) of the most frequent class not in exclude, or None."""
+        counts = {key: count for key, count in self.class_counts().items() if key not in exclude}
+        if not counts:
+            return None
+        return max(counts.items(), key=lambda item: item[1])
+
+    def segments(self):
+        """
+        Runs of consecutive rows with the same class, as a dict of arrays:
+        start/end frame and timestamp of the first and last row of each run,
+        class_indices, frames (rows in the run) and mean_confidence.
+        """
+        class_indices = self.class_indices
+        changes = np.flatnonzero(class_indices[1:] != class_indices[:-1]) + 1
+        starts = np.r_[0, changes] if self._size else changes
+        ends = np.r_[changes, self._size] if self._size else changes
+        counts = ends - starts
+        totals = np.add.reduceat(self.confidences.astype(np.float64), starts) if self._size else np.empty(0)
+        return {
+            "start_frame": self.frames[starts],
+            "end_frame": self.frames[ends - 1],
+            "start_time": self.timestamps[starts],
+            "end_time": self.timestamps[ends - 1],
+            "class_indices": class_indices[starts],
+            "frames": counts,
+            "mean_confidence": totals / np.maximum(counts, 1),
+        }
+
+    def _class_columns(self, class_indices):
+        keys = np.array(self.class_keys, dtype=object)
+        names = np.array([self.class_info_dict[key]['display_name'] for key in self.class_keys], dtype=object)
+        return names[class_indices], keys[class_indices]
+
+    def to_frame(self, segments=False, limit=None):
+        """
+        DataFrame of the rows (FRAME_COLUMNS plus one P(class) column per
+        probability), or of segments(). limit keeps only the first rows.
+        """
+        import pandas as pd
+        if segments:
+            runs = self.segments()
+            names, keys = self._class_columns(runs["class_indices"])
+            columns = (runs["start_time"], runs["end_time"], runs["start_frame"], runs["end_frame"], names,
+                       runs["frames"], runs["mean_confidence"].round(2), keys)
+            return pd.DataFrame(dict(zip(SEGMENT_COLUMNS, columns)))[:limit]
+        rows = slice(0, limit)
+        names, keys = self._class_columns(self.class_indices[rows])
+        columns = (self.frames[rows], self.timestamps[rows], names, self.confidences[rows].astype(np.float64).round(2), keys)
+        frame = pd.DataFrame(dict(zip(FRAME_COLUMNS, columns)))
+        if self.prob_class_names is not None:
+            probs = self.probs[rows]
+            for i, name in enumerate(self.prob_class_names):
+                frame[f"P({name})"] = probs[:, i]
+        return frame
+
+    def to_csv(self, path_or_buf=None, segments=False):
+        """Writes rows or segments as CSV; returns the CSV text when path_or_buf is None."""
+        return self.to_frame(segments).to_csv(path_or_buf, index=False, float_format="%.6g")
+
+    def to_parquet(self, path=None, segments=False):
+        """Writes rows or segments as Parquet (see parquet_available); returns the bytes when path is None."""
+        return self.to_frame(segments).to_parquet(path, index=False)
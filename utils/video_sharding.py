@@ -0,0 +1,185 @@
+import cv2
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.model import INFERENCE_BACKEND
+from utils.scene_change import DEFAULT_MAX_GAP_SECS, SceneChangeDetector, smooth_rows
+from utils.video_pipeline import PipelineError, VideoAnalysisPipeline, VideoOpenError, DEFAULT_BATCH_SIZE
+
+# Shards per worker, so a worker that finishes early picks up another range
+# instead of idling while the slowest shard runs.
+SHARDS_PER_WORKER = 2
+# Ranges shorter than this are not worth a seek and a task round trip.
+MIN_SHARD_SECS = 10.0
+PROGRESS_POLL_SECS = 0.1
+
+_worker_state = {}
+
+def _init_worker(backend, num_threads, batch_size, model_path, progress_queue):
+    from utils.model import load_worker_engine
+
+    _worker_state["engine"] = load_worker_engine(backend, num_threads, batch_size, model_path)
+    _worker_state["progress_queue"] = progress_queue
+
+def _analyze_shard(run_id, shard_index, video_path, start_frame, end_frame, frame_interval_secs, target_size,
+                   class_info_dict, expected_class_names, confidence_threshold, batch_size, detector_options, max_gap_secs,
+                   include_probs=False):
+    progress_queue = _worker_state["progress_queue"]
+
+    def report(frame_count, total_frames, processed_frame_count):
+        progress_queue.put((run_id, shard_index, frame_count - start_frame, processed_frame_count))
+
+    pipeline = VideoAnalysisPipeline(
+        _worker_state["engine"], target_size, class_info_dict, expected_class_names, confidence_threshold,
+        batch_size=batch_size, num_preprocess_workers=1,
+        change_detector=SceneChangeDetector(*detector_options) if detector_options else None,
+        max_gap_secs=max_gap_secs, include_probs=include_probs,
+    )
+    rows = list(pipeline.iter_results(video_path, frame_interval_secs, report, start_frame, end_frame))
+    return rows, pipeline.stats
+
+def shard_ranges(total_frames, frame_skip, num_shards):
+    """
+    Splits frames [0, total_frames) into up to num_shards contiguous
+    (start_frame, end_frame) ranges of about the same number of sampled
+    frames. Every range starts on a sampled frame; the last one is open-ended
+    (end_frame None) in case the container under-reports its frame count.
+    """
+    samples = -(-max(0, total_frames) // frame_skip)
+    num_shards = max(1, min(num_shards, samples))
+    starts = [samples * i // num_shards * frame_skip for i in range(num_shards)]
+    return list(zip(starts, starts[1:] + [None]))
+
+class ShardedVideoAnalyzer:
+    """
+    Classifies one video with several worker processes.
+
+    The video is split into frame ranges (shard_ranges) and each range is
+    decoded and classified by a VideoAnalysisPipeline in a worker process
+    that seeks straight to its first frame. Every worker loads its own engine
+    once, when the pool starts; TFLite engines memory-map the same .tflite
+    file, so their weights are shared between workers. Rows are yielded in
+    frame order and match a single-process run; with a change detector each
+    shard also classifies its own first frame, so adaptive runs may make a
+    few more model calls. Smoothing is applied after the shards are merged.
+
+    The pool is kept between runs so models are loaded only once; runs on one
+    analyzer are serialised. progress_callback(frame_count, total_frames,
+    processed_count) receives the frames covered by all shards together.
+    """
+
+    def __init__(self, num_workers, backend=INFERENCE_BACKEND, batch_size=DEFAULT_BATCH_SIZE, model_path=None, num_threads=None):
+        self.num_workers = max(1, num_workers)
+        self.batch_size = max(1, batch_size)
+        self.stats = {"rows": 0, "inferred": 0, "carried": 0, "shards": 0}
+        num_threads = num_threads or max(1, (os.cpu_count() or 1) // self.num_workers)
+        context = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+        self._progress_queue = context.Queue()
+        self._pool = ProcessPoolExecutor(
+            self.num_workers, mp_context=context, initializer=_init_worker,
+            initargs=(backend, num_threads, self.batch_size, model_path, self._progress_queue),
+        )
+        self._run_ids = itertools.count()
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def run(self, video_path, frame_interval_secs, *args, **kwargs):
+        start_time = time.time()
+        results = list(self.iter_results(video_path, frame_interval_secs, *args, **kwargs))
+        return results, time.time() - start_time
+
+    def iter_results(self, video_path, frame_interval_secs, target_size, class_info_dict, expected_class_names,
+                     confidence_threshold, progress_callback=None, change_detector=None,
+                     max_gap_secs=DEFAULT_MAX_GAP_SECS, smoothing_window=1, include_probs=False):
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            cap.release()
+            raise VideoOpenError(f"Could not open video file: {video_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        frame_skip = max(1, int(fps * frame_interval_secs))
+        max_shards = max(1, total_frames // max(1, int(fps * MIN_SHARD_SECS)))
+        ranges = shard_ranges(total_frames, frame_skip, min(self.num_workers * SHARDS_PER_WORKER, max_shards))
+        detector_options = None
+        if change_detector is not None:
+            detector_options = (change_detector.threshold, change_detector.method, change_detector.thumbnail_size)
+        task_args = (frame_interval_secs, target_size, class_info_dict, expected_class_names, confidence_threshold,
+                     self.batch_size, detector_options, max_gap_secs, include_probs)
+        print(f"Sharded video analysis: {len(ranges)} shards on {self.num_workers} workers, Total Frames={total_frames}")
+
+        rows = self._iter_rows(video_path, ranges, task_args, total_frames, progress_callback)
+        try:
+            yield from smooth_rows(rows, smoothing_window, class_info_dict)
+        finally:
+            rows.close()
+
+    def _iter_rows(self, video_path, ranges, task_args, total_frames, progress_callback):
+        if self.closed:
+            raise RuntimeError("ShardedVideoAnalyzer is closed")
+        with self._lock:
+            run_id = next(self._run_ids)
+            self.stats = {"rows": 0, "inferred": 0, "carried": 0, "shards": len(ranges)}
+            covered = [0] * len(ranges)
+            processed = [0] * len(ranges)
+
+            def drain_progress(block):
+                updated = False
+                while True:
+                    try:
+                        message = self._progress_queue.get(timeout=PROGRESS_POLL_SECS) if block else self._progress_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    block = False
+                    # Messages from an abandoned earlier run can still be in the queue.
+                    if message[0] == run_id:
+                        _, shard_index, covered[shard_index], processed[shard_index] = message
+                        updated = True
+                if updated and progress_callback:
+                    progress_callback(sum(covered), total_frames, sum(processed))
+
+            futures = [
+                self._pool.submit(_analyze_shard, run_id, shard_index, video_path, start_frame, end_frame, *task_args)
+                for shard_index, (start_frame, end_frame) in enumerate(ranges)
+            ]
+            try:
+                for future in futures:
+                    while not future.done():
+                        drain_progress(block=True)
+                    rows, stats = future.result()
+                    drain_progress(block=False)
+                    for key in ("rows", "inferred", "carried"):
+                        self.stats[key] += stats[key]
+                    yield from rows
+                if progress_callback:
+                    progress_callback(total_frames if total_frames > 0 else sum(covered), total_frames, sum(processed))
+            except BrokenProcessPool as e:
+                self.close()
+                raise PipelineError(f"A video shard worker stopped unexpectedly: {e}") from e
+            finally:
+                # Also reached when the caller stops iterating early; shards already running finish on their own.
+                for future in futures:
+                    future.cancel()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+_analyzers = {}
+_analyzers_lock = threading.Lock()
+
+def get_sharded_analyzer(num_workers, backend=INFERENCE_BACKEND, batch_size=DEFAULT_BATCH_SIZE, model_path=None):
+    """Returns a process-wide ShardedVideoAnalyzer for these settings, so worker pools and their models are reused."""
+    key = (num_workers, backend, batch_size, str(model_path) if model_path else None)
+    with _analyzers_lock:
+        analyzer = _analyzers.get(key)
+        if analyzer is None or analyzer.closed:
+            analyzer = _analyzers[key] = ShardedVideoAnalyzer(num_workers, backend, batch_size, model_path)
+        return analyzer